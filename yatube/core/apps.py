@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import metrics, slow_queries
+        metrics.instrument_caches()
+        connection_created.connect(slow_queries.install)
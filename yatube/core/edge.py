@@ -0,0 +1,87 @@
+"""Заголовки для общего HTTP-кэша (reverse proxy, CDN) и его очистка.
+
+Страница, отданная гостю, одинакова для всех гостей, поэтому ее можно
+хранить в общем кэше: ``edge_cache`` ставит ей ``Cache-Control: public``
+с ``s-maxage=EDGE_CACHE_TIMEOUT`` и заголовок ``Surrogate-Key`` с ключами,
+которые view отметил через ``tag``. Страницы авторизованных и ответы с
+cookie помечаются ``private``. ``Vary: Cookie`` есть всегда: прокси не
+отдаст гостевую копию запросу с cookie сессии.
+
+При записи в базу ``purge_keys`` после фиксации транзакции шлет сигнал
+``purge``; приемник по умолчанию отправляет запрос ``PURGE`` с ключами
+на ``EDGE_PURGE_URL``, если он задан.
+"""
+import logging
+import urllib.request
+from functools import wraps
+from typing import List
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal, receiver
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+logger = logging.getLogger('core.edge')
+
+purge = Signal(providing_args=['keys'])
+
+CACHEABLE_STATUSES = (200, 304)
+
+
+def tag(request, *keys) -> None:
+    """Добавляет суррогатные ключи к ответу на запрос."""
+
+    if not hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys = []
+    request.surrogate_keys.extend(key for key in keys if key)
+
+
+def _shareable(request, response) -> bool:
+    return (request.method in ('GET', 'HEAD')
+            and response.status_code in CACHEABLE_STATUSES
+            and not response.cookies
+            and not request.user.is_authenticated)
+
+
+def edge_cache(view):
+    """Помечает ответы view как общие для гостей или личные."""
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_vary_headers(response, ('Cookie',))
+        if not _shareable(request, response):
+            patch_cache_control(response, private=True)
+            return response
+        patch_cache_control(response, public=True, max_age=0,
+                            s_maxage=settings.EDGE_CACHE_TIMEOUT)
+        keys: List[str] = getattr(request, 'surrogate_keys', [])
+        if keys:
+            response['Surrogate-Key'] = ' '.join(dict.fromkeys(keys))
+        return response
+    return wrapped
+
+
+def purge_keys(*keys) -> None:
+    """Очищает общий кэш по ключам после фиксации транзакции."""
+
+    keys = sorted(set(filter(None, keys)))
+    if keys:
+        transaction.on_commit(lambda: purge.send(sender=None, keys=keys))
+
+
+@receiver(purge)
+def http_purge(sender, keys, **kwargs):
+    """Отправляет ``PURGE`` с заголовком ``Surrogate-Key`` на прокси."""
+
+    if not settings.EDGE_PURGE_URL:
+        return
+    request = urllib.request.Request(
+        settings.EDGE_PURGE_URL, method='PURGE',
+        headers={'Surrogate-Key': ' '.join(keys)})
+    try:
+        urllib.request.urlopen(request,
+                               timeout=settings.EDGE_PURGE_TIMEOUT).close()
+    except OSError as error:
+        logger.warning('Не удалось очистить кэш по ключам %s: %s',
+                       ' '.join(keys), error)
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import slow_queries
+
+ORDERINGS = {
+    'total': 'total_ms',
+    'max': 'max_ms',
+    'mean': 'mean_ms',
+    'count': 'count',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов по отпечаткам: запросы, '
+            'отличающиеся только значениями, считаются вместе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            default=settings.SLOW_QUERY_LOG,
+            help='Файл журнала (по умолчанию SLOW_QUERY_LOG).',
+        )
+        parser.add_argument(
+            '--order',
+            choices=sorted(ORDERINGS),
+            default='total',
+            help='Порядок групп: суммарное, худшее, среднее время или число.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help='Сколько групп показать.',
+        )
+
+    def write_group(self, group):
+        slowest = group['slowest']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            '{fingerprint}: {count} раз, всего {total_ms:.1f} мс, '
+            'среднее {mean_ms:.1f} мс, худшее {max_ms:.1f} мс'.format(
+                **group)))
+        self.stdout.write('  ' + group['query'])
+        self.stdout.write('  Места вызова:')
+        for site, count in sorted(group['call_sites'].items(),
+                                  key=lambda item: -item[1]):
+            self.stdout.write('    {} — {}'.format(site, count))
+        if slowest['params']:
+            self.stdout.write('  Параметры худшего: {}'.format(
+                ', '.join(slowest['params'])))
+        if slowest['plan']:
+            self.stdout.write('  План худшего:')
+            for row in slowest['plan']:
+                self.stdout.write('    ' + row)
+        self.stdout.write('')
+
+    def handle(self, *args, **options):
+        try:
+            entries = slow_queries.read_log(options['log'])
+        except FileNotFoundError:
+            raise CommandError(
+                'Журнал {} не найден'.format(options['log']))
+        key = ORDERINGS[options['order']]
+        groups = sorted(slow_queries.summarize(entries),
+                        key=lambda group: group[key], reverse=True)
+        for group in groups[:options['limit']]:
+            self.write_group(group)
+        self.stdout.write(self.style.SUCCESS(
+            'Медленных запросов: {}, разных: {}'.format(
+                len(entries), len(groups))))
@@ -0,0 +1,219 @@
+"""Замеры производительности запросов.
+
+``RequestMetricsMiddleware`` заводит для выбранного (по
+``REQUEST_METRICS_SAMPLE_RATE``) запроса объект ``RequestMetrics`` и
+кладет его в contextvar. Код, который хочет что-то замерить, вызывает
+``timer`` или ``count``: вне замеряемого запроса это почти бесплатный
+no-op. Итог запроса пишется строкой JSON в лог ``core.metrics`` и
+добавляется в гистограммы процесса (``registry``).
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Верхние границы корзин гистограмм: ряд 1-2-5 подходит и для
+# миллисекунд, и для числа запросов или обращений к кэшу.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+TIMINGS = ('wall', 'db', 'template', 'thumbnails')
+COUNTERS = ('db_queries', 'cache_hits', 'cache_misses')
+
+_MISSING = object()
+
+
+class RequestMetrics:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.url_name: Optional[str] = None
+        self.method: Optional[str] = None
+        self.status: Optional[int] = None
+        self.timings: Dict[str, float] = defaultdict(float)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.active: set = set()
+
+    def database_wrapper(self, execute, sql, params, many, context):
+        """Обертка для ``connection.execute_wrapper``."""
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings['db'] += time.perf_counter() - started
+            self.counters['db_queries'] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {
+            'url_name': self.url_name,
+            'method': self.method,
+            'status': self.status,
+        }
+        for name in TIMINGS:
+            data[name + '_ms'] = round(self.timings[name] * 1000, 3)
+        for name in COUNTERS:
+            data[name] = self.counters[name]
+        return data
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar(
+    'request_metrics', default=None)
+
+
+def current() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def start() -> object:
+    """Начинает замер запроса; возвращает токен для ``finish``."""
+
+    return _current.set(RequestMetrics())
+
+
+def finish(token) -> RequestMetrics:
+    metrics = _current.get()
+    _current.reset(token)
+    return metrics
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Добавляет время блока к ``name``; вложенные блоки не удваиваются."""
+
+    metrics = _current.get()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+    metrics.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - started
+        metrics.active.discard(name)
+
+
+def count(name: str, value: int = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counters[name] += value
+
+
+class Histogram:
+    """Число значений по корзинам ``BUCKETS`` плюс сумма и количество."""
+
+    def __init__(self):
+        self.buckets: List[int] = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            index = len(BUCKETS)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+
+    def as_dict(self) -> Dict[str, Any]:
+        bounds = [str(bound) for bound in BUCKETS] + ['+Inf']
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'buckets': dict(zip(bounds, self.buckets)),
+        }
+
+
+class Registry:
+    """Гистограммы процесса по имени URL и метрике."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[str, Histogram]] = {}
+
+    def add(self, metrics: RequestMetrics) -> None:
+        values = metrics.as_dict()
+        url_name = values['url_name'] or '<unresolved>'
+        with self._lock:
+            histograms = self._histograms.setdefault(
+                url_name, defaultdict(Histogram))
+            for name in TIMINGS:
+                histograms[name + '_ms'].add(values[name + '_ms'])
+            for name in COUNTERS:
+                histograms[name].add(values[name])
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                url_name: {name: histogram.as_dict()
+                           for name, histogram in histograms.items()}
+                for url_name, histograms in self._histograms.items()
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+def _count_cache(hits: int, misses: int) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counters['cache_hits'] += hits
+        metrics.counters['cache_misses'] += misses
+
+
+def _instrument_get(get):
+    def instrumented_get(self, key, default=None, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or 'cache' in metrics.active:
+            return get(self, key, default, *args, **kwargs)
+        metrics.active.add('cache')
+        try:
+            value = get(self, key, _MISSING, *args, **kwargs)
+        finally:
+            metrics.active.discard('cache')
+        _count_cache(value is not _MISSING, value is _MISSING)
+        return default if value is _MISSING else value
+    return instrumented_get
+
+
+def _instrument_get_many(get_many):
+    def instrumented_get_many(self, keys, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or 'cache' in metrics.active:
+            return get_many(self, keys, *args, **kwargs)
+        keys = list(keys)
+        metrics.active.add('cache')
+        try:
+            found = get_many(self, keys, *args, **kwargs)
+        finally:
+            metrics.active.discard('cache')
+        _count_cache(len(found), len(keys) - len(found))
+        return found
+    return instrumented_get_many
+
+
+def instrument_caches() -> None:
+    """Считает попадания и промахи в бэкендах из ``settings.CACHES``.
+
+    Django 2.2 не шлет сигналов о работе кэша, поэтому методы ``get``
+    и ``get_many`` классов бэкендов оборачиваются один раз при старте.
+    Вложенные вызовы (``get_many`` через ``get``) не считаются дважды.
+    """
+
+    for config in settings.CACHES.values():
+        backend = import_string(config['BACKEND'])
+        if getattr(backend, '_metrics_instrumented', False):
+            continue
+        backend.get = _instrument_get(backend.get)
+        backend.get_many = _instrument_get_many(backend.get_many)
+        backend._metrics_instrumented = True
@@ -0,0 +1,43 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger('core.metrics')
+
+
+class RequestMetricsMiddleware:
+    """Замеряет время, запросы к БД, шаблоны и кэш выбранных запросов.
+
+    Доля замеряемых запросов задается ``REQUEST_METRICS_SAMPLE_RATE``;
+    для остальных вся работа middleware — один вызов ``random()``.
+    Ставится первым в ``MIDDLEWARE``, чтобы время включало весь стек.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        token = metrics.start()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(
+                    metrics.current().database_wrapper):
+                response = self.get_response(request)
+        finally:
+            request_metrics = metrics.finish(token)
+            request_metrics.timings['wall'] = time.perf_counter() - started
+        match = request.resolver_match
+        request_metrics.url_name = match.view_name if match else None
+        request_metrics.method = request.method
+        request_metrics.status = response.status_code
+        metrics.registry.add(request_metrics)
+        logger.info(json.dumps(request_metrics.as_dict()))
+        return response
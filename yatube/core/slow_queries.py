@@ -0,0 +1,169 @@
+"""Журнал медленных SQL-запросов.
+
+Обертка ``execute_wrapper`` ставится на каждое новое соединение с БД
+(сигнал ``connection_created``). Запрос дольше
+``SLOW_QUERY_THRESHOLD_MS`` пишется строкой JSON в ``SLOW_QUERY_LOG``
+вместе с параметрами, местом вызова в коде проекта и планом запроса.
+Команда ``slow_queries`` сводит журнал по отпечаткам запросов:
+запросы, отличающиеся только значениями, попадают в одну группу.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+# Сколько кадров стека проекта сохранять для места вызова.
+STACK_DEPTH = 8
+
+_lock = threading.Lock()
+_local = threading.local()
+
+_NORMALIZERS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize(sql: str) -> str:
+    """SQL без значений: литералы и параметры заменены на ``?``."""
+
+    for pattern, replacement in _NORMALIZERS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(sql: str) -> str:
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def _call_site() -> List[str]:
+    """Кадры стека из кода проекта, от ближнего к запросу."""
+
+    own_file = os.path.abspath(__file__)
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if (path == own_file or not path.startswith(settings.BASE_DIR)
+                or os.sep + 'site-packages' + os.sep in path):
+            continue
+        frames.append('{}:{} in {}'.format(
+            os.path.relpath(path, settings.BASE_DIR), frame.lineno,
+            frame.name))
+        if len(frames) == STACK_DEPTH:
+            break
+    return frames
+
+
+def _explain(connection, sql: str, params) -> Optional[List[str]]:
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()]
+    except Exception as error:
+        return ['EXPLAIN не выполнен: {}'.format(error)]
+
+
+def _write(entry: Dict[str, Any]) -> None:
+    path = settings.SLOW_QUERY_LOG
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    with _lock, open(path, 'a', encoding='utf-8') as log:
+        log.write(line + '\n')
+
+
+def _record(connection, sql: str, params, many: bool,
+            duration: float) -> None:
+    _local.recording = True
+    try:
+        _write({
+            'time': timezone.now().isoformat(),
+            'fingerprint': fingerprint(sql),
+            'duration_ms': round(duration * 1000, 3),
+            'sql': sql,
+            'params': None if many else [repr(param)
+                                         for param in params or ()],
+            'stack': _call_site(),
+            'plan': None if many else _explain(connection, sql, params),
+        })
+    finally:
+        _local.recording = False
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    """Замеряет запрос и пишет его в журнал, если он медленный."""
+
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold is None or getattr(_local, 'recording', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if duration * 1000 >= threshold:
+            _record(context['connection'], sql, params, many, duration)
+
+
+def install(sender, connection, **kwargs) -> None:
+    """Приемник ``connection_created``: ставит обертку на соединение.
+
+    Соединение открывается лениво, часто внутри ``with
+    connection.execute_wrapper(...)``, который при выходе снимает
+    последнюю обертку списка. Поэтому своя обертка ставится в начало.
+    """
+
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
+
+
+def read_log(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    with open(path, encoding='utf-8') as log:
+        for line in log:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+def summarize(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Группы по отпечатку: число, суммарное и худшее время, пример."""
+
+    groups: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'query': normalize(entry['sql']),
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'slowest': entry,
+            'call_sites': {},
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['slowest'] = entry
+        site = entry['stack'][0] if entry['stack'] else '?'
+        group['call_sites'][site] = group['call_sites'].get(site, 0) + 1
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+    return list(groups.values())
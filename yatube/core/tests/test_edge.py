@@ -0,0 +1,147 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import edge
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def run_on_commit(callback):
+    callback()
+
+
+class EdgeCacheHeadersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='edge_author')
+        cls.group = Group.objects.create(title='Группа', slug='edge',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Запись')
+        cls.pages = {
+            reverse('posts:index'): {'index', 'all'},
+            reverse('posts:group_posts', args=[cls.group.slug]): {
+                'group:{}'.format(cls.group.pk), 'all'},
+            reverse('posts:profile', args=[cls.author.username]): {
+                'profile:{}'.format(cls.author.pk), 'all'},
+            reverse('posts:post_detail', args=[cls.post.pk]): {
+                'post:{}'.format(cls.post.pk),
+                'profile:{}'.format(cls.author.pk),
+                'group:{}'.format(cls.group.pk)},
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.authorized = Client()
+        self.authorized.force_login(self.author)
+
+    @override_settings(EDGE_CACHE_TIMEOUT=120)
+    def test_guest_pages_are_public_with_surrogate_keys(self):
+        for url, keys in self.pages.items():
+            with self.subTest(url=url):
+                response = Client().get(url)
+                self.assertEqual(response['Cache-Control'],
+                                 'public, max-age=0, s-maxage=120')
+                self.assertIn('Cookie', response['Vary'])
+                self.assertEqual(set(response['Surrogate-Key'].split()),
+                                 keys)
+                self.assertFalse(response.cookies)
+
+    def test_not_modified_keeps_cache_headers(self):
+        url = reverse('posts:index')
+        etag = Client().get(url)['ETag']
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_user_pages_are_private(self):
+        for url in self.pages:
+            with self.subTest(url=url):
+                response = self.authorized.get(url)
+                self.assertEqual(response['Cache-Control'], 'private')
+                self.assertIn('Cookie', response['Vary'])
+                self.assertNotIn('Surrogate-Key', response)
+
+    def test_user_nav_fragment(self):
+        response = self.authorized.get(reverse('core:user_nav'))
+        self.assertContains(response, 'Пользователь: edge_author')
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertContains(Client().get(reverse('core:user_nav')),
+                            'Войти')
+        self.assertContains(Client().get(reverse('posts:index')),
+                            'Войти')
+
+
+@mock.patch('core.edge.transaction.on_commit', run_on_commit)
+class EdgePurgeTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='purge_author')
+        cls.reader = User.objects.create_user(username='purge_reader')
+        cls.group = Group.objects.create(title='Группа', slug='purge',
+                                         description='Описание')
+
+    def purged(self, action):
+        """Ключи, по которым действие очистило общий кэш."""
+
+        purged = set()
+
+        def receiver(sender, keys, **kwargs):
+            purged.update(keys)
+
+        edge.purge.connect(receiver)
+        try:
+            action()
+        finally:
+            edge.purge.disconnect(receiver)
+        return purged
+
+    def test_writes_purge_related_pages(self):
+        post = None
+
+        def create_post():
+            nonlocal post
+            post = Post.objects.create(author=self.author, group=self.group,
+                                       text='Запись')
+
+        self.assertEqual(self.purged(create_post), {
+            'post:{}'.format(post.pk), 'index',
+            'profile:{}'.format(self.author.pk),
+            'group:{}'.format(self.group.pk)})
+        self.assertIn('post:{}'.format(post.pk), self.purged(
+            lambda: Comment.objects.create(post=post, author=self.reader,
+                                           text='Комментарий')))
+        self.assertEqual(self.purged(
+            lambda: Follow.objects.create(user=self.reader,
+                                          author=self.author)), {
+            'profile:{}'.format(self.author.pk),
+            'profile:{}'.format(self.reader.pk)})
+        self.assertEqual(
+            self.purged(lambda: Group.objects.filter(pk=self.group.pk)
+                        .get().save()),
+            {'group:{}'.format(self.group.pk), 'all'})
+
+    @override_settings(EDGE_PURGE_URL='http://proxy.local/purge')
+    def test_http_purge_sends_surrogate_keys(self):
+        with mock.patch('core.edge.urllib.request.urlopen') as urlopen:
+            edge.purge_keys('post:1', 'index', None)
+        request = urlopen.call_args[0][0]
+        self.assertEqual(request.get_method(), 'PURGE')
+        self.assertEqual(request.full_url, 'http://proxy.local/purge')
+        self.assertEqual(request.get_header('Surrogate-key'), 'index post:1')
+
+    @override_settings(EDGE_PURGE_URL='http://proxy.local/purge')
+    def test_purge_failure_is_logged(self):
+        with mock.patch('core.edge.urllib.request.urlopen',
+                        side_effect=OSError('нет связи')), \
+                self.assertLogs('core.edge', 'WARNING'):
+            edge.purge_keys('index')
@@ -0,0 +1,97 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse_lazy
+
+from core import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+class RequestMetricsMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='metrics_author')
+        cls.staff = User.objects.create_user(username='metrics_staff',
+                                             is_staff=True)
+        Post.objects.create(author=cls.author, text='Запись')
+        cls.url = reverse_lazy('posts:index')
+        cls.metrics_url = reverse_lazy('core:request_metrics')
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+
+    def logged_request(self, client, url):
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def test_request_is_logged_as_json(self):
+        cold = self.logged_request(Client(), self.url)
+        self.assertEqual(cold['url_name'], 'posts:index')
+        self.assertEqual((cold['method'], cold['status']), ('GET', 200))
+        self.assertGreater(cold['db_queries'], 0)
+        self.assertGreater(cold['db_ms'], 0)
+        self.assertGreater(cold['template_ms'], 0)
+        self.assertGreaterEqual(cold['wall_ms'],
+                                cold['template_ms'] + cold['db_ms'] / 2)
+        self.assertGreater(cold['cache_misses'], 0)
+        warm = self.logged_request(Client(), self.url)
+        self.assertGreater(warm['cache_hits'], 0)
+        self.assertEqual(warm['cache_misses'], 0)
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_measured(self):
+        with mock.patch('core.middleware.logger') as logger:
+            Client().get(self.url)
+        logger.info.assert_not_called()
+        self.assertEqual(metrics.registry.snapshot(), {})
+
+    def test_histograms_for_staff_only(self):
+        staff = Client()
+        staff.force_login(self.staff)
+        with self.assertLogs('core.metrics', 'INFO'):
+            Client().get(self.url)
+            Client().get(self.url)
+            response = Client().get(self.metrics_url)
+            data = staff.get(self.metrics_url).json()
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/admin/login/'))
+        self.assertEqual(data['views']['posts:index']['wall_ms']['count'], 2)
+
+
+class MetricsHelpersTest(TestCase):
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram()
+        for value in (0.5, 1, 3, 20000):
+            histogram.add(value)
+        data = histogram.as_dict()
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(data['buckets']['1'], 2)
+        self.assertEqual(data['buckets']['5'], 1)
+        self.assertEqual(data['buckets']['+Inf'], 1)
+
+    def test_nested_timers_are_counted_once(self):
+        token = metrics.start()
+        with mock.patch('core.metrics.time.perf_counter',
+                        side_effect=[0, 10, 20, 30]):
+            with metrics.timer('thumbnails'):
+                with metrics.timer('thumbnails'):
+                    pass
+        measured = metrics.finish(token)
+        self.assertEqual(measured.timings['thumbnails'], 10)
+
+    def test_timer_outside_request_is_noop(self):
+        with metrics.timer('template'):
+            pass
+        self.assertIsNone(metrics.current())
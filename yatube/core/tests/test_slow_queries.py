@@ -0,0 +1,94 @@
+import io
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse_lazy
+
+from core import slow_queries
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SlowQueryLogTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='slow_author')
+        Post.objects.create(author=cls.author, text='Запись')
+        cls.url = reverse_lazy('posts:profile', args=['slow_author'])
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'slow.jsonl')
+
+    def logged(self, threshold=0):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=threshold,
+                               SLOW_QUERY_LOG=self.log):
+            Client().get(self.url)
+        if not os.path.exists(self.log):
+            return []
+        return slow_queries.read_log(self.log)
+
+    def test_wrapper_installed_on_connection(self):
+        self.assertIn(slow_queries.slow_query_wrapper,
+                      connection.execute_wrappers)
+
+    def test_disabled_or_fast_queries_not_logged(self):
+        self.assertEqual(self.logged(threshold=None), [])
+        self.assertEqual(self.logged(threshold=60 * 1000), [])
+
+    def test_entry_has_params_call_site_and_plan(self):
+        entries = self.logged()
+        posts = [entry for entry in entries
+                 if entry['sql'].startswith('SELECT')
+                 and '"posts_post"' in entry['sql']]
+        self.assertTrue(posts)
+        entry = posts[0]
+        self.assertEqual(entry['fingerprint'],
+                         slow_queries.fingerprint(entry['sql']))
+        self.assertGreaterEqual(entry['duration_ms'], 0)
+        self.assertIsInstance(entry['params'], list)
+        self.assertTrue(any(site.startswith('posts/views.py')
+                            for site in entry['stack']))
+        self.assertTrue(entry['plan'])
+        self.assertFalse(any(row.startswith('EXPLAIN не выполнен')
+                             for row in entry['plan']))
+
+    def test_explain_does_not_log_itself(self):
+        entries = self.logged()
+        self.assertFalse([entry for entry in entries
+                          if 'EXPLAIN' in entry['sql']])
+
+    def test_fingerprint_ignores_values(self):
+        self.assertEqual(
+            slow_queries.fingerprint(
+                "SELECT * FROM t WHERE a = 1 AND b = 'x' AND c IN (1, 2)"),
+            slow_queries.fingerprint(
+                "SELECT  * FROM t WHERE a = %s AND b = 'y''z' "
+                "AND c IN (%s, %s, %s)"))
+        self.assertNotEqual(slow_queries.fingerprint('SELECT a FROM t'),
+                            slow_queries.fingerprint('SELECT b FROM t'))
+
+    def test_command_groups_by_fingerprint(self):
+        self.logged()
+        self.logged()
+        entries = slow_queries.read_log(self.log)
+        groups = slow_queries.summarize(entries)
+        self.assertLess(len(groups), len(entries))
+        self.assertEqual(sum(group['count'] for group in groups),
+                         len(entries))
+        out = io.StringIO()
+        call_command('slow_queries', log=self.log, order='count', limit=1,
+                     stdout=out)
+        self.assertIn('План худшего', out.getvalue())
+        self.assertIn('Медленных запросов: {}'.format(len(entries)),
+                      out.getvalue())
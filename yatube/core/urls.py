@@ -0,0 +1,11 @@
+from django.urls import path
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    # Гистограммы замеров запросов этого процесса
+    path('metrics/', views.request_metrics, name='request_metrics'),
+    # Меню текущего пользователя отдельно от страницы
+    path('nav/', views.user_nav, name='user_nav'),
+]
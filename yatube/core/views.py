@@ -1,4 +1,10 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+
+from . import metrics
 
 
 def page_not_found(request, exception):
@@ -15,3 +21,21 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+@staff_member_required
+def request_metrics(request):
+    """Гистограммы замеров запросов, накопленные этим процессом."""
+
+    return JsonResponse({
+        'sample_rate': settings.REQUEST_METRICS_SAMPLE_RATE,
+        'buckets': metrics.BUCKETS,
+        'views': metrics.registry.snapshot(),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@never_cache
+def user_nav(request):
+    """Пункты меню текущего пользователя для страниц из общего кэша."""
+
+    return render(request, 'includes/user_nav.html')
@@ -1,8 +1,36 @@
 from django.contrib import admin
 from .models import Post, Group, Comment, Follow
+from . import search
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class IndexSearchMixin:
+    """Поиск в админке по полнотекстовому индексу вместо LIKE."""
+
+    search_kind = search.POST
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        found = search.matching(self.search_kind, search_term)
+        if found is None:
+            return queryset.none(), False
+        return queryset.filter(pk__in=found), False
+
+
+class LargeTableMixin:
+    """Списки больших таблиц без COUNT(*) по всей таблице.
+
+    Связанные объекты выбираются автодополнением, а не списком всех
+    строк; колонки-связи в списке читаются одним JOIN.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(IndexSearchMixin, LargeTableMixin, admin.ModelAdmin):
     """Класс для отображения моделей Post в админке"""
 
     list_display = (
@@ -12,9 +40,11 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
 
 
@@ -28,28 +58,37 @@ class GroupAdmin(admin.ModelAdmin):
     search_fields = ('title',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexSearchMixin, LargeTableMixin, admin.ModelAdmin):
     """Класс для отображения моделей Comment в админке"""
 
+    search_kind = search.COMMENT
+
     list_display = (
         'text',
         'post',
         'author',
         'created'
     )
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ('created', 'author',)
+    list_filter = ('created',)
+    date_hierarchy = 'created'
+    # Выпадающий список всех комментариев в форме был бы огромным.
+    raw_id_fields = ('parent',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableMixin, admin.ModelAdmin):
     """Класс для отображения моделей Follow в админке"""
 
     list_display = (
         'user',
         'author',
     )
-    search_fields = ('user',)
-    list_filter = ('user', 'author',)
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    # Точное имя вместо боковых фильтров со всеми пользователями.
+    search_fields = ('=user__username', '=author__username')
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,194 @@
+"""JSON API лент только для чтения.
+
+View здесь не строят объекты моделей и не рендерят шаблоны: строки
+берутся проекциями ``.values()`` и сразу сериализуются. Ленты листаются
+только курсором (``?cursor=``, ``CursorPaginator``). ETag ответа
+считается до запросов к лентам теми же функциями ``conditional``, что и
+у HTML-страниц, поэтому повторный запрос с ``If-None-Match`` получает
+пустой ответ 304 без чтения и сериализации строк. Last-Modified не
+отдается по той же причине, что и у страниц: удаление записи не делает
+ленту новее ни по одной дате.
+"""
+import json
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, QuerySet
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from . import conditional, timeline
+from .models import Comment, Group, Post, User
+from .paginators import POSTS_PER_PAGE, CursorPage, CursorPaginator
+
+POST_FIELDS = ('id', 'text', 'created', 'updated', 'image',
+               'comments_count')
+POST_ORDERING = ('-created', '-id')
+COMMENT_ORDERING = ('created', 'id')
+COMMENTS_PER_PAGE = 50
+
+
+def _posts(queryset: QuerySet) -> QuerySet:
+    return queryset.values(*POST_FIELDS,
+                           author_username=F('author__username'),
+                           group_slug=F('group__slug'))
+
+
+def _timeline_posts(queryset: QuerySet) -> QuerySet:
+    """Строки ленты подписок в тех же полях, что и ``_posts``."""
+
+    return queryset.values(
+        'created', 'post_id',
+        text=F('post__text'),
+        updated=F('post__updated'),
+        image=F('post__image'),
+        comments_count=F('post__comments_count'),
+        author_username=F('post__author__username'),
+        group_slug=F('post__group__slug'),
+    )
+
+
+def _comments(post_id: int) -> QuerySet:
+    return Comment.objects.filter(post_id=post_id).values(
+        'id', 'parent_id', 'text', 'created', 'replies_count',
+        author_username=F('author__username'))
+
+
+def _post(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': row['id'] if 'id' in row else row['post_id'],
+        'author': row['author_username'],
+        'group': row['group_slug'],
+        'text': row['text'],
+        'created': row['created'],
+        'updated': row['updated'],
+        'image': settings.MEDIA_URL + row['image'] if row['image'] else None,
+        'comments_count': row['comments_count'],
+    }
+
+
+def _comment(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'parent': row['parent_id'],
+        'author': row['author_username'],
+        'text': row['text'],
+        'created': row['created'],
+        'replies_count': row['replies_count'],
+    }
+
+
+def _page_link(request, cursor: Optional[str]) -> Optional[str]:
+    if cursor is None:
+        return None
+    return '{}?{}'.format(request.path, urlencode({'cursor': cursor}))
+
+
+def _page(request, queryset: QuerySet, ordering, per_page: int,
+          serialize) -> Dict[str, Any]:
+    page_obj: CursorPage = CursorPaginator(
+        queryset, per_page, ordering).get_page(request.GET.get('cursor'))
+    return {
+        'results': [serialize(row) for row in page_obj],
+        'next': _page_link(request, page_obj.next_cursor),
+        'previous': _page_link(request, page_obj.previous_cursor),
+    }
+
+
+def _response(payload: Dict[str, Any]) -> HttpResponse:
+    body = json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return HttpResponse(body, content_type='application/json')
+
+
+def _feed(request, queryset: QuerySet, ordering=POST_ORDERING,
+          **extra) -> HttpResponse:
+    payload: Dict[str, Any] = _page(request, queryset, ordering,
+                                    POSTS_PER_PAGE, _post)
+    payload.update(extra)
+    return _response(payload)
+
+
+def _not_found() -> JsonResponse:
+    return JsonResponse({'detail': 'Не найдено'}, status=404)
+
+
+@require_GET
+@condition(etag_func=conditional.index_etag)
+def index(request):
+    """Все записи, новые сверху"""
+
+    return _feed(request, _posts(Post.objects.all()))
+
+
+@require_GET
+@condition(etag_func=conditional.group_etag)
+def group_posts(request, slug):
+    """Записи группы"""
+
+    group: Optional[Dict[str, Any]] = (
+        Group.objects.filter(slug=slug)
+        .values('id', 'slug', 'title', 'description').first())
+    if group is None:
+        return _not_found()
+    group_id = group.pop('id')
+    return _feed(request, _posts(Post.objects.filter(group_id=group_id)),
+                 group=group)
+
+
+@require_GET
+@condition(etag_func=conditional.api_profile_etag)
+def profile(request, username):
+    """Записи автора"""
+
+    author: Optional[Dict[str, Any]] = (
+        User.objects.filter(username=username)
+        .values('id', 'username', 'first_name', 'last_name').first())
+    if author is None:
+        return _not_found()
+    author_id = author.pop('id')
+    return _feed(request, _posts(Post.objects.filter(author_id=author_id)),
+                 author=author)
+
+
+@require_GET
+@condition(etag_func=conditional.post_detail_etag)
+def post_detail(request, post_id):
+    """Запись и страница ее комментариев, по порядку"""
+
+    row: Optional[Dict[str, Any]] = _posts(
+        Post.objects.filter(pk=post_id)).first()
+    if row is None:
+        return _not_found()
+    payload: Dict[str, Any] = {
+        'post': _post(row),
+        'comments': _page(request, _comments(post_id), COMMENT_ORDERING,
+                          COMMENTS_PER_PAGE, _comment),
+    }
+    return _response(payload)
+
+
+@require_GET
+@condition(etag_func=conditional.post_detail_etag)
+def post_comments(request, post_id):
+    """Очередная порция комментариев записи"""
+
+    if not Post.objects.filter(pk=post_id).exists():
+        return _not_found()
+    payload: Dict[str, Any] = _page(request, _comments(post_id),
+                                    COMMENT_ORDERING, COMMENTS_PER_PAGE,
+                                    _comment)
+    return _response(payload)
+
+
+@require_GET
+@condition(etag_func=conditional.follow_index_etag)
+def follow_index(request):
+    """Лента подписок текущего пользователя"""
+
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Нужна авторизация'}, status=401)
+    return _feed(request,
+                 _timeline_posts(timeline.entries_for(request.user)),
+                 ordering=timeline.TIMELINE_ORDERING)
@@ -5,3 +5,6 @@ class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'posts'
     verbose_name = 'Управление записями'
+
+    def ready(self):
+        from . import signals  # noqa: F401
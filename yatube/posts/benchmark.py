@@ -0,0 +1,381 @@
+"""Нагрузочные замеры страниц posts.
+
+``seed`` заполняет базу синтетическими данными массовыми вставками:
+авторы, записи и подписки распределены по закону Ципфа, поэтому есть
+и авторы-знаменитости, и длинный хвост. ``run`` прогоняет сценарии через
+тестовый клиент Django (весь стек middleware, без сети) и собирает
+перцентили времени ответа, число SQL-запросов и пик памяти.
+
+Команды ``seed_benchmark`` и ``benchmark`` — обертки над этим модулем.
+"""
+import bisect
+import itertools
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import counters, follow_graph, search, threads, timeline
+from .bulk import Log, batches, bulk_insert, explicit_created
+from .models import Comment, Follow, Group, Post, User
+
+USERNAME_PREFIX = 'bench_'
+GROUP_SLUG_PREFIX = 'bench-'
+# Показатель степени распределения Ципфа: чем больше, тем сильнее
+# перекос в сторону популярных авторов и записей.
+ZIPF_EXPONENT = 1.1
+# Записи и комментарии разбросаны по этому периоду до текущего момента.
+HISTORY = timedelta(days=365)
+WORDS = (
+    'кот собака город река лес дом утро вечер дорога книга музыка '
+    'снег солнце море поезд чай работа отпуск друг письмо'
+).split()
+PERCENTILES = (50, 95, 99)
+
+
+class Zipf:
+    """Случайный выбор из последовательности с весами 1 / rank^s."""
+
+    def __init__(self, items: List[Any], rng: random.Random,
+                 exponent: float = ZIPF_EXPONENT):
+        self.items = items
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(
+            1 / (rank ** exponent) for rank in range(1, len(items) + 1)))
+
+    def __call__(self) -> Any:
+        point = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect.bisect(self.cumulative, point)]
+
+
+def _text(rng: random.Random, length: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def _ids(queryset) -> List[int]:
+    return list(queryset.order_by('pk').values_list('pk', flat=True))
+
+
+def _follows(user_ids: List[int], follows_per_user: int, popular_author,
+             rng: random.Random) -> Iterator[Follow]:
+    for user_id in user_ids:
+        for _ in range(rng.randint(0, 2 * follows_per_user)):
+            author_id = popular_author()
+            if author_id != user_id:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+
+def _rebuild_derived(user_ids: List[int], post_ids: List[int],
+                     batch_size: int, log: Log) -> None:
+    """Ветки, счетчики, граф, ленты и поисковый индекс: bulk_create их
+    не обновляет (как ``transfer.rebuild`` после загрузки)."""
+
+    comments = Comment.objects.filter(
+        post__author__username__startswith=USERNAME_PREFIX)
+    log('Ветки комментариев')
+    threads.rebuild_paths(comments)
+    log('Пересчет счетчиков')
+    for first in range(0, len(user_ids), batch_size):
+        chunk = user_ids[first:first + batch_size]
+        counters.recount_users(chunk[0], chunk[-1])
+    for first in range(0, len(post_ids), batch_size):
+        chunk = post_ids[first:first + batch_size]
+        counters.recount_posts(chunk[0], chunk[-1])
+    follow_graph.invalidate()
+
+    for number, user_id in enumerate(user_ids, 1):
+        timeline.rebuild(user_id)
+        if number % batch_size == 0 or number == len(user_ids):
+            log('Ленты подписок: {} из {}'.format(number, len(user_ids)))
+
+    log('Поисковый индекс')
+    posts = Post.objects.filter(author__username__startswith=USERNAME_PREFIX)
+    for batch in batches(posts.only('text').iterator(), batch_size):
+        with transaction.atomic():
+            for post in batch:
+                search.index_post(post)
+    for batch in batches(comments.only('post_id', 'text').iterator(),
+                         batch_size):
+        with transaction.atomic():
+            for comment in batch:
+                search.index_comment(comment)
+
+
+def seed(users: int, posts: int, comments: int, follows_per_user: int,
+         groups: int, batch_size: int, rng: random.Random,
+         log: Log) -> Dict[str, int]:
+    """Заполняет базу данными для замеров и пересчитывает производные."""
+
+    now = timezone.now()
+    seconds = int(HISTORY.total_seconds())
+    password = make_password(None)
+
+    bulk_insert(User, (
+        User(username='{}{}'.format(USERNAME_PREFIX, number),
+             password=password)
+        for number in range(users)
+    ), batch_size, log, total=users)
+    bulk_insert(Group, (
+        Group(title='Группа {}'.format(number),
+              slug='{}{}'.format(GROUP_SLUG_PREFIX, number),
+              description=_text(rng, 12))
+        for number in range(groups)
+    ), batch_size, log, total=groups)
+    user_ids = _ids(User.objects.filter(username__startswith=USERNAME_PREFIX))
+    group_ids = _ids(Group.objects.filter(slug__startswith=GROUP_SLUG_PREFIX))
+    # Первые пользователи в списке — самые популярные авторы.
+    popular_author = Zipf(user_ids, rng)
+
+    with explicit_created(Post, Comment):
+        bulk_insert(Post, (
+            Post(author_id=popular_author(),
+                 group_id=rng.choice(group_ids) if rng.random() < 0.5
+                 else None,
+                 text=_text(rng, rng.randint(5, 60)),
+                 created=now - timedelta(seconds=rng.randrange(seconds)))
+            for _ in range(posts)
+        ), batch_size, log, total=posts)
+        post_ids = _ids(Post.objects.filter(
+            author__username__startswith=USERNAME_PREFIX))
+        # Обсуждают в основном свежие записи.
+        popular_post = Zipf(post_ids[::-1], rng)
+        bulk_insert(Comment, (
+            Comment(post_id=popular_post(), author_id=rng.choice(user_ids),
+                    text=_text(rng, rng.randint(3, 25)),
+                    created=now - timedelta(seconds=rng.randrange(seconds)))
+            for _ in range(comments)
+        ), batch_size, log, total=comments)
+
+    follows = _follows(user_ids, follows_per_user, popular_author, rng)
+    bulk_insert(Follow, follows, batch_size, log,
+                total=users * follows_per_user, ignore_conflicts=True)
+    _rebuild_derived(user_ids, post_ids, batch_size, log)
+
+    return {
+        'users': len(user_ids),
+        'groups': len(group_ids),
+        'posts': len(post_ids),
+        'comments': Comment.objects.filter(
+            post__author__username__startswith=USERNAME_PREFIX).count(),
+        'follows': Follow.objects.filter(
+            user__username__startswith=USERNAME_PREFIX).count(),
+    }
+
+
+class Scenario(NamedTuple):
+    """Один вид запроса: имя, метод и генератор параметров запроса."""
+
+    name: str
+    method: str
+    # Возвращает (пользователь или None, url, данные формы). Подготовка
+    # (выбор пользователя, создание подписки) в замер не входит.
+    prepare: Callable[[], tuple]
+
+
+def scenarios(rng: random.Random) -> List[Scenario]:
+    """Сценарии для всех страниц и форм posts на засеянных данных."""
+
+    users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+    user_ids = _ids(users)
+    if not user_ids:
+        raise ValueError('Нет данных для замеров: запустите seed_benchmark')
+    usernames = dict(users.values_list('pk', 'username'))
+    popular_author = Zipf(user_ids, rng)
+    group_slugs = list(Group.objects.filter(
+        slug__startswith=GROUP_SLUG_PREFIX).values_list('slug', flat=True))
+    posts = Post.objects.filter(author__username__startswith=USERNAME_PREFIX)
+    post_ids = _ids(posts)
+    # Для правки: авторы последних записей и по одной их записи.
+    own_posts = dict(posts.order_by('-pk')
+                     .values_list('author_id', 'pk')[:1000])
+
+    def reader():
+        return User.objects.get(pk=rng.choice(user_ids))
+
+    def edit():
+        author_id = rng.choice(list(own_posts))
+        return (User.objects.get(pk=author_id),
+                reverse('posts:post_edit', args=[own_posts[author_id]]),
+                {'text': _text(rng, 20)})
+
+    def follow():
+        return reader(), reverse('posts:profile_follow', args=[
+            usernames[popular_author()]]), {}
+
+    def unfollow():
+        user, author_id = reader(), popular_author()
+        if author_id != user.pk:
+            Follow.objects.get_or_create(user=user, author_id=author_id)
+        return user, reverse('posts:profile_unfollow', args=[
+            usernames[author_id]]), {}
+
+    return [
+        Scenario('index', 'get', lambda: (
+            None, reverse('posts:index'), {})),
+        Scenario('index_page_5', 'get', lambda: (
+            None, reverse('posts:index'), {'page': 5})),
+        Scenario('group_posts', 'get', lambda: (
+            None, reverse('posts:group_posts',
+                          args=[rng.choice(group_slugs)]), {})),
+        Scenario('profile', 'get', lambda: (
+            None, reverse('posts:profile',
+                          args=[usernames[popular_author()]]), {})),
+        Scenario('post_detail', 'get', lambda: (
+            None, reverse('posts:post_detail',
+                          args=[rng.choice(post_ids)]), {})),
+        Scenario('follow_index', 'get', lambda: (
+            reader(), reverse('posts:follow_index'), {})),
+        Scenario('search', 'get', lambda: (
+            None, reverse('posts:search'),
+            {'q': ' '.join(rng.sample(WORDS, 2))})),
+        Scenario('post_create', 'post', lambda: (
+            reader(), reverse('posts:post_create'),
+            {'text': _text(rng, 30)})),
+        Scenario('post_edit', 'post', edit),
+        Scenario('add_comment', 'post', lambda: (
+            reader(), reverse('posts:add_comment',
+                              args=[rng.choice(post_ids)]),
+            {'text': _text(rng, 10)})),
+        Scenario('profile_follow', 'get', follow),
+        Scenario('profile_unfollow', 'get', unfollow),
+    ]
+
+
+def percentile(values: List[float], rank: int) -> float:
+    """Перцентиль по ближайшему рангу; values отсортированы."""
+
+    index = max(0, -(-rank * len(values) // 100) - 1)
+    return values[index]
+
+
+def _prepare(client: Client, scenario: Scenario) -> Callable[[], None]:
+    """Готовит запрос сценария и возвращает функцию его отправки."""
+
+    user, url, data = scenario.prepare()
+    client.logout()
+    if user is not None:
+        client.force_login(user)
+
+    def send():
+        response = getattr(client, scenario.method)(url, data)
+        if response.status_code >= 400:
+            raise RuntimeError('{} {}: ответ {}'.format(
+                scenario.name, url, response.status_code))
+    return send
+
+
+def measure(scenario: Scenario, requests: int, warmup: int,
+            memory_requests: int) -> Dict[str, Any]:
+    """Замеры одного сценария.
+
+    Время и запросы меряются без tracemalloc, который замедляет
+    выполнение; пик памяти — отдельным коротким прогоном.
+    """
+
+    client = Client()
+    for _ in range(warmup):
+        _prepare(client, scenario)()
+    timings = []
+    queries = []
+    for _ in range(requests):
+        send = _prepare(client, scenario)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            send()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(memory_requests):
+            send = _prepare(client, scenario)
+            tracemalloc.reset_peak()
+            send()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    timings.sort()
+    result = {
+        'requests': requests,
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+    for rank in PERCENTILES:
+        result['p{}_ms'.format(rank)] = round(percentile(timings, rank), 3)
+    return result
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(requests: int, warmup: int, memory_requests: int,
+        names: Optional[List[str]], clear_cache: bool, rng: random.Random,
+        log: Log) -> Dict[str, Any]:
+    """Прогоняет сценарии и возвращает отчет для записи в JSON."""
+
+    results = {}
+    for scenario in scenarios(rng):
+        if names and scenario.name not in names:
+            continue
+        if clear_cache:
+            for cache in caches.all():
+                cache.clear()
+        results[scenario.name] = measure(scenario, requests, warmup,
+                                         memory_requests)
+        log('{}: p50 {p50_ms} мс, p95 {p95_ms} мс, p99 {p99_ms} мс, '
+            'запросов {queries_mean}, память {peak_memory_kb} КБ'.format(
+                scenario.name, **results[scenario.name]))
+    return {
+        'meta': {
+            'commit': _commit(),
+            'date': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests': requests,
+            'warmup': warmup,
+            'cache_cleared': clear_cache,
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        },
+        'results': results,
+    }
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Строки сравнения p95 и числа запросов с прошлым отчетом."""
+
+    lines = []
+    for name, result in current['results'].items():
+        before = previous.get('results', {}).get(name)
+        if before is None:
+            continue
+        change = ((result['p95_ms'] - before['p95_ms'])
+                  / before['p95_ms'] * 100 if before['p95_ms'] else 0)
+        lines.append(
+            '{}: p95 {} → {} мс ({:+.1f}%), запросов {} → {}'.format(
+                name, before['p95_ms'], result['p95_ms'], change,
+                before['queries_mean'], result['queries_mean']))
+    return lines
@@ -0,0 +1,58 @@
+"""Массовые вставки пачками с отчетом о ходе.
+
+Общая часть заполнения базы для замеров (``benchmark``) и загрузки
+данных из файлов (``transfer``).
+"""
+import contextlib
+import itertools
+import time
+from typing import Callable, Iterator, List, Optional
+
+from django.db import transaction
+
+Log = Callable[[str], None]
+
+
+@contextlib.contextmanager
+def explicit_created(*models) -> Iterator[None]:
+    """Позволяет задать ``created`` при bulk_create, отключая auto_now_add."""
+
+    fields = [model._meta.get_field('created') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batches(objects: Iterator, size: int) -> Iterator[List]:
+    objects = iter(objects)
+    while True:
+        batch = list(itertools.islice(objects, size))
+        if not batch:
+            return
+        yield batch
+
+
+def rate(done: int, started: float) -> str:
+    return '{:.0f} строк/с'.format(
+        done / max(time.perf_counter() - started, 1e-9))
+
+
+def bulk_insert(model, objects: Iterator, batch_size: int, log: Log,
+                total: Optional[int] = None, **options) -> int:
+    """Вставляет объекты пачками, каждую в своей транзакции."""
+
+    inserted = 0
+    started = time.perf_counter()
+    for batch in batches(objects, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, **options)
+        inserted += len(batch)
+        log('{}: {}{} ({})'.format(
+            model._meta.verbose_name_plural, inserted,
+            '' if total is None else ' из {}'.format(total),
+            rate(inserted, started)))
+    return inserted
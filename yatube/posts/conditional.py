@@ -0,0 +1,120 @@
+"""Валидаторы условных GET-запросов страниц posts.
+
+ETag страницы считается до рендеринга из дешевых данных: версий
+фрагментов лент из кэша (их повышают сигналы при любом изменении ленты),
+счетчиков и даты изменения записи. Если у браузера та же версия,
+``django.views.decorators.http.condition`` отвечает 304 без запуска view.
+
+В ETag входят пользователь и полный адрес страницы: шапка и кнопки
+зависят от того, кто смотрит, а лента — от номера страницы или курсора.
+Last-Modified не отдается: удаление записи или комментария не делает
+страницу «новее» ни по одной дате, и клиент с одним If-Modified-Since
+получил бы устаревшую копию.
+
+Те же валидаторы отдает JSON API (``posts.api``): адреса API другие,
+поэтому ETag страниц и API не совпадают.
+"""
+import hashlib
+from typing import Optional
+
+from django.db.models import Count, Max, Sum
+
+from . import follow_graph, fragments, suggestions, timeline
+from .models import Group, Post, TimelineEntry, User
+
+
+def _etag(request, *parts) -> str:
+    data = [request.user.pk, request.get_full_path(), *parts]
+    return hashlib.md5(repr(data).encode()).hexdigest()
+
+
+def _feed_etag(request, scope: str) -> str:
+    return _etag(request, fragments.versions(scope, fragments.ALL_FEEDS))
+
+
+def index_etag(request) -> str:
+    return _feed_etag(request, fragments.index_scope())
+
+
+def group_etag(request, slug) -> Optional[str]:
+    group_id = (Group.objects.filter(slug=slug)
+                .values_list('pk', flat=True).first())
+    if group_id is None:
+        return None
+    return _feed_etag(request, fragments.group_scope(group_id))
+
+
+def profile_etag(request, username) -> Optional[str]:
+    """Версия ленты автора, его счетчики, подписки смотрящего и версия
+    рекомендаций."""
+
+    author = User.objects.filter(username=username).values(
+        'pk', 'first_name', 'last_name', 'stats__posts_count',
+        'stats__followers_count', 'stats__following_count').first()
+    if author is None:
+        return None
+    # Подписки смотрящего: от них зависят кнопка подписки и то, какие
+    # рекомендации (suggestions) еще показывать.
+    following = None
+    if request.user.is_authenticated:
+        following = follow_graph.following_ids(request.user.pk)
+    return _etag(request, sorted(author.items()), following,
+                 fragments.versions(fragments.profile_scope(author['pk']),
+                                    fragments.ALL_FEEDS, suggestions.SCOPE))
+
+
+def post_detail_etag(request, post_id) -> Optional[str]:
+    """Дата правки записи, данные ее шапки и версия страницы записи.
+
+    Версию повышают сигналы комментариев: число комментариев не меняется,
+    если один добавили, а другой удалили, и не меняется при правке.
+    """
+
+    post = Post.objects.filter(pk=post_id).values(
+        'updated', 'comments_count', 'author__first_name',
+        'author__last_name', 'author__stats__posts_count',
+        'group__title').first()
+    if post is None:
+        return None
+    return _etag(request, sorted(post.items()),
+                 fragments.versions(fragments.post_scope(post_id)))
+
+
+def comment_thread_etag(request, post_id, comment_id) -> Optional[str]:
+    """Ветка комментария меняется вместе со страницей записи."""
+
+    return post_detail_etag(request, post_id)
+
+
+def api_profile_etag(request, username) -> Optional[str]:
+    """Версия ленты автора и его имя из шапки ответа API."""
+
+    author = User.objects.filter(username=username).values(
+        'pk', 'first_name', 'last_name').first()
+    if author is None:
+        return None
+    return _etag(request, sorted(author.items()),
+                 fragments.versions(fragments.profile_scope(author['pk']),
+                                    fragments.ALL_FEEDS))
+
+
+def follow_index_etag(request) -> Optional[str]:
+    """Состояние ленты подписок читателя и его подписки.
+
+    Лента хранится строками ``TimelineEntry`` (не больше
+    ``TIMELINE_LENGTH``), поэтому ее число строк, самая свежая запись,
+    последняя правка записей и их комментарии считаются одним запросом,
+    сколько бы авторов ни читал пользователь. Записи знаменитостей
+    подтягиваются в ленту до подсчета, как при ее чтении.
+    """
+
+    if not request.user.is_authenticated:
+        return None
+    timeline.pull_celebrity_posts(request.user.pk)
+    state = TimelineEntry.objects.filter(user=request.user).aggregate(
+        entries=Count('pk'), latest=Max('created'),
+        updated=Max('post__updated'),
+        comments=Sum('post__comments_count'))
+    return _etag(request, sorted(state.items()),
+                 follow_graph.following_ids(request.user.pk),
+                 fragments.versions(fragments.ALL_FEEDS))
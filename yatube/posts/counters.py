@@ -0,0 +1,122 @@
+"""Денормализованные счетчики записей, комментариев и подписок.
+
+Счетчики меняются атомарно выражениями ``F()`` в сигналах моделей.
+Если они разошлись с данными (например, после ``bulk_create``), их
+восстанавливает команда ``recount_counters``.
+"""
+from typing import Iterable, Sequence
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat
+
+from .models import Comment, Follow, Post, User, UserStats
+from .threads import SUBTREE_END
+
+
+def _change(queryset, field: str, delta: int) -> int:
+    if delta < 0:
+        queryset = queryset.filter(**{field + '__gt': 0})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_user(user_id: int, field: str, delta: int) -> None:
+    """Меняет счетчик пользователя, создавая строку при необходимости."""
+
+    stats = UserStats.objects.filter(user_id=user_id)
+    if _change(stats, field, delta) or delta < 0:
+        return
+    UserStats.objects.bulk_create([UserStats(user_id=user_id)],
+                                  ignore_conflicts=True)
+    _change(stats, field, delta)
+
+
+def change_comments(post_id: int, delta: int) -> None:
+    _change(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def change_replies(comment_ids: Sequence[int], delta: int) -> None:
+    """Меняет число ответов в ветках комментариев-предков."""
+
+    if comment_ids:
+        _change(Comment.objects.filter(pk__in=comment_ids), 'replies_count',
+                delta)
+
+
+def for_user(user_id: int) -> UserStats:
+    """Счетчики пользователя; для нового пользователя — нулевые."""
+
+    stats = UserStats.objects.filter(user_id=user_id).first()
+    return stats or UserStats(user_id=user_id)
+
+
+def _count(queryset, field: str):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def recount_users(first_pk: int, last_pk: int) -> int:
+    """Пересчитывает счетчики пользователей с pk в [first_pk, last_pk]."""
+
+    users = User.objects.filter(pk__gte=first_pk, pk__lte=last_pk)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in users.values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    return UserStats.objects.filter(
+        user_id__gte=first_pk, user_id__lte=last_pk,
+    ).update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+
+
+def recount_follows(user_ids: Iterable[int]) -> int:
+    """Пересчитывает счетчики подписок пользователей одним UPDATE.
+
+    Для массовых подписок: счетчики берутся из таблицы, а не сдвигаются
+    на число вставленных строк, поэтому верны и при гонке с другими
+    запросами.
+    """
+
+    user_ids = list(user_ids)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in user_ids], ignore_conflicts=True)
+    return UserStats.objects.filter(user_id__in=user_ids).update(
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+
+
+def recount_posts(first_pk: int, last_pk: int) -> int:
+    """Пересчитывает число комментариев записей с pk в [first_pk, last_pk]."""
+
+    return Post.objects.filter(pk__gte=first_pk, pk__lte=last_pk).update(
+        comments_count=_count(Comment.objects.all(), 'post'),
+    )
+
+
+def recount_replies(first_pk: int, last_pk: int) -> int:
+    """Пересчитывает ответы в ветках комментариев к записям с pk в
+    [first_pk, last_pk].
+
+    Потомки комментария — строки той же записи с путем в диапазоне
+    (path, path + SUBTREE_END), см. ``posts.threads``.
+    """
+
+    descendants = Comment.objects.filter(
+        post=OuterRef('post'),
+        path__gt=OuterRef('path'),
+        path__lt=Concat(OuterRef('path'), Value(SUBTREE_END)),
+    )
+    return Comment.objects.filter(
+        post_id__gte=first_pk, post_id__lte=last_pk,
+    ).update(replies_count=Coalesce(Subquery(
+        descendants.order_by().values('post').annotate(total=Count('pk'))
+        .values('total')
+    ), 0))
@@ -0,0 +1,327 @@
+"""Граф подписок в памяти процесса.
+
+Для каждого пользователя хранятся отсортированные массивы ``array('l')``
+с ключами авторов, на которых он подписан, и с ключами его подписчиков:
+по восемь байт на ребро в каждую сторону вместо объекта модели на
+строку. Проверка подписки — бинарный поиск, взаимные подписки —
+пересечение двух отсортированных массивов.
+
+Граф загружается из базы одним проходом при первом обращении или заранее,
+при старте процесса (``warm``, настройка ``FOLLOW_GRAPH_WARM``). Процессы
+согласуются через общий кэш: каждая подписка и отписка после фиксации
+транзакции увеличивает счетчик версии и кладет изменение под ключом с
+номером новой версии. Процесс сверяет версию не чаще раза в
+``FOLLOW_GRAPH_CHECK_INTERVAL`` секунд и доигрывает пропущенные
+изменения, а если их слишком много или часть уже вытеснена из кэша —
+загружает граф заново, пока читатели отвечают по прежнему.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Follow
+
+# Бэкенд алиаса обязан атомарно выполнять incr (см. settings).
+CACHE_ALIAS = 'follow_graph'
+VERSION_KEY = 'follow_graph:version'
+# Сколько хранятся изменения для доигрывания и сколько их доигрывать
+# подряд: дальше дешевле загрузить граф заново.
+CHANGE_TIMEOUT = 60 * 60
+MAX_REPLAY = 1000
+LOAD_CHUNK_SIZE = 10000
+# Изменение графа: (подписчик, автор, +1 или -1); None — граф надо
+# загрузить заново, например после массовой загрузки подписок.
+Change = Optional[Tuple[int, int, int]]
+
+
+def _contains(ids: array, value: int) -> bool:
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def _insert(lists: Dict[int, array], key: int, value: int) -> None:
+    ids = lists.get(key)
+    if ids is None:
+        lists[key] = array('l', [value])
+        return
+    index = bisect_left(ids, value)
+    if index == len(ids) or ids[index] != value:
+        ids.insert(index, value)
+
+
+def _delete(lists: Dict[int, array], key: int, value: int) -> None:
+    ids = lists.get(key)
+    if ids is None:
+        return
+    index = bisect_left(ids, value)
+    if index < len(ids) and ids[index] == value:
+        del ids[index]
+    if not ids:
+        del lists[key]
+
+
+class FollowGraph:
+    """Списки смежности подписок: кто на кого подписан и кто на кого."""
+
+    def __init__(self):
+        self.following: Dict[int, array] = {}
+        self.followers: Dict[int, array] = {}
+        self.version: Optional[int] = None
+
+    def load(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """Строит граф по парам (подписчик, автор), упорядоченным так же.
+
+        При таком порядке оба массива каждого пользователя заполняются
+        по возрастанию, и сортировать их не нужно.
+        """
+
+        self.following, self.followers = {}, {}
+        for user_id, author_id in pairs:
+            self.following.setdefault(user_id, array('l')).append(author_id)
+            self.followers.setdefault(author_id, array('l')).append(user_id)
+
+    def add(self, user_id: int, author_id: int) -> None:
+        _insert(self.following, user_id, author_id)
+        _insert(self.followers, author_id, user_id)
+
+    def remove(self, user_id: int, author_id: int) -> None:
+        _delete(self.following, user_id, author_id)
+        _delete(self.followers, author_id, user_id)
+
+    @property
+    def edges(self) -> int:
+        return sum(len(ids) for ids in self.following.values())
+
+    @property
+    def nbytes(self) -> int:
+        """Память под массивы ключей, без словарей и заголовков массивов."""
+
+        return sum(ids.itemsize * len(ids)
+                   for lists in (self.following, self.followers)
+                   for ids in lists.values())
+
+
+_graph = FollowGraph()
+# Под _lock читается и доигрывается граф; полная загрузка идет под
+# _load_lock, чтобы читатели тем временем отвечали по старому графу.
+_lock = threading.Lock()
+_load_lock = threading.Lock()
+_checked_at: Optional[float] = None
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _change_key(version: int) -> str:
+    return 'follow_graph:change:{}'.format(version)
+
+
+def _current_version(cache) -> int:
+    """Версия графа в общем кэше; создается, если ее там нет.
+
+    Начальная версия берется из текущего времени, как у фрагментов: после
+    вытеснения ключа она не совпадет с версией, загруженной процессами.
+    """
+
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _apply(graph: FollowGraph, changes: Iterable[Change]) -> bool:
+    """Применяет изменения; False, если среди них есть «загрузить заново»."""
+
+    changes = list(changes)
+    if None in changes:
+        return False
+    for user_id, author_id, delta in changes:
+        if delta > 0:
+            graph.add(user_id, author_id)
+        else:
+            graph.remove(user_id, author_id)
+    return True
+
+
+def _missed_changes(cache, since: Optional[int],
+                    version: int) -> Optional[List[Change]]:
+    """Изменения после версии ``since`` до ``version``, если они все есть."""
+
+    if since is None:
+        return None
+    keys = [_change_key(number) for number in range(since + 1, version + 1)]
+    if not 0 < len(keys) <= MAX_REPLAY:
+        return None
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return [changes[key] for key in keys]
+
+
+def _due(force: bool) -> bool:
+    """Пора ли сверить версию графа с общим кэшем."""
+
+    return (force or _graph.version is None or _checked_at is None
+            or time.monotonic() - _checked_at
+            >= settings.FOLLOW_GRAPH_CHECK_INTERVAL)
+
+
+def _synced(force: bool = False) -> FollowGraph:
+    """Граф процесса, догнанный до версии в общем кэше.
+
+    Обращения к кэшу и базе идут без ``_lock``: читатели ждут только
+    доигрывания нескольких изменений. Версия читается до загрузки из
+    базы, а изменения публикуются после фиксации транзакции: подписка,
+    зафиксированная во время загрузки, будет доиграна повторно, а
+    повторное добавление и удаление ребра ничего не меняют.
+    """
+
+    global _graph, _checked_at
+    with _lock:
+        if not _due(force):
+            return _graph
+        since = _graph.version
+    cache = _cache()
+    version = _current_version(cache)
+    changes = (None if since == version
+               else _missed_changes(cache, since, version))
+    with _lock:
+        if _graph.version == since and (
+                since == version
+                or changes is not None and _apply(_graph, changes)):
+            _graph.version = version
+            _checked_at = time.monotonic()
+            return _graph
+    # Граф загружает один поток; остальные, если им есть что показать,
+    # отвечают по прежнему графу, а не ждут загрузки.
+    if not _load_lock.acquire(blocking=since is None):
+        return _graph
+    try:
+        with _lock:
+            if _graph.version == version:
+                return _graph
+        graph = FollowGraph()
+        graph.load(Follow.objects.order_by('user_id', 'author_id')
+                   .values_list('user_id', 'author_id')
+                   .iterator(chunk_size=LOAD_CHUNK_SIZE))
+        graph.version = version
+        with _lock:
+            _graph = graph
+            _checked_at = time.monotonic()
+        return graph
+    finally:
+        _load_lock.release()
+
+
+def _publish_now(changes: Sequence[Change]) -> None:
+    """Кладет изменения в кэш под номерами версий, занятыми одним incr.
+
+    Свои изменения процесс сразу применяет к своему графу, если тот не
+    отстал, — иначе догонит его при следующем обращении.
+    """
+
+    global _checked_at
+    cache = _cache()
+    _current_version(cache)
+    try:
+        version = cache.incr(VERSION_KEY, len(changes))
+    except ValueError:
+        # Версию вытеснили между вызовами: новая начальная версия не
+        # совпадет ни с одной загруженной, и процессы перечитают граф.
+        return
+    first = version - len(changes) + 1
+    cache.set_many({_change_key(first + number): change
+                    for number, change in enumerate(changes)},
+                   CHANGE_TIMEOUT)
+    with _lock:
+        if _graph.version == first - 1 and _apply(_graph, changes):
+            _graph.version = version
+        else:
+            _checked_at = None
+
+
+def _publish(*changes: Change) -> None:
+    """Публикует изменения после фиксации текущей транзакции.
+
+    При откате процессы не доиграют подписку, которой не было, а
+    загрузивший граф до фиксации процесс получит ее следующей версией.
+    """
+
+    transaction.on_commit(lambda: _publish_now(changes))
+
+
+def follow_added(user_id: int, author_id: int) -> None:
+    _publish((user_id, author_id, 1))
+
+
+def follow_removed(user_id: int, author_id: int) -> None:
+    _publish((user_id, author_id, -1))
+
+
+def follows_changed(user_id: int, author_ids: Iterable[int],
+                    delta: int) -> None:
+    """Подписки или отписки (``delta`` +1 или -1) на несколько авторов."""
+
+    changes = [(user_id, author_id, delta) for author_id in author_ids]
+    if changes:
+        _publish(*changes)
+
+
+def invalidate() -> None:
+    """Заставляет все процессы загрузить граф заново.
+
+    Нужна после записи подписок в обход сигналов (``bulk_create``,
+    загрузка данных).
+    """
+
+    _publish(None)
+
+
+def warm() -> FollowGraph:
+    """Загружает граф заранее, чтобы первый запрос не ждал загрузки."""
+
+    return _synced(force=True)
+
+
+def is_following(user_id: int, author_id: int) -> bool:
+    graph = _synced()
+    with _lock:
+        ids = graph.following.get(user_id)
+        return ids is not None and _contains(ids, author_id)
+
+
+def following_ids(user_id: int) -> List[int]:
+    """Авторы, на которых подписан пользователь, по возрастанию ключа."""
+
+    graph = _synced()
+    with _lock:
+        return graph.following.get(user_id, array('l')).tolist()
+
+
+def follower_ids(user_id: int) -> List[int]:
+    graph = _synced()
+    with _lock:
+        return graph.followers.get(user_id, array('l')).tolist()
+
+
+def mutuals(user_id: int) -> List[int]:
+    """Пользователи, с которыми подписка взаимная, по возрастанию ключа.
+
+    Каждый ключ меньшего списка ищется бинарным поиском в большем.
+    """
+
+    graph = _synced()
+    with _lock:
+        following = graph.following.get(user_id, array('l'))
+        followers = graph.followers.get(user_id, array('l'))
+        if len(following) > len(followers):
+            following, followers = followers, following
+        return [pk for pk in following if _contains(followers, pk)]
@@ -0,0 +1,156 @@
+"""Запись подписок и отписок, одиночных и по списку имен.
+
+Сигналы ``Follow`` рассчитаны на одну подписку: на каждую строку они
+сдвигают два счетчика, меняют ленту, граф подписок и общий HTTP-кэш —
+по нескольку запросов. Здесь то же делается для всего списка сразу:
+авторы находятся одним запросом ``IN``, строки вставляются одним
+``bulk_create(ignore_conflicts=True)`` (уникальность пары держит
+ограничение ``unique_follow``), а счетчики, лента, граф и кэш
+обновляются по одному разу на весь список. Кнопки подписки в профиле
+идут тем же путем со списком из одного автора: проверка и вставка в
+два шага без INSERT OR IGNORE гонялись бы при двойном клике.
+"""
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, NamedTuple
+
+from django.db import transaction
+
+from core import edge
+
+from . import counters, follow_graph, fragments, timeline
+from .models import Follow, User
+
+# Больше имен за один запрос не принимается.
+MAX_USERNAMES = 500
+SEPARATORS = re.compile(r'[\s,;]+')
+
+_state = threading.local()
+
+
+class BulkResult(NamedTuple):
+    """Имена, по которым подписка изменилась, уже была такой или
+    которых нет."""
+
+    changed: List[str]
+    unchanged: List[str]
+    missing: List[str]
+
+
+def in_bulk() -> bool:
+    """Идет ли в этом потоке массовая запись подписок.
+
+    Сигналы ``Follow`` в это время ничего не делают: их работу для
+    всего списка сразу делает этот модуль.
+    """
+
+    return getattr(_state, 'bulk', False)
+
+
+@contextmanager
+def _bulk() -> Iterator[None]:
+    _state.bulk = True
+    try:
+        yield
+    finally:
+        _state.bulk = False
+
+
+def parse_usernames(values: Iterable[str]) -> List[str]:
+    """Имена из строк через пробелы, запятые или переводы строк.
+
+    Повторы убираются, порядок первого упоминания сохраняется.
+    """
+
+    names = (name for value in values
+             for name in SEPARATORS.split(value) if name)
+    return list(dict.fromkeys(names))
+
+
+def _resolve(usernames: List[str]) -> Dict[str, int]:
+    return dict(User.objects.filter(username__in=usernames)
+                .values_list('username', 'pk'))
+
+
+def _result(usernames: List[str], authors: Dict[str, int],
+            changed_ids: Iterable[int]) -> BulkResult:
+    changed_ids = set(changed_ids)
+    return BulkResult(
+        changed=[name for name in usernames
+                 if authors.get(name) in changed_ids],
+        unchanged=[name for name in usernames
+                   if name in authors and authors[name] not in changed_ids],
+        missing=[name for name in usernames if name not in authors],
+    )
+
+
+def _followed(user: User, author_ids: Iterable[int]):
+    return Follow.objects.filter(user=user, author_id__in=list(author_ids))
+
+
+def _changed(user_id: int, author_ids: List[int], delta: int) -> None:
+    """Счетчики, граф и кэш профилей после изменения подписок."""
+
+    counters.recount_follows([user_id, *author_ids])
+    follow_graph.follows_changed(user_id, author_ids, delta)
+    edge.purge_keys(fragments.profile_scope(user_id),
+                    *[fragments.profile_scope(pk) for pk in author_ids])
+
+
+@transaction.atomic
+def follow_authors(user: User, author_ids: Iterable[int]) -> List[int]:
+    """Подписывает пользователя на авторов; возвращает новые подписки.
+
+    Запись идет через INSERT OR IGNORE, поэтому одновременные запросы
+    (двойной клик, повтор) не создают дублей и не падают на ограничении.
+    Если два запроса сочли одного автора новым, последствия повторятся
+    безвредно: счетчики пересчитываются по таблице, а лента и граф
+    к повторам нечувствительны.
+    """
+
+    author_ids = [pk for pk in author_ids if pk != user.pk]
+    existing = set(_followed(user, author_ids)
+                   .values_list('author_id', flat=True))
+    new_ids = [pk for pk in author_ids if pk not in existing]
+    if new_ids:
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=pk) for pk in new_ids],
+            ignore_conflicts=True)
+        _changed(user.pk, new_ids, 1)
+        timeline.backfill_authors(user.pk, new_ids)
+    return new_ids
+
+
+@transaction.atomic
+def unfollow_authors(user: User, author_ids: Iterable[int]) -> List[int]:
+    """Отписывает пользователя от авторов; возвращает снятые подписки.
+
+    Удаляются все строки пары, поэтому повторная отписка ничего не
+    делает, а не падает.
+    """
+
+    follows = _followed(user, author_ids)
+    removed_ids = list(follows.values_list('author_id', flat=True))
+    if removed_ids:
+        with _bulk():
+            follows.delete()
+        _changed(user.pk, removed_ids, -1)
+        timeline.remove_authors(user.pk, removed_ids)
+    return removed_ids
+
+
+def follow(user: User, usernames: List[str]) -> BulkResult:
+    """Подписывает пользователя на авторов из списка имен."""
+
+    authors = _resolve(usernames)
+    return _result(usernames, authors,
+                   follow_authors(user, authors.values()))
+
+
+def unfollow(user: User, usernames: List[str]) -> BulkResult:
+    """Отписывает пользователя от авторов из списка имен."""
+
+    authors = _resolve(usernames)
+    return _result(usernames, authors,
+                   unfollow_authors(user, authors.values()))
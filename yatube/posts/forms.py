@@ -1,5 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
 from .models import Post, Comment
+from . import images, threads
 
 
 class PostForm(forms.ModelForm):
@@ -14,6 +17,26 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка записи',
         }
 
+    def clean_image(self):
+        """Проверяет размеры новой картинки и перекодирует ее.
+
+        ``ImageField`` к этому моменту только прочитал заголовок и
+        проверил структуру файла, пиксели еще не декодированы. Большие
+        загрузки лежат во временном файле, а не в памяти.
+        """
+
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        images.check_size(image)
+        images.check_pixels(image)
+        try:
+            return images.process(image)
+        except (OSError, ValueError):
+            raise forms.ValidationError(
+                self.fields['image'].error_messages['invalid_image'],
+                code='invalid_image')
+
 
 class CommentForm(forms.ModelForm):
     """Форма комментария"""
@@ -24,3 +47,23 @@ class CommentForm(forms.ModelForm):
         help_texts = {
             'text': 'Введите текст вашего комментария'
         }
+
+
+class ReplyForm(CommentForm):
+    """Форма комментария или ответа на комментарий той же записи"""
+
+    class Meta(CommentForm.Meta):
+        fields = ('text', 'parent')
+        widgets = {
+            'parent': forms.HiddenInput,
+        }
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['parent'].queryset = Comment.objects.filter(post=post)
+
+    def clean_parent(self):
+        parent = self.cleaned_data.get('parent')
+        if parent is None:
+            return parent
+        return threads.reply_target(parent)
@@ -0,0 +1,114 @@
+"""Кэширование HTML-фрагментов лент.
+
+Ключ фрагмента состоит из области (главная, группа, профиль), страницы,
+которую на самом деле показала пагинация, и номера версии области.
+Сигналы моделей повышают версию затронутых областей, и старые фрагменты
+просто перестают читаться — устаревшая страница не показывается даже до
+истечения TTL.
+
+Фрагмент экономит только рендеринг карточек: страница ленты и миниатюры
+читаются во view до проверки ``{% cache %}``, потому что ключ зависит от
+найденной страницы.
+"""
+import hashlib
+import time
+from typing import Any, Dict, Optional
+
+from django.core.cache import caches
+
+CACHE_ALIAS = 'fragments'
+# Время жизни фрагмента. Актуальность обеспечивают версии, поэтому TTL
+# нужен только для вытеснения неиспользуемых ключей.
+FRAGMENT_TIMEOUT = 60 * 60
+# Версия, общая для всех лент: меняется при изменении групп, название
+# которых выводится в карточках записей на любых страницах.
+ALL_FEEDS = 'all'
+
+
+def index_scope() -> str:
+    return 'index'
+
+
+def group_scope(group_id: Optional[int]) -> Optional[str]:
+    return 'group:{}'.format(group_id) if group_id else None
+
+
+def profile_scope(author_id: int) -> str:
+    return 'profile:{}'.format(author_id)
+
+
+def post_scope(post_id: int) -> str:
+    """Область страницы записи.
+
+    Фрагментов у страницы записи нет: области лент и записей служат еще
+    и суррогатными ключами общего HTTP-кэша (``core.edge``).
+    """
+
+    return 'post:{}'.format(post_id)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(scope: str) -> str:
+    return 'fragments:version:{}'.format(scope)
+
+
+def _new_version() -> int:
+    """Начальная версия области.
+
+    Берется из текущего времени, а не с нуля: если ключ версии вытеснен
+    из кэша, новая версия не совпадет с версией старых фрагментов.
+    """
+
+    return int(time.time() * 1000)
+
+
+def versions(*scopes: str) -> str:
+    keys = [_version_key(scope) for scope in scopes]
+    cache = _cache()
+    stored = cache.get_many(keys)
+    for key in keys:
+        if key not in stored:
+            cache.add(key, _new_version(), None)
+            stored[key] = cache.get(key)
+    return '.'.join(str(stored[key]) for key in keys)
+
+
+def invalidate(*scopes: Optional[str]) -> None:
+    """Повышает версии областей; пустые области пропускаются."""
+
+    cache = _cache()
+    for scope in filter(None, scopes):
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def page_key(page_obj) -> str:
+    """Ключ показанной страницы, а не сырых параметров запроса.
+
+    Номер страницы уже ограничен пагинацией, а разные курсоры одной и
+    той же страницы (курсор подписан с отметкой времени, испорченный
+    курсор ведет на первую) дают один ключ: ленту не засорить копиями.
+    """
+
+    if not getattr(page_obj, 'cursor_mode', False):
+        return 'p:{}'.format(page_obj.number)
+    first = page_obj.paginator.key_values(page_obj[0]) if page_obj else None
+    state = [first, len(page_obj), page_obj.has_previous(),
+             page_obj.has_next()]
+    return 'c:' + hashlib.md5(repr(state).encode()).hexdigest()
+
+
+def feed_context(page_obj, scope: str) -> Dict[str, Any]:
+    """Переменные для тега ``{% cache %}`` в шаблоне ленты."""
+
+    return {
+        'cache_timeout': FRAGMENT_TIMEOUT,
+        'cache_key': '{}:{}:{}'.format(scope, versions(scope, ALL_FEEDS),
+                                       page_key(page_obj)),
+    }
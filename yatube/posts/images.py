@@ -0,0 +1,89 @@
+"""Проверка и обработка картинок записей при загрузке.
+
+Загруженный файл сначала проверяется по размеру и по заголовку
+картинки (ширина и высота читаются без декодирования), и только потом
+Pillow его декодирует. Оригинал не сохраняется: в хранилище попадает
+уменьшенная копия в прогрессивном JPEG без EXIF и цветового профиля.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+OUTPUT_FORMAT = 'JPEG'
+OUTPUT_EXTENSION = '.jpg'
+BACKGROUND = (255, 255, 255)
+
+
+def check_size(upload) -> None:
+    limit = settings.POST_IMAGE_MAX_SIZE
+    if upload.size > limit:
+        raise ValidationError(
+            'Файл слишком большой: %(size)s, можно не больше %(limit)s.',
+            code='file_too_large',
+            params={'size': filesizeformat(upload.size),
+                    'limit': filesizeformat(limit)},
+        )
+
+
+def check_pixels(upload) -> None:
+    """Отклоняет картинки, декодирование которых не уложится в память.
+
+    ``Image.open`` читает только заголовок. Нераспознанный файл здесь
+    пропускается: его отклонит обычная проверка ``ImageField``.
+    """
+
+    upload.seek(0)
+    try:
+        width, height = Image.open(upload).size
+    except Exception:
+        return
+    finally:
+        upload.seek(0)
+    limit = settings.POST_IMAGE_MAX_PIXELS
+    if width * height > limit:
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s пикселей.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """Переводит картинку в RGB, подкладывая белый фон под прозрачность."""
+
+    transparent = (image.mode in ('RGBA', 'LA')
+                   or (image.mode == 'P' and 'transparency' in image.info))
+    if not transparent:
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, BACKGROUND)
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def process(upload) -> ContentFile:
+    """Уменьшает картинку и перекодирует ее в прогрессивный JPEG.
+
+    Для JPEG ``draft`` декодирует сразу уменьшенную в 2–8 раз картинку,
+    поэтому большие фотографии с телефона не разворачиваются в память
+    целиком. Поворот из EXIF применяется к пикселям, сами метаданные
+    отбрасываются.
+    """
+
+    dimension = settings.POST_IMAGE_MAX_DIMENSION
+    upload.seek(0)
+    image = Image.open(upload)
+    image.draft('RGB', (dimension, dimension))
+    image = _flatten(ImageOps.exif_transpose(image))
+    image.thumbnail((dimension, dimension), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, OUTPUT_FORMAT,
+               quality=settings.POST_IMAGE_QUALITY,
+               optimize=True, progressive=True)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return ContentFile(buffer.getvalue(), name=stem + OUTPUT_EXTENSION)
@@ -0,0 +1,60 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа, число SQL-запросов и пик памяти '
+            'страниц posts и пишет отчет в JSON. Запускать на отдельной '
+            'базе, заполненной seed_benchmark: сценарии записи меняют '
+            'данные.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Сколько замеренных запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=10,
+                            help='Сколько запросов сделать до замеров.')
+        parser.add_argument(
+            '--memory-requests',
+            type=int,
+            default=10,
+            help='Сколько запросов сделать под tracemalloc для пика памяти.',
+        )
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Замерить только этот сценарий.')
+        parser.add_argument(
+            '--clear-cache',
+            action='store_true',
+            help='Очищать кэши перед каждым сценарием.',
+        )
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора случайных чисел.')
+        parser.add_argument('--output', default='benchmark.json',
+                            help='Файл для отчета.')
+        parser.add_argument('--compare',
+                            help='Прошлый отчет для сравнения.')
+
+    def handle(self, *args, **options):
+        try:
+            report = benchmark.run(
+                requests=options['requests'],
+                warmup=options['warmup'],
+                memory_requests=options['memory_requests'],
+                names=options['scenarios'],
+                clear_cache=options['clear_cache'],
+                rng=random.Random(options['seed']),
+                log=self.stdout.write,
+            )
+        except (ValueError, RuntimeError) as error:
+            raise CommandError(error)
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            'Отчет записан в {}'.format(options['output'])))
+        if options['compare']:
+            with open(options['compare']) as previous:
+                for line in benchmark.compare(json.load(previous), report):
+                    self.stdout.write(line)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации авторов для подписки по графу '
+            'подписок, комментариям и группам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько пользователей пересчитывать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=suggestions.TOP_K,
+            help='Сколько лучших кандидатов хранить на пользователя.',
+        )
+
+    def handle(self, *args, **options):
+        stored = suggestions.compute(options['batch_size'],
+                                     self.stdout.write, options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            'Сохранено рекомендаций: {}'.format(stored)))
@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, записи, комментарии и '
+            'подписки в файлы JSON Lines или CSV, по файлу на модель.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=list(transfer.MODELS),
+            default=list(transfer.MODELS),
+            help='Какие модели выгрузить (по умолчанию все).',
+        )
+        parser.add_argument('--format', choices=transfer.FORMATS,
+                            default='jsonl')
+        parser.add_argument(
+            '--output-dir',
+            default='.',
+            help='Каталог для файлов <модель>.<формат>.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for name in options['models']:
+            path = os.path.join(options['output_dir'],
+                                '{}.{}'.format(name, options['format']))
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                exported = transfer.export(
+                    name, stream, options['format'], options['chunk_size'],
+                    self.stdout.write)
+            self.stdout.write(self.style.SUCCESS(
+                '{}: {} строк'.format(path, exported)))
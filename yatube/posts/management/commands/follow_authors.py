@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Подписывает пользователя на авторов из списка имен '
+            'или отписывает от них.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Кого подписывать.')
+        parser.add_argument(
+            'authors',
+            nargs='*',
+            help='Имена авторов через пробел или запятую.',
+        )
+        parser.add_argument(
+            '--file',
+            help='Файл с именами авторов, по одному в строке.',
+        )
+        parser.add_argument(
+            '--unfollow',
+            action='store_true',
+            help='Отписать от авторов вместо подписки.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(
+                'Нет пользователя {}'.format(options['username']))
+        values = list(options['authors'])
+        if options['file']:
+            with open(options['file'], encoding='utf-8') as lines:
+                values.extend(lines)
+        usernames = follows.parse_usernames(values)
+        change = follows.unfollow if options['unfollow'] else follows.follow
+        changed = unchanged = 0
+        for start in range(0, len(usernames), follows.MAX_USERNAMES):
+            result = change(
+                user, usernames[start:start + follows.MAX_USERNAMES])
+            changed += len(result.changed)
+            unchanged += len(result.unchanged)
+            for name in result.missing:
+                self.stderr.write('Нет автора {}'.format(name))
+        self.stdout.write(self.style.SUCCESS(
+            'Изменено подписок: {}, без изменений: {}'.format(
+                changed, unchanged)))
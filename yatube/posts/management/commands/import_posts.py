@@ -0,0 +1,60 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает файлы, выгруженные export_posts, пачками bulk_create '
+            'и пересчитывает счетчики, ленты подписок и поисковый индекс.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Файлы <модель>.jsonl или <модель>.csv; загружаются в '
+                 'порядке зависимостей моделей.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк вставлять одной транзакцией.',
+        )
+        parser.add_argument(
+            '--no-rebuild',
+            action='store_false',
+            dest='rebuild',
+            help='Не пересчитывать производные данные после загрузки.',
+        )
+
+    def parse_path(self, path):
+        stem, extension = os.path.splitext(os.path.basename(path))
+        fmt = extension.lstrip('.')
+        if stem not in transfer.MODELS or fmt not in transfer.FORMATS:
+            raise CommandError(
+                '{}: ожидается имя <модель>.<формат>, модели: {}, '
+                'форматы: {}'.format(path, ', '.join(transfer.MODELS),
+                                     ', '.join(transfer.FORMATS)))
+        return stem, fmt
+
+    def handle(self, *args, **options):
+        files = sorted(
+            ((self.parse_path(path), path) for path in options['paths']),
+            key=lambda item: list(transfer.MODELS).index(item[0][0]))
+        changes = transfer.Changes()
+        for (name, fmt), path in files:
+            with open(path, encoding='utf-8', newline='') as stream:
+                try:
+                    loaded = transfer.load(
+                        name, transfer.read(stream, fmt),
+                        options['batch_size'], changes, self.stdout.write)
+                except (IntegrityError, ValueError) as error:
+                    raise CommandError('{}: {}'.format(path, error))
+            self.stdout.write(self.style.SUCCESS(
+                '{}: {} строк'.format(path, loaded)))
+        if options['rebuild']:
+            transfer.rebuild(changes, options['batch_size'],
+                             self.stdout.write)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts import search
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает поисковый индекс записей и комментариев '
+            'для текущего бэкенда SEARCH_BACKEND.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк индексировать в одной транзакции.',
+        )
+
+    def reindex(self, title, queryset, index, batch_size):
+        last_pk = queryset.aggregate(last=Max('pk'))['last'] or 0
+        indexed = 0
+        for first_pk in range(1, last_pk + 1, batch_size):
+            batch = queryset.filter(pk__gte=first_pk,
+                                    pk__lt=first_pk + batch_size)
+            with transaction.atomic():
+                for obj in batch:
+                    index(obj)
+                    indexed += 1
+            self.stdout.write(
+                '{}: {} из ~{}'.format(title, indexed, last_pk))
+        return indexed
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        search.backend().clear()
+        posts = self.reindex('Записи', Post.objects.only('text'),
+                             search.index_post, batch_size)
+        comments = self.reindex(
+            'Комментарии', Comment.objects.only('post_id', 'text'),
+            search.index_comment, batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            'Проиндексировано: записей {}, комментариев {}'.format(
+                posts, comments)))
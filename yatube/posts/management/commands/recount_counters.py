@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts import counters
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики записей, комментариев, ответов '
+            'и подписок по данным таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько строк пересчитывать одним UPDATE.',
+        )
+
+    def recount(self, title, model, recount, batch_size):
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        updated = 0
+        for first_pk in range(1, last_pk + 1, batch_size):
+            with transaction.atomic():
+                updated += recount(first_pk, first_pk + batch_size - 1)
+            self.stdout.write(
+                '{}: {} из ~{}'.format(title, updated, last_pk))
+        return updated
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = self.recount('Пользователи', User, counters.recount_users,
+                             batch_size)
+        posts = self.recount('Записи', Post, counters.recount_posts,
+                             batch_size)
+        self.recount('Ветки комментариев записей', Post,
+                     counters.recount_replies, batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            'Пересчитано: пользователей {}, записей {}'.format(users, posts)))
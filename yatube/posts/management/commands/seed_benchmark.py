@@ -0,0 +1,50 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, записями, '
+            'комментариями и подписками для команды benchmark.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=5000000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument(
+            '--follows-per-user',
+            type=int,
+            default=20,
+            help='Среднее число подписок одного пользователя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Сколько строк вставлять одним INSERT.',
+        )
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора случайных чисел.')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(
+                username__startswith=benchmark.USERNAME_PREFIX).exists():
+            raise CommandError(
+                'Данные для замеров уже загружены; используйте чистую базу.')
+        sizes = benchmark.seed(
+            users=options['users'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows_per_user=options['follows_per_user'],
+            groups=options['groups'],
+            batch_size=options['batch_size'],
+            rng=random.Random(options['seed']),
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                '{} {}'.format(name, count) for name, count in sizes.items())))
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:53
+
+from django.db import migrations, models, transaction
+from django.db.models import Count, Min
+
+DEDUP_BATCH_SIZE = 1000
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    """Оставляет по одной подписке на пару (user, author) — с меньшим id.
+
+    Дубликаты удаляются пачками по ``DEDUP_BATCH_SIZE`` пользователей:
+    на пачку один DELETE, который оставляет ``MIN(id)`` каждой пары, в
+    своей транзакции, поэтому блокировка не держится на всю миграцию.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    user_ids = sorted(set(
+        Follow.objects.values('user_id', 'author_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+        .values_list('user_id', flat=True)
+    ))
+    for start in range(0, len(user_ids), DEDUP_BATCH_SIZE):
+        batch = user_ids[start:start + DEDUP_BATCH_SIZE]
+        # Диапазон, а не список id: два параметра вместо тысячи.
+        follows = Follow.objects.filter(user_id__gte=batch[0],
+                                        user_id__lte=batch[-1])
+        keep_ids = (
+            follows.values('user_id', 'author_id')
+            .annotate(keep_id=Min('id'))
+            .order_by()
+            .values('keep_id')
+        )
+        with transaction.atomic(using=schema_editor.connection.alias):
+            follows.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+    # Иначе вся миграция — одна транзакция, и пачки дедупликации не
+    # отпускают блокировку между собой.
+    atomic = False
+
+    dependencies = [
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created'], name='post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'created'], name='post_group_created_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
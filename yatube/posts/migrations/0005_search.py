@@ -0,0 +1,97 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:07
+
+from collections import Counter
+import itertools
+import re
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+FTS_TABLE = 'posts_search'
+BATCH_SIZE = 1000
+_WORD = re.compile(r'[^\W_]+')
+
+
+def _create_fts_table(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE {} USING fts5(body, kind UNINDEXED, '
+                'object_id UNINDEXED, post_id UNINDEXED)'.format(FTS_TABLE))
+        except OperationalError:
+            # SQLite собран без FTS5: работает запасной индекс.
+            return False
+        cursor.execute(
+            "INSERT INTO {} (rowid, body, kind, object_id, post_id) "
+            "SELECT id * 2, text, 'post', id, id "
+            "FROM posts_post".format(FTS_TABLE))
+        cursor.execute(
+            "INSERT INTO {} (rowid, body, kind, object_id, post_id) "
+            "SELECT id * 2 + 1, text, 'comment', id, post_id "
+            "FROM posts_comment".format(FTS_TABLE))
+    return True
+
+
+def _fill_search_terms(apps):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    documents = itertools.chain(
+        ((post_id, None, text) for post_id, text
+         in Post.objects.values_list('id', 'text').iterator()),
+        Comment.objects.values_list('post_id', 'id', 'text').iterator(),
+    )
+    batch = []
+    for post_id, comment_id, text in documents:
+        words = Counter(word[:64] for word in _WORD.findall(text.lower()))
+        batch.extend(
+            SearchTerm(term=term, post_id=post_id, comment_id=comment_id,
+                       frequency=frequency)
+            for term, frequency in words.items())
+        if len(batch) >= BATCH_SIZE:
+            SearchTerm.objects.bulk_create(batch)
+            batch = []
+    SearchTerm.objects.bulk_create(batch)
+
+
+def create_search_index(apps, schema_editor):
+    """Строит поисковый индекс по уже существующим записям."""
+    if not _create_fts_table(schema_editor.connection):
+        _fill_search_terms(apps)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(FTS_TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('frequency', models.PositiveIntegerField(verbose_name='Число повторений')),
+                ('comment', models.ForeignKey(blank=True, help_text='Комментарий, в котором встретилось слово', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Comment', verbose_name='Комментарий')),
+                ('post', models.ForeignKey(help_text='Запись, которая находится по слову', on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Запись')),
+            ],
+            options={
+                'verbose_name': 'Слово поискового индекса',
+                'verbose_name_plural': 'Слова поискового индекса',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term'], name='search_term_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
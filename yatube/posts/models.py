@@ -45,11 +45,31 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True,
     )
+    comments_count = models.IntegerField(
+        verbose_name='Число комментариев',
+        help_text='Поддерживается автоматически',
+        default=0,
+        editable=False,
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата и время изменения',
+        help_text='Автоматически задается при сохранении',
+    )
 
     class Meta:
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
         ordering = ['-created']
+        # Индексы по возрастанию: обратный проход по ним дает порядок
+        # (-created, -pk), которым листаются ленты, без сортировки.
+        indexes = [
+            models.Index(fields=['created'], name='post_created_idx'),
+            models.Index(fields=['author', 'created'],
+                         name='post_author_created_idx'),
+            models.Index(fields=['group', 'created'],
+                         name='post_group_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -84,7 +104,14 @@ class Group(models.Model):
 
 
 class Comment(CreatedModel):
-    """Модель комментариев записи"""
+    """Модель комментариев записи.
+
+    Ответы образуют дерево. ``path`` — материализованный путь: первичные
+    ключи предков и самого комментария, дополненные нулями до одной
+    длины. Ветка комментария — диапазон индекса (post, path), а порядок
+    по ``path`` — обход дерева в глубину. Путь, глубину и счетчики
+    ответов поддерживают сигналы (``posts.threads``).
+    """
 
     post = models.ForeignKey(
         Post,
@@ -104,10 +131,48 @@ class Comment(CreatedModel):
         verbose_name='Текст комментария',
         help_text='Введите текст комментария к записи',
     )
+    parent = models.ForeignKey(
+        'self',
+        verbose_name='Ответ на',
+        help_text='Комментарий, на который это ответ',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+    )
+    path = models.CharField(
+        verbose_name='Путь в дереве',
+        help_text='Поддерживается автоматически',
+        max_length=255,
+        default='',
+        editable=False,
+    )
+    depth = models.PositiveSmallIntegerField(
+        verbose_name='Глубина',
+        help_text='Поддерживается автоматически',
+        default=0,
+        editable=False,
+    )
+    replies_count = models.IntegerField(
+        verbose_name='Число ответов в ветке',
+        help_text='Поддерживается автоматически',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+            # Для навигации по датам в админке.
+            models.Index(fields=['created'], name='comment_created_idx'),
+            models.Index(fields=['post', 'depth', 'created'],
+                         name='comment_post_depth_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+        ]
 
     def __str__(self):
         return self.text[:10]
@@ -134,9 +199,189 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
 
     def __str__(self):
         return 'Подписка пользователя {user} на автора {author}'.format(
             user=self.user,
             author=self.author,
         )
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации записи (fan-out on write), поэтому лента
+    подписок читается одним диапазоном индекса (user, created, post).
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        help_text='Владелец ленты',
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Запись',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        help_text='Автор записи, нужен для чистки ленты при отписке',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата и время публикации',
+        help_text='Копия даты публикации записи',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created', 'post'],
+                         name='timeline_user_created_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return 'Запись {post} в ленте {user}'.format(
+            post=self.post_id,
+            user=self.user_id,
+        )
+
+
+class FollowSuggestion(models.Model):
+    """Автор, которого пользователю стоит почитать.
+
+    Списки лучших кандидатов считаются пакетно командой
+    ``compute_follow_suggestions``; страницы только читают готовый список
+    по индексу (user, score, author) без сортировки.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        help_text='Кому рекомендован автор',
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        help_text='Рекомендованный автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField(
+        verbose_name='Оценка',
+    )
+
+    class Meta:
+        verbose_name = 'Рекомендация автора'
+        verbose_name_plural = 'Рекомендации авторов'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'score', 'author'],
+                         name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return 'Рекомендация {author} для {user}'.format(
+            author=self.author_id,
+            user=self.user_id,
+        )
+
+
+class UserStats(models.Model):
+    """Счетчики пользователя.
+
+    Хранятся отдельно, чтобы профиль и страница записи не считали
+    COUNT(*) при каждом просмотре. Обновляются сигналами, пересчитываются
+    командой ``recount_counters``.
+    """
+
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='stats',
+        primary_key=True,
+    )
+    posts_count = models.IntegerField(
+        verbose_name='Число записей',
+        default=0,
+    )
+    followers_count = models.IntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+    )
+    following_count = models.IntegerField(
+        verbose_name='Число подписок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return 'Счетчики пользователя {user}'.format(user=self.user_id)
+
+
+class SearchTerm(models.Model):
+    """Строка запасного инвертированного индекса поиска.
+
+    Используется, когда в базе нет FTS5: на каждое слово записи или
+    комментария приходится одна строка с числом его повторений.
+    """
+
+    term = models.CharField(
+        verbose_name='Слово',
+        max_length=64,
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Запись',
+        help_text='Запись, которая находится по слову',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        verbose_name='Комментарий',
+        help_text='Комментарий, в котором встретилось слово',
+        on_delete=models.CASCADE,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
+    frequency = models.PositiveIntegerField(
+        verbose_name='Число повторений',
+    )
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Слова поискового индекса'
+        indexes = [
+            models.Index(fields=['term'], name='search_term_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
@@ -0,0 +1,306 @@
+from functools import partial
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.core import signing
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Q, QuerySet
+from django.utils.functional import cached_property
+
+POSTS_PER_PAGE = 10
+# Сколько первых страниц доступно по номеру (?page=N). Дальше лента
+# листается только по курсору, чтобы не делать OFFSET на глубоких страницах.
+SHALLOW_PAGES = 5
+# Сколько соседних номеров страниц показывать в нумерованной выдаче.
+PAGE_LINKS_AROUND = 2
+FEED_ORDERING = ('-created', '-pk')
+# Комментарии к записи читаются по порядку, порциями по курсору.
+COMMENTS_PER_PAGE = 20
+COMMENT_ORDERING = ('created', 'pk')
+# До какого размера таблицы админка считает строки точно.
+EXACT_COUNT_LIMIT = 10000
+
+CURSOR_SALT = 'posts.paginators.cursor'
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def _split_ordering(ordering: Sequence[str]) -> List[Tuple[str, bool]]:
+    """Разбирает ('-created', 'pk') на пары (поле, по убыванию)."""
+
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def _invert_ordering(ordering: Sequence[str]) -> List[str]:
+    return [field[1:] if field.startswith('-') else '-' + field
+            for field in ordering]
+
+
+def _key_value(value: Any) -> Any:
+    """Приводит значение ключа к виду, пригодному для JSON."""
+
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class CursorPage(Sequence):
+    """Страница ленты, полученная по курсору.
+
+    Повторяет интерфейс ``django.core.paginator.Page``, который нужен
+    шаблонам, но не знает ни номера страницы, ни общего числа страниц.
+    Курсоры соседних страниц вычисляются сразу, поэтому ``object_list``
+    можно заменить, например, записями вместо строк ленты.
+    """
+
+    cursor_mode = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor: Optional[str] = None
+        self.previous_cursor: Optional[str] = None
+        if has_next:
+            self.next_cursor = paginator.cursor_after(object_list[-1])
+        if has_previous:
+            self.previous_cursor = paginator.cursor_before(object_list[0])
+
+    def __repr__(self):
+        return '<Cursor page of {} objects>'.format(len(self))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """Пагинатор по ключу сортировки (keyset pagination).
+
+    Страница выбирается условием ``WHERE (created, pk) < (...)`` по
+    последней записи предыдущей страницы, поэтому запрос не использует
+    ни ``COUNT(*)``, ни ``OFFSET`` и одинаково быстр на любой глубине.
+    Курсор — непрозрачная подписанная строка.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 ordering: Sequence[str] = FEED_ORDERING):
+        self.object_list = object_list.order_by(*ordering)
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    @staticmethod
+    def encode(values, direction: str) -> str:
+        return signing.dumps([direction, values], salt=CURSOR_SALT)
+
+    @staticmethod
+    def decode(cursor: str):
+        """Возвращает (направление, значения ключа) или None."""
+
+        try:
+            direction, values = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if direction not in (NEXT, PREVIOUS):
+            return None
+        return direction, values
+
+    def key_values(self, obj) -> list:
+        # Строки .values() — словари, остальное — объекты моделей.
+        get = obj.get if isinstance(obj, dict) else partial(getattr, obj)
+        return [_key_value(get(field))
+                for field, _ in _split_ordering(self.ordering)]
+
+    def cursor_after(self, obj) -> str:
+        return self.encode(self.key_values(obj), NEXT)
+
+    def cursor_before(self, obj) -> str:
+        return self.encode(self.key_values(obj), PREVIOUS)
+
+    @property
+    def last_cursor(self) -> str:
+        """Курсор на последнюю страницу ленты."""
+
+        return self.encode(None, PREVIOUS)
+
+    def _seek(self, values, ordering: Sequence[str]) -> Q:
+        """Условие «строго после values» для заданного порядка."""
+
+        condition = Q()
+        equal = Q()
+        for (field, descending), value in zip(_split_ordering(ordering),
+                                              values):
+            lookup = '{}__{}'.format(field, 'lt' if descending else 'gt')
+            condition |= equal & Q(**{lookup: value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _fetch(self, values, ordering: Sequence[str]):
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, ordering))
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def first_page(self) -> CursorPage:
+        rows, has_next = self._fetch(None, self.ordering)
+        return CursorPage(rows, self, has_next=has_next, has_previous=False)
+
+    def get_page(self, cursor: Optional[str]) -> CursorPage:
+        """Возвращает страницу по курсору.
+
+        Пустой или испорченный курсор ведет на первую страницу.
+        """
+
+        decoded = self.decode(cursor) if cursor else None
+        if decoded is None:
+            return self.first_page()
+        direction, values = decoded
+        if direction == NEXT:
+            rows, has_next = self._fetch(values, self.ordering)
+            return CursorPage(rows, self, has_next=has_next,
+                              has_previous=True)
+        rows, has_previous = self._fetch(values,
+                                         _invert_ordering(self.ordering))
+        if not has_previous and values is not None:
+            # Вернулись к началу ленты: показываем полную первую страницу.
+            return self.first_page()
+        rows.reverse()
+        return CursorPage(rows, self, has_next=values is not None,
+                          has_previous=has_previous)
+
+
+class ShallowPaginator(Paginator):
+    """Пагинатор первых ``SHALLOW_PAGES`` страниц ленты.
+
+    Глубже по номеру ленту не листают, поэтому строки считаются только до
+    первой за этими страницами: ``COUNT(*)`` по подзапросу с LIMIT, а не
+    по всей таблице. Есть ли строки дальше, видно по лишней строке.
+    Если число строк ведется отдельно (счетчики ``UserStats``), его можно
+    передать в ``known_count``. Когда оно не меньше предела, запрос не
+    нужен: точное значение ни на что не влияет. Меньшее значение
+    перепроверяется запросом — счетчик, разошедшийся с таблицей после
+    загрузки в обход сигналов, не должен прятать записи.
+    """
+
+    def __init__(self, *args, known_count: Optional[int] = None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.known_count = known_count
+
+    @cached_property
+    def count(self) -> int:
+        limit = SHALLOW_PAGES * self.per_page + 1
+        if self.known_count is not None and self.known_count >= limit:
+            return limit
+        return self.object_list[:limit].count()
+
+
+def _shallow_page_number(value: Optional[str]) -> int:
+    """Номер страницы из ``?page=``, не глубже ``SHALLOW_PAGES``.
+
+    Разбирается как в ``Paginator.validate_number``. Номер больше числа
+    страниц ``Paginator.get_page`` заменил бы последней страницей, то
+    есть самым глубоким OFFSET, поэтому номер ограничивается заранее.
+    """
+
+    try:
+        number = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return 1
+    return max(1, min(number, SHALLOW_PAGES))
+
+
+def paginate(request, queryset: QuerySet, per_page: int = POSTS_PER_PAGE,
+             ordering: Sequence[str] = FEED_ORDERING,
+             count: Optional[int] = None):
+    """Возвращает страницу ленты для запроса.
+
+    С параметром ``?cursor=`` используется ``CursorPaginator``. Без него —
+    обычный ``Paginator`` по номеру страницы, чтобы старые ссылки
+    ``?page=N`` продолжали работать. Строки в нем считаются только в
+    пределах этих страниц (``ShallowPaginator``); ``count`` — число
+    строк, если оно уже известно. Номер больше ``SHALLOW_PAGES``
+    открывает страницу ``SHALLOW_PAGES``: с нее ссылка «Следующая»
+    переводит ленту в режим курсора, а COUNT(*) и OFFSET остаются
+    неглубокими.
+    """
+
+    queryset = queryset.order_by(*ordering)
+    cursor: Optional[str] = request.GET.get('cursor')
+    if cursor is not None:
+        return CursorPaginator(queryset, per_page, ordering).get_page(cursor)
+
+    page_obj: Page = ShallowPaginator(
+        queryset, per_page, known_count=count).get_page(
+        _shallow_page_number(request.GET.get('page')))
+    cursor_paginator = CursorPaginator(queryset, per_page, ordering)
+    page_obj.page_links = [number for number in page_obj.paginator.page_range
+                           if number <= SHALLOW_PAGES]
+    page_obj.last_cursor = None
+    if page_obj.paginator.num_pages > SHALLOW_PAGES:
+        page_obj.last_cursor = cursor_paginator.last_cursor
+    page_obj.next_cursor = None
+    if page_obj.number >= SHALLOW_PAGES and page_obj.has_next():
+        page_obj.next_cursor = cursor_paginator.cursor_after(page_obj[-1])
+    return page_obj
+
+
+def paginate_numbered(request, object_list, per_page: int = POSTS_PER_PAGE):
+    """Страница выдачи, которую листают только по номеру.
+
+    Для списков без ключа сортировки, например результатов поиска по
+    релевантности. Показываются номера соседних страниц.
+    """
+
+    page_obj: Page = Paginator(object_list, per_page).get_page(
+        request.GET.get('page'))
+    page_obj.page_links = [
+        number for number in page_obj.paginator.page_range
+        if abs(number - page_obj.number) <= PAGE_LINKS_AROUND]
+    page_obj.last_cursor = page_obj.next_cursor = None
+    return page_obj
+
+
+def paginate_comments(request, queryset: QuerySet,
+                      per_page: int = COMMENTS_PER_PAGE) -> CursorPage:
+    """Порция комментариев записи по курсору ``?cursor=``.
+
+    Курсор идет по индексу (post, created), поэтому любая порция читается
+    одним коротким запросом даже у записи с десятками тысяч комментариев.
+    """
+
+    return CursorPaginator(queryset, per_page, COMMENT_ORDERING).get_page(
+        request.GET.get('cursor'))
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор админки без ``COUNT(*)`` по всей таблице.
+
+    Число строк нефильтрованного списка оценивается наибольшим pk — это
+    один шаг по индексу первичного ключа. Удаленные строки оценка не
+    учитывает, поэтому последняя страница может оказаться пустой. Списки
+    с фильтром, поиском или датой и небольшие таблицы считаются точно.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or queryset.query.where:
+            return super().count
+        estimate = (queryset.model._default_manager
+                    .aggregate(last=Max('pk'))['last'] or 0)
+        if estimate <= EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
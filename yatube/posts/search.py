@@ -0,0 +1,276 @@
+"""Полнотекстовый поиск по записям и комментариям.
+
+Записи и комментарии — отдельные документы индекса, найденный
+комментарий приводит к своей записи. На SQLite с FTS5 индекс хранится
+в виртуальной таблице ``posts_search`` и ранжируется по bm25. Без FTS5
+используется таблица ``SearchTerm``: слова выделяются на Python,
+ранжирование — tf-idf. Индекс обновляется сигналами моделей, а после
+смены бэкенда или массовой загрузки перестраивается командой
+``rebuild_search_index``.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post, SearchTerm
+
+FTS_TABLE = 'posts_search'
+POST = 'post'
+COMMENT = 'comment'
+TERM_LENGTH = 64
+# Слова запроса сверх этого числа отбрасываются.
+MAX_QUERY_TERMS = 10
+
+# Как токенизатор unicode61 в FTS5: буквы и цифры, «_» — разделитель.
+_WORD = re.compile(r'[^\W_]+')
+_fts_available: Dict[str, bool] = {}
+
+
+class _Subquery(RawSQL):
+    """Подзапрос SQL для ``pk__in``.
+
+    ``RawSQL`` сам берет SQL в скобки, и Django 2.2 добавляет вторые:
+    ``IN ((SELECT ...))`` SQLite читает как скалярный подзапрос и берет
+    только первую строку.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def terms(text: str) -> List[str]:
+    return [word[:TERM_LENGTH] for word in _WORD.findall(text.lower())]
+
+
+def query_terms(query: str) -> List[str]:
+    return list(dict.fromkeys(terms(query)))[:MAX_QUERY_TERMS]
+
+
+class FtsIndex:
+    """Индекс в виртуальной таблице FTS5.
+
+    rowid документа вычисляется из его вида и pk, поэтому замена и
+    удаление документа идут по первичному ключу таблицы.
+    """
+
+    @staticmethod
+    def _rowid(kind: str, object_id: int) -> int:
+        return object_id * 2 + (kind == COMMENT)
+
+    @staticmethod
+    def _match(words: List[str]) -> str:
+        # Слова состоят только из букв и цифр, кавычки не нужно
+        # экранировать; слова через пробел — это AND.
+        return ' '.join('"{}"'.format(word) for word in words)
+
+    def add(self, kind: str, object_id: int, post_id: int,
+            text: str) -> None:
+        rowid = self._rowid(kind, object_id)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE), [rowid])
+            cursor.execute(
+                'INSERT INTO {} (rowid, body, kind, object_id, post_id) '
+                'VALUES (%s, %s, %s, %s, %s)'.format(FTS_TABLE),
+                [rowid, text, kind, object_id, post_id])
+
+    def remove(self, kind: str, object_id: int) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid = %s'.format(FTS_TABLE),
+                           [self._rowid(kind, object_id)])
+
+    def clear(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+
+    def count(self, words: List[str]) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(DISTINCT post_id) FROM {0} '
+                'WHERE {0} MATCH %s'.format(FTS_TABLE), [self._match(words)])
+            return cursor.fetchone()[0]
+
+    def post_ids(self, words: List[str], offset: int,
+                 limit: int) -> List[int]:
+        """pk записей по убыванию релевантности лучшего документа."""
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT post_id FROM {0} WHERE {0} MATCH %s '
+                'GROUP BY post_id ORDER BY MIN(rank), post_id DESC '
+                'LIMIT %s OFFSET %s'.format(FTS_TABLE),
+                [self._match(words), limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def matching_ids(self, kind: str, words: List[str]) -> List[int]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT object_id FROM {0} WHERE {0} MATCH %s '
+                'AND kind = %s'.format(FTS_TABLE), [self._match(words), kind])
+            return [row[0] for row in cursor.fetchall()]
+
+    def matching(self, kind: str, words: List[str]) -> RawSQL:
+        return _Subquery(
+            'SELECT object_id FROM {0} WHERE {0} MATCH %s '
+            'AND kind = %s'.format(FTS_TABLE), [self._match(words), kind])
+
+
+class TableIndex:
+    """Запасной индекс в обычной таблице ``SearchTerm``."""
+
+    def __init__(self):
+        self._ranked: Dict[Tuple[str, ...], List[int]] = {}
+
+    @staticmethod
+    def _documents(kind: str, object_id: int):
+        if kind == POST:
+            return SearchTerm.objects.filter(post_id=object_id,
+                                             comment__isnull=True)
+        return SearchTerm.objects.filter(comment_id=object_id)
+
+    def add(self, kind: str, object_id: int, post_id: int,
+            text: str) -> None:
+        self.remove(kind, object_id)
+        comment_id = object_id if kind == COMMENT else None
+        SearchTerm.objects.bulk_create([
+            SearchTerm(term=term, post_id=post_id, comment_id=comment_id,
+                       frequency=frequency)
+            for term, frequency in Counter(terms(text)).items()
+        ])
+
+    def remove(self, kind: str, object_id: int) -> None:
+        self._documents(kind, object_id).delete()
+
+    def clear(self) -> None:
+        SearchTerm.objects.all().delete()
+
+    def _scores(self, words: List[str]):
+        """Оценки tf-idf документов, в которых есть все слова запроса."""
+
+        documents = defaultdict(dict)
+        rows = SearchTerm.objects.filter(term__in=words).values_list(
+            'post_id', 'comment_id', 'term', 'frequency')
+        for post_id, comment_id, term, frequency in rows:
+            documents[post_id, comment_id][term] = frequency
+        total = Post.objects.count() + Comment.objects.count()
+        found = Counter(term for document in documents.values()
+                        for term in document)
+        for (post_id, comment_id), document in documents.items():
+            if len(document) < len(words):
+                continue
+            yield post_id, comment_id, sum(
+                (1 + math.log(frequency)) * math.log(1 + total / found[term])
+                for term, frequency in document.items())
+
+    def _ranked_post_ids(self, words: List[str]) -> List[int]:
+        key = tuple(words)
+        if key not in self._ranked:
+            best = {}
+            for post_id, _, score in self._scores(words):
+                best[post_id] = max(score, best.get(post_id, score))
+            self._ranked[key] = sorted(
+                best, key=lambda post_id: (-best[post_id], -post_id))
+        return self._ranked[key]
+
+    def count(self, words: List[str]) -> int:
+        return len(self._ranked_post_ids(words))
+
+    def post_ids(self, words: List[str], offset: int,
+                 limit: int) -> List[int]:
+        return self._ranked_post_ids(words)[offset:offset + limit]
+
+    def matching_ids(self, kind: str, words: List[str]) -> List[int]:
+        return [comment_id if kind == COMMENT else post_id
+                for post_id, comment_id, _ in self._scores(words)
+                if (comment_id is None) == (kind == POST)]
+
+    def matching(self, kind: str, words: List[str]) -> QuerySet:
+        # У документа одна строка на слово: все слова запроса есть
+        # в документе, если нашлось столько же его строк.
+        field = 'post_id' if kind == POST else 'comment_id'
+        return (SearchTerm.objects
+                .filter(term__in=words, comment__isnull=kind == POST)
+                .values(field).annotate(found=Count('term'))
+                .filter(found=len(words)).values(field))
+
+
+def fts_available() -> bool:
+    """Есть ли в текущей базе таблица FTS5 (ее создает миграция)."""
+
+    name = connection.settings_dict['NAME']
+    if name not in _fts_available:
+        _fts_available[name] = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names())
+    return _fts_available[name]
+
+
+def backend():
+    name = settings.SEARCH_BACKEND
+    if name == 'auto':
+        name = 'fts5' if fts_available() else 'table'
+    return FtsIndex() if name == 'fts5' else TableIndex()
+
+
+def index_post(post: Post) -> None:
+    backend().add(POST, post.pk, post.pk, post.text)
+
+
+def index_comment(comment: Comment) -> None:
+    backend().add(COMMENT, comment.pk, comment.post_id, comment.text)
+
+
+def unindex(kind: str, object_id: int) -> None:
+    backend().remove(kind, object_id)
+
+
+def matching_ids(kind: str, query: str) -> List[int]:
+    """pk записей или комментариев, в которых есть все слова запроса."""
+
+    words = query_terms(query)
+    return backend().matching_ids(kind, words) if words else []
+
+
+def matching(kind: str, query: str) -> Optional[Union[RawSQL, QuerySet]]:
+    """То же подзапросом для ``pk__in``; ``None``, если в запросе нет слов.
+
+    Найденные pk не выгружаются в Python: на частом слове их могут быть
+    миллионы, а список такой длины не поместится в параметры запроса.
+    """
+
+    words = query_terms(query)
+    return backend().matching(kind, words) if words else None
+
+
+class SearchResults:
+    """Найденные записи в порядке релевантности.
+
+    Поддерживает ``count()`` и срезы, поэтому передается прямо в
+    ``Paginator``: срез страницы — это один запрос к индексу и один
+    запрос записей по pk.
+    """
+
+    def __init__(self, query: str):
+        self.words = query_terms(query)
+        self.index = backend()
+
+    def count(self) -> int:
+        return self.index.count(self.words) if self.words else 0
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, item: slice) -> List[Post]:
+        start, stop = item.start or 0, item.stop
+        if not self.words or stop <= start:
+            return []
+        post_ids = self.index.post_ids(self.words, start, stop - start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            post_ids)
+        return [posts[pk] for pk in post_ids if pk in posts]
@@ -0,0 +1,171 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import edge
+
+from . import (counters, follow_graph, follows, fragments, search, threads,
+               thumbnails, timeline)
+from .models import Comment, Follow, Group, Post
+
+
+def _changed(*scopes, pages=()):
+    """Сбрасывает фрагменты лент и общий HTTP-кэш лент и страниц."""
+
+    fragments.invalidate(*scopes)
+    edge.purge_keys(*scopes, *pages)
+
+
+def _invalidate_post_feeds(post_id, author_id, *group_ids):
+    """Ленты с записью и сама страница записи: ее версия входит в ETag
+    страницы, фрагмента и веток комментариев (conditional)."""
+
+    _changed(
+        fragments.index_scope(),
+        fragments.profile_scope(author_id),
+        fragments.post_scope(post_id),
+        *[fragments.group_scope(group_id) for group_id in group_ids],
+    )
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминает прежнюю группу, чтобы сбросить и ее ленту."""
+
+    instance._previous_group_id = None
+    if instance.pk:
+        instance._previous_group_id = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    _invalidate_post_feeds(instance.pk, instance.author_id, instance.group_id,
+                           getattr(instance, '_previous_group_id', None))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    """Сбрасывает ленты с записью: в карточке есть число комментариев."""
+
+    post = (Post.objects.filter(pk=instance.post_id)
+            .values('author_id', 'group_id').first())
+    if post is not None:
+        _invalidate_post_feeds(instance.post_id, post['author_id'],
+                               post['group_id'])
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    """Название группы выводится в карточках всех лент."""
+
+    _changed(fragments.group_scope(instance.pk), fragments.ALL_FEEDS)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    """В профилях выводятся числа подписчиков и подписок."""
+
+    if follows.in_bulk():
+        return
+    edge.purge_keys(fragments.profile_scope(instance.author_id),
+                    fragments.profile_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Раскладывает новую запись по лентам подписчиков."""
+
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    """Строит миниатюры картинки после фиксации транзакции."""
+
+    image_name = instance.image.name
+    if image_name:
+        transaction.on_commit(lambda: thumbnails.schedule(image_name))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    """Ставит комментарий в дерево ответов и считает его."""
+
+    if created:
+        threads.place(instance)
+        counters.change_comments(instance.post_id, 1)
+        counters.change_replies(threads.ancestor_ids(instance.path), 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    counters.change_replies(threads.ancestor_ids(instance.path), -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Заполняет ленту записями автора, на которого подписались."""
+
+    if created:
+        counters.change_user(instance.user_id, 'following_count', 1)
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    """Убирает из ленты записи автора, от которого отписались."""
+
+    if follows.in_bulk():
+        return
+    counters.change_user(instance.user_id, 'following_count', -1)
+    counters.change_user(instance.author_id, 'followers_count', -1)
+    timeline.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def add_follow_edge(sender, instance, created, **kwargs):
+    if created:
+        follow_graph.follow_added(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_follow_edge(sender, instance, **kwargs):
+    if follows.in_bulk():
+        return
+    follow_graph.follow_removed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex(search.POST, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex(search.COMMENT, instance.pk)
@@ -0,0 +1,166 @@
+"""Рекомендации авторов для подписки («кого почитать»).
+
+Оценка кандидата для пользователя — взвешенная сумма трех сигналов:
+
+* друзья друзей: сколько авторов, на которых подписан пользователь,
+  сами подписаны на кандидата;
+* комментарии: сколько раз пользователь и кандидат комментировали одни
+  и те же записи, считая автора записи;
+* группы: пишет ли кандидат много в группах, где пишет пользователь.
+
+В матричном виде это строки произведений A·A, C·Cᵀ и G·Tᵀ разреженных
+матриц смежности. Матрицы хранятся списками смежности (граф подписок
+из ``posts.follow_graph`` и словари ниже), а строка произведения
+накапливается в ``Counter`` для одного пользователя за раз: память
+уходит только на сами списки. Записи и группы с очень большим числом
+участников почти ничего не говорят о близости людей, а пар в них —
+квадрат числа участников, поэтому записи пропускаются, а в группах
+кандидатами берутся только самые активные авторы.
+
+Считает оценки команда ``compute_follow_suggestions``; страницы читают
+готовые списки лучших ``TOP_K`` кандидатов.
+"""
+import heapq
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import follow_graph, fragments
+from .bulk import Log, batches, rate
+from .models import Comment, FollowSuggestion, Post, User
+
+# Сколько кандидатов хранится и сколько показывается на странице.
+TOP_K = 20
+SHOWN = 5
+FOLLOW_WEIGHT = 1.0
+COMMENT_WEIGHT = 0.5
+GROUP_WEIGHT = 0.2
+# Записи, у которых больше участников, в сигнал комментариев не входят.
+MAX_POST_MEMBERS = 200
+# Сколько самых активных авторов группы становятся кандидатами.
+GROUP_AUTHORS = 50
+# Область версии для ETag страниц с рекомендациями (см. conditional).
+SCOPE = 'suggestions'
+
+Scored = List[Tuple[int, float]]
+
+
+class Signals:
+    """Разреженные матрицы сигналов, загруженные из базы."""
+
+    def __init__(self, graph: follow_graph.FollowGraph):
+        self.graph = graph
+        self.user_posts: Dict[int, List[int]] = defaultdict(list)
+        self.post_members: Dict[int, List[int]] = {}
+        self.user_groups: Dict[int, List[int]] = defaultdict(list)
+        self.group_authors: Dict[int, List[int]] = {}
+
+    def load_comments(self, chunk_size: int) -> None:
+        members: Dict[int, Set[int]] = defaultdict(set)
+        pairs = (Comment.objects.order_by()
+                 .values_list('post_id', 'author_id').distinct()
+                 .iterator(chunk_size=chunk_size))
+        for post_id, user_id in pairs:
+            members[post_id].add(user_id)
+        authors = (Post.objects.order_by().values_list('pk', 'author_id')
+                   .iterator(chunk_size=chunk_size))
+        for post_id, author_id in authors:
+            if post_id in members:
+                members[post_id].add(author_id)
+        for post_id, users in members.items():
+            if len(users) > MAX_POST_MEMBERS:
+                continue
+            self.post_members[post_id] = sorted(users)
+            for user_id in users:
+                self.user_posts[user_id].append(post_id)
+
+    def load_groups(self) -> None:
+        activity: Dict[int, Counter] = defaultdict(Counter)
+        rows = (Post.objects.exclude(group=None).order_by()
+                .values_list('group_id', 'author_id')
+                .annotate(posts=Count('pk')))
+        for group_id, author_id, posts in rows:
+            activity[group_id][author_id] = posts
+            self.user_groups[author_id].append(group_id)
+        for group_id, authors in activity.items():
+            self.group_authors[group_id] = [
+                author_id
+                for author_id, _ in authors.most_common(GROUP_AUTHORS)]
+
+    def scores(self, user_id: int, top_k: int = TOP_K) -> Scored:
+        """Лучшие кандидаты пользователя: строка суммы произведений."""
+
+        scores: Counter = Counter()
+        following = self.graph.following
+        for friend_id in following.get(user_id, ()):
+            for author_id in following.get(friend_id, ()):
+                scores[author_id] += FOLLOW_WEIGHT
+        for post_id in self.user_posts.get(user_id, ()):
+            for author_id in self.post_members[post_id]:
+                scores[author_id] += COMMENT_WEIGHT
+        for group_id in self.user_groups.get(user_id, ()):
+            for author_id in self.group_authors[group_id]:
+                scores[author_id] += GROUP_WEIGHT
+        for author_id in (user_id, *following.get(user_id, ())):
+            scores.pop(author_id, None)
+        return heapq.nlargest(top_k, scores.items(),
+                              key=lambda item: (item[1], item[0]))
+
+
+def load_signals(chunk_size: int) -> Signals:
+    signals = Signals(follow_graph.warm())
+    signals.load_comments(chunk_size)
+    signals.load_groups()
+    return signals
+
+
+def _rows(signals: Signals, user_ids: Sequence[int],
+          top_k: int) -> Iterator[FollowSuggestion]:
+    for user_id in user_ids:
+        for author_id, score in signals.scores(user_id, top_k):
+            yield FollowSuggestion(user_id=user_id, author_id=author_id,
+                                   score=score)
+
+
+def compute(batch_size: int, log: Log, top_k: int = TOP_K) -> int:
+    """Пересчитывает рекомендации всех пользователей.
+
+    Пользователи идут пачками; списки пачки заменяются в одной
+    транзакции, поэтому страницы не видят пачку наполовину.
+    """
+
+    signals = load_signals(batch_size)
+    log('Сигналы загружены')
+    started = time.perf_counter()
+    users = (User.objects.order_by('pk').values_list('pk', flat=True)
+             .iterator(chunk_size=batch_size))
+    done = stored = 0
+    for user_ids in batches(users, batch_size):
+        rows = list(_rows(signals, user_ids, top_k))
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+            FollowSuggestion.objects.bulk_create(rows, batch_size=batch_size)
+        done += len(user_ids)
+        stored += len(rows)
+        log('Пользователи: {} ({})'.format(done, rate(done, started)))
+    fragments.invalidate(SCOPE)
+    return stored
+
+
+def for_user(user_id: int, exclude: Iterable[int] = (),
+             limit: int = SHOWN) -> List[User]:
+    """Рекомендованные авторы без тех, на кого уже есть подписка.
+
+    Подписки за время после расчета отсеиваются по графу в памяти, без
+    запросов к базе.
+    """
+
+    skipped = set(follow_graph.following_ids(user_id)).union(exclude)
+    rows = (FollowSuggestion.objects.filter(user_id=user_id)
+            .select_related('author')
+            .order_by('-score', '-author_id')[:TOP_K])
+    return [row.author for row in rows
+            if row.author_id not in skipped][:limit]
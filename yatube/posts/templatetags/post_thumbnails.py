@@ -0,0 +1,15 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+# Готовая миниатюра картинки записи: словарь с url, width и height.
+# Для страниц ленты миниатюры заранее загружены thumbnails.prefetch().
+@register.simple_tag
+def post_thumbnail(post, geometry):
+    prefetched = getattr(post, 'prefetched_thumbnails', None)
+    if prefetched is not None and geometry in prefetched:
+        return prefetched[geometry]
+    return thumbnails.lookup(post.image.name, geometry)
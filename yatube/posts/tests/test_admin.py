@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import paginators
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    """Списки админки не зависят по числу запросов от числа строк."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        cls.unused_group = Group.objects.create(
+            title='Группа без записей', slug='unused',
+            description='Описание')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            author = User.objects.create_user(
+                username='admin_author_{}'.format(User.objects.count()))
+            group = Group.objects.create(
+                title='Группа {}'.format(author.pk),
+                slug='admin-{}'.format(author.pk), description='Описание')
+            post = Post.objects.create(author=author, group=group,
+                                       text='Запись')
+            Comment.objects.create(post=post, author=author, text='Ответ')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_changelists_do_not_query_per_row(self):
+        urls = [reverse('admin:posts_{}_changelist'.format(model))
+                for model in ('post', 'comment', 'follow')]
+        self.add_rows(2)
+        before = {url: len(self.queries(url)) for url in urls}
+        self.add_rows(10)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(len(self.queries(url)), before[url])
+
+    def test_forms_do_not_list_all_groups(self):
+        self.add_rows(1)
+        post = Post.objects.get()
+        for url in (reverse('admin:posts_post_changelist'),
+                    reverse('admin:posts_post_change', args=[post.pk])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, post.group.title)
+                self.assertNotContains(response, self.unused_group.title)
+
+    @mock.patch('posts.paginators.EXACT_COUNT_LIMIT', 0)
+    def test_unfiltered_count_is_estimated(self):
+        self.add_rows(3)
+        Post.objects.order_by('pk').first().delete()
+        url = reverse('admin:posts_post_changelist')
+        sql = self.queries(url)
+        self.assertFalse([query for query in sql if 'COUNT(' in query])
+        paginator = paginators.EstimatedCountPaginator(
+            Post.objects.all(), 10)
+        self.assertEqual(paginator.count, Post.objects.latest('pk').pk)
+        filtered = paginators.EstimatedCountPaginator(
+            Post.objects.filter(group__isnull=False), 10)
+        self.assertEqual(filtered.count, 2)
+
+    def test_date_hierarchy_drilldown(self):
+        self.add_rows(1)
+        created = Post.objects.get().created
+        response = self.client.get(reverse('admin:posts_post_changelist'), {
+            'created__year': created.year,
+            'created__month': created.month,
+        })
+        self.assertEqual(response.context['cl'].result_count, 1)
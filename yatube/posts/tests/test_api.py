@@ -0,0 +1,163 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import fragments
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import POSTS_PER_PAGE
+from posts.tests.utils import run_on_commit
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(title='Группа', slug='api',
+                                         description='Описание')
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text='Запись {}'.format(number))
+            for number in range(POSTS_PER_PAGE + 3)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.authorized = Client()
+        self.authorized.force_login(self.reader)
+
+    def get_json(self, client, url, **params):
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()
+
+    def walk(self, client, url):
+        """Все страницы ленты по ссылкам next."""
+
+        ids = []
+        while url:
+            page = self.get_json(client, url)
+            ids.extend(post['id'] for post in page['results'])
+            url = page['next']
+        return ids
+
+    def test_feeds_list_all_posts_newest_first(self):
+        expected = [post.pk for post in reversed(self.posts)]
+        for client, url in (
+                (self.guest, reverse('posts:api_index')),
+                (self.guest, reverse('posts:api_group_posts',
+                                     args=[self.group.slug])),
+                (self.guest, reverse('posts:api_profile',
+                                     args=[self.author.username])),
+                (self.authorized, reverse('posts:api_follow_index'))):
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(client, url), expected)
+
+    def test_post_fields(self):
+        page = self.get_json(self.guest, reverse('posts:api_index'))
+        self.assertEqual(page['results'][0], {
+            'id': self.post.pk,
+            'author': 'api_author',
+            'group': 'api',
+            'text': self.post.text,
+            'created': DjangoJSONEncoder().default(self.post.created),
+            'updated': DjangoJSONEncoder().default(self.post.updated),
+            'image': None,
+            'comments_count': 1,
+        })
+        self.assertIsNone(page['previous'])
+
+    def test_post_detail_with_comments(self):
+        data = self.get_json(self.guest, reverse('posts:api_post_detail',
+                                                 args=[self.post.pk]))
+        self.assertEqual(data['post']['id'], self.post.pk)
+        self.assertEqual([comment['text']
+                          for comment in data['comments']['results']],
+                         ['Комментарий'])
+
+    def test_one_query_per_projection(self):
+        with self.assertNumQueries(1):
+            self.guest.get(reverse('posts:api_index'))
+        # Плюс чтение строки записи для ETag.
+        with self.assertNumQueries(3):
+            self.guest.get(reverse('posts:api_post_detail',
+                                   args=[self.post.pk]))
+
+    def test_not_found_and_unauthorized(self):
+        for url, status in (
+                (reverse('posts:api_group_posts', args=['missing']), 404),
+                (reverse('posts:api_profile', args=['missing']), 404),
+                (reverse('posts:api_post_detail', args=[0]), 404),
+                (reverse('posts:api_follow_index'), 401)):
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+
+    def test_conditional_get(self):
+        url = reverse('posts:api_index')
+        etag = self.guest.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        post = Post.objects.create(author=self.author, text='Новая')
+        response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        post.delete()
+        self.assertEqual(
+            self.guest.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_conditional_get_of_post_and_follow_feed(self):
+        detail = reverse('posts:api_post_detail', args=[self.post.pk])
+        follow = reverse('posts:api_follow_index')
+        etags = {url: self.authorized.get(url)['ETag']
+                 for url in (detail, follow)}
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.authorized.get(
+                    url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Comment.objects.filter(post=self.post).get().delete()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.authorized.get(
+                    url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @mock.patch('posts.follow_graph.transaction.on_commit', run_on_commit)
+    def test_follow_feed_etag_does_not_grow_with_follows(self):
+        url = reverse('posts:api_follow_index')
+
+        def revalidate():
+            etag = self.authorized.get(url)['ETag']
+            with CaptureQueriesContext(connection) as queries, \
+                    mock.patch.object(fragments, 'versions',
+                                      wraps=fragments.versions) as versions:
+                response = self.authorized.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            scopes = [len(call.args) for call in versions.call_args_list]
+            return len(queries), scopes
+
+        before = revalidate()
+        for number in range(20):
+            author = User.objects.create_user(
+                username='api_followed_{}'.format(number))
+            Follow.objects.create(user=self.reader, author=author)
+        self.assertEqual(revalidate(), before)
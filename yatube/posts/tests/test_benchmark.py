@@ -0,0 +1,86 @@
+import io
+import json
+import os
+import random
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import benchmark, follow_graph, threads
+from posts.models import Comment, Follow, Post, TimelineEntry, User
+
+
+class BenchmarkTest(TestCase):
+    """Засев данных и замеры на маленьком наборе."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with mock.patch.object(follow_graph, 'invalidate') as invalidate:
+            call_command('seed_benchmark', users=30, posts=200, comments=300,
+                         groups=3, follows_per_user=3, batch_size=50,
+                         stdout=io.StringIO())
+        cls.graph_invalidated = invalidate.called
+
+    def test_seed_creates_dataset(self):
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        # Даты разбросаны, а не проставлены auto_now_add.
+        self.assertGreater(Post.objects.values('created').distinct().count(),
+                           100)
+        post = Post.objects.order_by('?').first()
+        self.assertEqual(post.comments_count, post.comments.count())
+        # Как после transfer: ветки комментариев и граф подписок.
+        comment = Comment.objects.order_by('?').first()
+        self.assertEqual((comment.path, comment.depth),
+                         (threads.segment(comment.pk), 0))
+        self.assertTrue(self.graph_invalidated)
+
+    def test_seed_refuses_to_run_twice(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', users=1, posts=1, comments=1,
+                         stdout=io.StringIO())
+
+    def test_report_covers_every_view(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            call_command('benchmark', requests=3, warmup=1,
+                         memory_requests=1, output=output,
+                         stdout=io.StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report['meta']['dataset']['posts'],
+                         Post.objects.count())
+        for name in ('index', 'group_posts', 'profile', 'post_detail',
+                     'follow_index', 'post_create', 'post_edit',
+                     'add_comment', 'profile_follow', 'profile_unfollow'):
+            with self.subTest(scenario=name):
+                result = report['results'][name]
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['queries_mean'], 0)
+                self.assertGreater(result['peak_memory_kb'], 0)
+
+    def test_compare_reports(self):
+        previous = {'results': {'index': {'p95_ms': 10.0,
+                                          'queries_mean': 3}}}
+        current = {'results': {'index': {'p95_ms': 15.0,
+                                         'queries_mean': 2}}}
+        self.assertEqual(benchmark.compare(previous, current),
+                         ['index: p95 10.0 → 15.0 мс (+50.0%), '
+                          'запросов 3 → 2'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
+
+    def test_zipf_prefers_first_items(self):
+        choose = benchmark.Zipf(list(range(100)), random.Random(1))
+        picks = [choose() for _ in range(1000)]
+        self.assertGreater(picks.count(0), picks.count(50) * 10)
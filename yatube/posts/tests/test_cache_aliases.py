@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse_lazy
+
+from posts import fragments
+from posts.models import Post
+from yatube.settings import CACHE_ALIASES, cache_config
+
+User = get_user_model()
+
+
+def build_caches(backend, location):
+    return {alias: cache_config(alias, backend, location)
+            for alias in CACHE_ALIASES}
+
+
+class CacheConfigTest(TestCase):
+
+    def test_tests_run_on_in_process_cache(self):
+        for alias in CACHE_ALIASES:
+            with self.subTest(alias=alias):
+                self.assertEqual(settings.CACHES[alias]['BACKEND'],
+                                 'django.core.cache.backends.locmem'
+                                 '.LocMemCache')
+
+    def test_aliases_share_backend_with_own_prefix(self):
+        for backend in ('locmem', 'file', 'db', 'redis'):
+            config = build_caches(backend, 'location')
+            with self.subTest(backend=backend):
+                self.assertEqual(len({alias['BACKEND']
+                                      for alias in config.values()}), 1)
+                self.assertEqual(
+                    len({alias['KEY_PREFIX'] for alias in config.values()}),
+                    len(CACHE_ALIASES))
+
+    @override_settings(CACHES={
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': alias}
+        for alias in CACHE_ALIASES
+    })
+    def test_feed_fragments_use_named_alias(self):
+        Client().get(reverse_lazy('posts:index'))
+        self.assertTrue(caches['fragments']._cache)
+        self.assertFalse(caches['default']._cache)
+
+
+class SharedBackendTest(TestCase):
+    """Ленты работают на общих для процессов бэкендах без внешних служб."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.user = User.objects.create_user(username='cache_author')
+        cls.url = reverse_lazy('posts:index')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    def check_invalidation(self):
+        client = Client()
+        client.get(self.url)
+        post = Post.objects.create(author=self.user, text='Свежая запись')
+        self.assertIn(post.text, client.get(self.url).content.decode())
+        version = fragments.versions(fragments.index_scope())
+        self.assertEqual(caches['fragments'].get(
+            'fragments:version:index'), int(version))
+
+    def test_file_backend(self):
+        with override_settings(CACHES=build_caches('file', self.cache_dir)):
+            self.check_invalidation()
+
+    def test_database_backend(self):
+        with override_settings(CACHES=build_caches('db', 'test_cache')):
+            call_command('createcachetable', verbosity=0)
+            self.check_invalidation()
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.paginators import COMMENTS_PER_PAGE
+
+User = get_user_model()
+
+COMMENTS = 2 * COMMENTS_PER_PAGE + 5
+
+
+class CommentPaginationTest(TestCase):
+    """Комментарии записи отдаются порциями по курсору."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='comments_author')
+        cls.post = Post.objects.create(author=cls.author, text='Запись')
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.author,
+                    text='Комментарий {:03}'.format(number))
+            for number in range(COMMENTS)
+        ])
+        cls.comments = list(Comment.objects.filter(post=cls.post)
+                            .order_by('created', 'pk'))
+        cls.detail_url = reverse('posts:post_detail', args=[cls.post.pk])
+        cls.fragment_url = reverse('posts:post_comments', args=[cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_shows_first_batch(self):
+        response = Client().get(self.detail_url)
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:COMMENTS_PER_PAGE])
+        self.assertContains(response, 'Комментарий 000')
+        self.assertNotContains(
+            response, 'Комментарий {:03}'.format(COMMENTS_PER_PAGE))
+        self.assertContains(response, 'data-fragment="{}?cursor={}"'.format(
+            self.fragment_url, page.next_cursor))
+
+    def test_fragments_continue_until_last_comment(self):
+        client = Client()
+        page = client.get(self.detail_url).context['comments']
+        shown, cursor = list(page), page.next_cursor
+        while cursor:
+            response = client.get(self.fragment_url, {'cursor': cursor})
+            self.assertTemplateUsed(response,
+                                    'posts/includes/comment_list.html')
+            self.assertTemplateNotUsed(response, 'base.html')
+            shown.extend(response.context['comments'])
+            cursor = response.context['comments'].next_cursor
+        self.assertEqual(shown, self.comments)
+        self.assertNotContains(response, 'data-fragment')
+
+    def test_cursor_link_without_javascript(self):
+        client = Client()
+        cursor = client.get(self.detail_url).context['comments'].next_cursor
+        response = client.get(self.detail_url, {'cursor': cursor})
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[COMMENTS_PER_PAGE:2 * COMMENTS_PER_PAGE])
+        self.assertContains(response, 'К первым комментариям')
+
+    def test_batch_cost_does_not_grow_with_comments(self):
+        cursor = Client().get(
+            self.detail_url).context['comments'].next_cursor
+        cache.clear()
+        with self.assertNumQueries(3):
+            Client().get(self.fragment_url, {'cursor': cursor})
+
+    def test_json_batches(self):
+        url = reverse('posts:api_post_comments', args=[self.post.pk])
+        texts = []
+        while url:
+            data = Client().get(url).json()
+            texts.extend(comment['text'] for comment in data['results'])
+            url = data['next']
+        self.assertEqual(texts, [comment.text for comment in self.comments])
+
+    def test_missing_post(self):
+        for url in (reverse('posts:post_comments', args=[0]),
+                    reverse('posts:api_post_comments', args=[0])):
+            with self.subTest(url=url):
+                self.assertEqual(Client().get(url).status_code, 404)
@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    """Ответ 304 на повторный запрос, пока страница не изменилась."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(title='Группа', slug='etag',
+                                         description='Описание')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Запись')
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.authorized = Client()
+        self.authorized.force_login(self.reader)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+
+    def revalidate(self, client, url):
+        """Статус повторного запроса с ETag первого ответа."""
+
+        etag = client.get(url)['ETag']
+        return lambda: client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_pages_not_modified(self):
+        for client in (self.guest, self.authorized):
+            for url in self.urls():
+                with self.subTest(url=url):
+                    self.assertEqual(self.revalidate(client, url)(), 304)
+
+    def test_validator_is_cheaper_than_render(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.guest.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_depends_on_viewer_and_page(self):
+        url = reverse('posts:index')
+        self.assertNotEqual(self.guest.get(url)['ETag'],
+                            self.authorized.get(url)['ETag'])
+        self.assertNotEqual(self.guest.get(url)['ETag'],
+                            self.guest.get(url, {'page': 2})['ETag'])
+
+    def test_new_post_changes_feeds(self):
+        checks = [self.revalidate(self.guest, url) for url in self.urls()[:3]]
+        Post.objects.create(author=self.author, group=self.group,
+                            text='Новая запись')
+        for check in checks:
+            self.assertEqual(check(), 200)
+
+    def test_edit_and_comment_change_post_page(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        check = self.revalidate(self.guest, url)
+        post = Post.objects.get(pk=self.post.pk)
+        updated = post.updated
+        post.text = 'Исправленная запись'
+        post.save()
+        self.assertGreater(post.updated, updated)
+        self.assertEqual(check(), 200)
+        check = self.revalidate(self.guest, url)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        self.assertEqual(check(), 200)
+
+    def test_comment_edit_and_swap_change_post_page(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        comment = Comment.objects.create(post=self.post, author=self.reader,
+                                         text='Комментарий')
+        check = self.revalidate(self.guest, url)
+        comment.text = 'Исправленный комментарий'
+        comment.save()
+        self.assertEqual(check(), 200)
+        check = self.revalidate(self.guest, url)
+        comment.delete()
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Другой комментарий')
+        self.assertEqual(check(), 200)
+        thread = reverse('posts:comment_thread',
+                         args=[self.post.pk, Comment.objects.get().pk])
+        check = self.revalidate(self.guest, thread)
+        Comment.objects.get().save()
+        self.assertEqual(check(), 200)
+
+    def test_follow_changes_profile(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        check = self.revalidate(self.authorized, url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(check(), 200)
+
+    def test_missing_pages_still_not_found(self):
+        for url in (reverse('posts:group_posts', args=['missing']),
+                    reverse('posts:profile', args=['missing']),
+                    reverse('posts:post_detail', args=[0])):
+            with self.subTest(url=url):
+                self.assertEqual(self.guest.get(url).status_code, 404)
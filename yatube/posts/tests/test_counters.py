@@ -0,0 +1,90 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse_lazy
+
+from posts.models import Post, Comment, Follow, UserStats
+from posts.paginators import POSTS_PER_PAGE
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counter_author')
+        cls.reader = User.objects.create_user(username='counter_reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(CountersTest.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_posts_and_comments_are_counted(self):
+        post = Post.objects.create(author=self.author, text='Запись')
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.reader_client.post(
+            reverse_lazy('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.get(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_follows_are_counted(self):
+        url = reverse_lazy('posts:profile_follow',
+                           kwargs={'username': self.author.username})
+        self.reader_client.get(url)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.reader_client.get(
+            reverse_lazy('posts:profile_unfollow',
+                         kwargs={'username': self.author.username}))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    @mock.patch('posts.paginators.SHALLOW_PAGES', 1)
+    def test_profile_reads_counters_without_count_query(self):
+        for number in range(POSTS_PER_PAGE + 1):
+            Post.objects.create(author=self.author, text=str(number))
+        url = reverse_lazy('posts:profile',
+                           kwargs={'username': self.author.username})
+        for params in ({'cursor': ''}, {}, {'page': 2}):
+            with self.subTest(params=params), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.reader_client.get(url, params)
+            self.assertEqual(response.context['posts_count'],
+                             POSTS_PER_PAGE + 1)
+            self.assertFalse([query for query in queries
+                              if 'COUNT(' in query['sql']])
+
+    def test_recount_command_repairs_drift(self):
+        Post.objects.bulk_create([
+            Post(author=self.author, text=str(number))
+            for number in range(3)
+        ])
+        Follow.objects.bulk_create([Follow(user=self.reader,
+                                           author=self.author)])
+        post = Post.objects.first()
+        Comment.objects.bulk_create([Comment(post=post, author=self.reader,
+                                             text='Комментарий')])
+        UserStats.objects.filter(user=self.reader).update(posts_count=7)
+        call_command('recount_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
@@ -0,0 +1,155 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from posts import follow_graph
+from posts.models import Follow
+from posts.tests.utils import reset_follow_graph, run_on_commit
+
+User = get_user_model()
+
+
+@mock.patch('posts.follow_graph.transaction.on_commit', run_on_commit)
+class FollowGraphTest(TestCase):
+    """Граф подписок в памяти согласован с таблицей Follow."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [User.objects.create_user(username='graph_{}'.format(n))
+                     for n in range(4)]
+
+    def setUp(self):
+        reset_follow_graph()
+
+    def follow(self, user, author):
+        return Follow.objects.create(user=user, author=author)
+
+    def test_queries_answered_from_memory(self):
+        first, second, third, _ = self.users
+        self.follow(first, second)
+        self.follow(first, third)
+        self.follow(second, first)
+        with self.assertNumQueries(1):
+            follow_graph.warm()
+        with self.assertNumQueries(0):
+            self.assertTrue(follow_graph.is_following(first.pk, second.pk))
+            self.assertFalse(follow_graph.is_following(second.pk, third.pk))
+            self.assertEqual(follow_graph.following_ids(first.pk),
+                             sorted([second.pk, third.pk]))
+            self.assertEqual(follow_graph.follower_ids(first.pk),
+                             [second.pk])
+            self.assertEqual(follow_graph.mutuals(first.pk), [second.pk])
+            self.assertEqual(follow_graph.following_ids(third.pk), [])
+
+    def test_changes_replayed_without_reload(self):
+        first, second, third, _ = self.users
+        follow = self.follow(first, second)
+        follow_graph.warm()
+        self.follow(first, third)
+        follow.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(follow_graph.following_ids(first.pk),
+                             [third.pk])
+            self.assertEqual(follow_graph.follower_ids(second.pk), [])
+
+    def other_process_follows(self, user, author, keep_change=True):
+        """Подписка, опубликованная другим процессом."""
+
+        Follow.objects.bulk_create([Follow(user=user, author=author)])
+        cache = caches[follow_graph.CACHE_ALIAS]
+        version = cache.incr(follow_graph.VERSION_KEY)
+        if keep_change:
+            cache.set(follow_graph._change_key(version),
+                      (user.pk, author.pk, 1))
+
+    def test_lost_change_reloads_graph(self):
+        first, second, *_ = self.users
+        follow_graph.warm()
+        self.other_process_follows(first, second, keep_change=False)
+        with self.assertNumQueries(1):
+            self.assertTrue(follow_graph.is_following(first.pk, second.pk))
+
+    def test_readers_do_not_wait_for_reload(self):
+        first, second, *_ = self.users
+        follow_graph.warm()
+        self.other_process_follows(first, second, keep_change=False)
+        with follow_graph._load_lock, self.assertNumQueries(0):
+            self.assertFalse(follow_graph.is_following(first.pk, second.pk))
+        self.assertTrue(follow_graph.is_following(first.pk, second.pk))
+
+    @override_settings(FOLLOW_GRAPH_CHECK_INTERVAL=60)
+    def test_version_checked_once_per_interval(self):
+        first, second, third, _ = self.users
+        follow_graph.warm()
+        self.other_process_follows(first, second)
+        cache = caches[follow_graph.CACHE_ALIAS]
+        with mock.patch.object(cache, 'get') as get:
+            self.assertFalse(follow_graph.is_following(first.pk, second.pk))
+        get.assert_not_called()
+        # Свои подписки процесс видит сразу, заодно догоняя чужие.
+        self.follow(first, third)
+        self.assertTrue(follow_graph.is_following(first.pk, third.pk))
+        self.assertTrue(follow_graph.is_following(first.pk, second.pk))
+
+    def test_invalidate_after_bulk_write(self):
+        first, second, *_ = self.users
+        follow_graph.warm()
+        Follow.objects.bulk_create([Follow(user=first, author=second)])
+        self.assertFalse(follow_graph.is_following(first.pk, second.pk))
+        follow_graph.invalidate()
+        self.assertTrue(follow_graph.is_following(first.pk, second.pk))
+
+    def test_footprint_is_two_keys_per_edge(self):
+        for user in self.users:
+            for author in self.users:
+                if user != author:
+                    self.follow(user, author)
+        graph = follow_graph.warm()
+        self.assertEqual(graph.edges, 12)
+        self.assertEqual(graph.nbytes, 2 * 12 * graph.following[
+            self.users[0].pk].itemsize)
+
+    def test_profile_shows_follow_state(self):
+        reader, author, *_ = self.users
+        client = Client()
+        client.force_login(reader)
+        url = reverse('posts:profile', args=[author.username])
+        self.assertFalse(client.get(url).context['following'])
+        client.get(reverse('posts:profile_follow', args=[author.username]))
+        self.assertTrue(client.get(url).context['following'])
+        client.get(reverse('posts:profile_unfollow', args=[author.username]))
+        self.assertFalse(client.get(url).context['following'])
+
+
+class FollowGraphCommitTest(TransactionTestCase):
+    """Изменения графа публикуются только после фиксации транзакции."""
+
+    def setUp(self):
+        reset_follow_graph()
+        self.user, self.author = [
+            User.objects.create_user(username='commit_{}'.format(n))
+            for n in range(2)]
+        follow_graph.warm()
+
+    def test_rolled_back_follow_is_not_published(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Follow.objects.create(user=self.user, author=self.author)
+                raise RuntimeError
+        self.assertFalse(follow_graph.is_following(self.user.pk,
+                                                   self.author.pk))
+
+    def test_committed_follow_is_published(self):
+        with transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+            self.assertFalse(follow_graph.is_following(self.user.pk,
+                                                       self.author.pk))
+        self.assertTrue(follow_graph.is_following(self.user.pk,
+                                                  self.author.pk))
@@ -0,0 +1,181 @@
+import io
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts import follow_graph, follows
+from posts.models import Follow, Post, TimelineEntry, UserStats
+from posts.tests.utils import reset_follow_graph, run_on_commit
+
+User = get_user_model()
+
+AUTHORS = 50
+
+
+@mock.patch('posts.follow_graph.transaction.on_commit', run_on_commit)
+class BulkFollowTest(TestCase):
+    """Подписка на список авторов делается за постоянное число запросов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='bulk_reader')
+        cls.authors = [User.objects.create_user(username='bulk_{}'.format(n))
+                       for n in range(AUTHORS)]
+        cls.usernames = [author.username for author in cls.authors]
+        cls.post = Post.objects.create(author=cls.authors[0], text='Запись')
+
+    def setUp(self):
+        reset_follow_graph()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_parse_usernames(self):
+        self.assertEqual(
+            follows.parse_usernames(['a, b', 'c\nb', ' ', 'a;d']),
+            ['a', 'b', 'c', 'd'])
+
+    def test_follow_many_in_few_queries(self):
+        with self.assertNumQueries(10):
+            result = follows.follow(self.reader, self.usernames)
+        self.assertEqual(result.changed, self.usernames)
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), AUTHORS)
+        self.assertEqual(self.stats(self.reader).following_count, AUTHORS)
+        self.assertEqual(self.stats(self.authors[1]).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post).exists())
+        self.assertEqual(follow_graph.following_ids(self.reader.pk),
+                         sorted(author.pk for author in self.authors))
+
+    def test_follow_is_idempotent(self):
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        result = follows.follow(self.reader, self.usernames[:2])
+        self.assertEqual(result.changed, self.usernames[1:2])
+        self.assertEqual(result.unchanged, self.usernames[:1])
+        follows.follow(self.reader, self.usernames[:2])
+        self.assertEqual(self.stats(self.reader).following_count, 2)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 1)
+
+    def test_lost_race_is_ignored(self):
+        # Строку пары успел вставить параллельный запрос, а проверка
+        # существующих подписок ее еще не видела.
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        with mock.patch.object(follows, '_followed',
+                               return_value=Follow.objects.none()):
+            follows.follow_authors(self.reader, [self.authors[0].pk])
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 1)
+
+    def test_missing_and_self_are_skipped(self):
+        result = follows.follow(self.reader,
+                                ['nobody', self.reader.username])
+        self.assertEqual(result.missing, ['nobody'])
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_unfollow_many(self):
+        follows.follow(self.reader, self.usernames)
+        follow_graph.warm()
+        result = follows.unfollow(self.reader, self.usernames[:10])
+        self.assertEqual(result.changed, self.usernames[:10])
+        self.assertEqual(self.stats(self.reader).following_count,
+                         AUTHORS - 10)
+        self.assertEqual(self.stats(self.authors[0]).followers_count, 0)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post).exists())
+        self.assertFalse(follow_graph.is_following(self.reader.pk,
+                                                   self.authors[0].pk))
+
+    def test_unfollow_does_not_run_row_signals(self):
+        follows.follow(self.reader, self.usernames)
+        with self.assertNumQueries(9):
+            follows.unfollow(self.reader, self.usernames)
+        self.assertFalse(follows.in_bulk())
+
+    def test_bulk_views(self):
+        response = self.client.post(reverse('posts:follow_bulk'),
+                                    {'usernames': self.usernames[:3]})
+        self.assertRedirects(response, reverse('posts:follow_index'))
+        self.assertEqual(self.stats(self.reader).following_count, 3)
+        self.client.post(reverse('posts:unfollow_bulk'),
+                         {'usernames': ', '.join(self.usernames[:2])})
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(
+            self.client.get(reverse('posts:follow_bulk')).status_code, 405)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as names:
+            names.write('\n'.join(self.usernames[1:]))
+            names.flush()
+            call_command('follow_authors', self.reader.username,
+                         self.usernames[0], 'nobody', file=names.name,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(self.stats(self.reader).following_count, AUTHORS)
+        call_command('follow_authors', self.reader.username,
+                     *self.usernames, unfollow=True, stdout=io.StringIO())
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+
+class ConcurrentFollowTest(TransactionTestCase):
+    """Одновременные подписки из потоков, у каждого свое соединение."""
+
+    THREADS = 8
+
+    def setUp(self):
+        reset_follow_graph()
+        self.reader = User.objects.create_user(username='race_reader')
+        self.author = User.objects.create_user(username='race_author')
+
+    def hammer(self, url_name):
+        url = reverse(url_name, args=[self.author.username])
+        barrier = threading.Barrier(self.THREADS, timeout=10)
+        statuses = []
+        clients = [Client() for _ in range(self.THREADS)]
+        for client in clients:
+            client.force_login(self.reader)
+
+        def click(client):
+            barrier.wait()
+            try:
+                # Тестовая база SQLite в памяти не ждет блокировку, как
+                # файловая, а сразу отвечает ошибкой: клиент повторяет.
+                for _ in range(100):
+                    try:
+                        statuses.append(client.get(url).status_code)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click, args=[client])
+                   for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        self.assertEqual(statuses, [302] * self.THREADS)
+
+    def test_double_clicks_leave_one_follow(self):
+        self.hammer('posts:profile_follow')
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1)
+        self.assertTrue(follow_graph.is_following(self.reader.pk,
+                                                  self.author.pk))
+        self.hammer('posts:profile_unfollow')
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 0)
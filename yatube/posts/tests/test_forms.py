@@ -1,9 +1,12 @@
+import io
 import shutil
 import tempfile
+from unittest import mock
 
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from PIL import Image
 from django.test import Client, TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
@@ -97,7 +100,7 @@ class PostFormTests(TestCase):
                 text=form_data['text'],
                 group=another_group,
                 author=user,
-                image='posts/small.gif',
+                image='posts/small.jpg',
             ).exists()
         )
 
@@ -211,3 +214,59 @@ class CommentFormTests(TestCase):
         self.assertFalse(
             Post.objects.filter(text=form_data['text']).exists()
         )
+
+
+def make_upload(name, size, image_format='JPEG', mode='RGB', **options):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/' + image_format.lower())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   POST_IMAGE_MAX_DIMENSION=100)
+class PostImageTests(TestCase):
+    """Обработка картинки записи при загрузке."""
+
+    def form(self, image):
+        return PostForm(data={'text': 'Запись с картинкой'},
+                        files={'image': image})
+
+    def saved_image(self, form):
+        self.assertTrue(form.is_valid(), form.errors)
+        return Image.open(form.cleaned_data['image'])
+
+    def test_large_image_downscaled_to_progressive_jpeg(self):
+        exif = Image.Exif()
+        exif[0x0110] = 'Phone'
+        image = self.saved_image(self.form(
+            make_upload('photo.jpeg', (400, 200), exif=exif.tobytes())))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (100, 50))
+        self.assertTrue(image.info.get('progressive'))
+        self.assertNotIn('exif', image.info)
+
+    def test_small_image_keeps_size(self):
+        image = self.saved_image(self.form(
+            make_upload('small.png', (20, 10), 'PNG', 'RGBA')))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.mode, 'RGB')
+        self.assertEqual(image.size, (20, 10))
+
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_oversized_file_rejected(self):
+        form = self.form(make_upload('big.png', (400, 400), 'PNG'))
+        with mock.patch('posts.forms.images.process') as process:
+            self.assertFalse(form.is_valid())
+        process.assert_not_called()
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'file_too_large')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_rejected(self):
+        form = self.form(make_upload('wide.png', (400, 400), 'PNG'))
+        with mock.patch('PIL.Image.Image.load') as load:
+            self.assertFalse(form.is_valid())
+        load.assert_not_called()
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'too_many_pixels')
@@ -1,6 +1,11 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
+from posts import paginators
 from posts.models import Post, Group
 
 User = get_user_model()
@@ -48,3 +53,136 @@ class PaginatorViewsTest(TestCase):
                 response = self.guest_client.get(url + '?page=2')
                 self.assertEqual(len(response.context['page_obj']),
                                  self.NUM_POST_TWO_PAGE)
+
+
+class CursorPaginatorViewsTest(TestCase):
+
+    NUM_POSTS = 23
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user_test_cursor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([Post(
+            author=cls.user,
+            text='Тестовая пост {}'.format(number),
+            group=cls.group,
+        ) for number in range(cls.NUM_POSTS)])
+        cls.urls = [
+            reverse_lazy('posts:index'),
+            reverse_lazy('posts:group_posts',
+                         kwargs={'slug': cls.group.slug}),
+            reverse_lazy('posts:profile',
+                         kwargs={'username': cls.user.username}),
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def walk(self, url, cursor_attr):
+        """Проходит ленту по курсорам и возвращает id записей."""
+
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.guest_client.get(url, {'cursor': cursor})
+            for query in queries:
+                self.assertNotIn('COUNT(', query['sql'].upper())
+                self.assertNotIn('OFFSET', query['sql'].upper())
+            page_obj = response.context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+            cursor = getattr(page_obj, cursor_attr)
+        return seen
+
+    def test_cursor_walks_whole_feed_without_count_and_offset(self):
+        expected = list(Post.objects.order_by('-created', '-pk')
+                        .values_list('pk', flat=True))
+        for url in CursorPaginatorViewsTest.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(url, 'next_cursor'), expected)
+
+    def test_cursor_previous_page(self):
+        url = CursorPaginatorViewsTest.urls[0]
+        first = self.guest_client.get(url, {'cursor': ''})
+        second = self.guest_client.get(
+            url, {'cursor': first.context['page_obj'].next_cursor})
+        back = self.guest_client.get(
+            url, {'cursor': second.context['page_obj'].previous_cursor})
+        self.assertEqual(list(back.context['page_obj']),
+                         list(first.context['page_obj']))
+        self.assertFalse(back.context['page_obj'].has_previous())
+
+    def test_last_cursor_returns_last_page(self):
+        url = CursorPaginatorViewsTest.urls[0]
+        paginator = self.guest_client.get(
+            url, {'cursor': ''}).context['page_obj'].paginator
+        response = self.guest_client.get(url,
+                                         {'cursor': paginator.last_cursor})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(page_obj.has_previous())
+        self.assertEqual(page_obj[-1], Post.objects.order_by('created',
+                                                             'pk').first())
+
+    def test_broken_cursor_returns_first_page(self):
+        url = CursorPaginatorViewsTest.urls[0]
+        response = self.guest_client.get(url, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_page_numbers_still_work(self):
+        url = CursorPaginatorViewsTest.urls[0]
+        response = self.guest_client.get(url, {'page': 3})
+        self.assertEqual(len(response.context['page_obj']),
+                         self.NUM_POSTS % 10)
+
+    @mock.patch('posts.paginators.SHALLOW_PAGES', 2)
+    def test_deep_page_number_is_clamped(self):
+        url = CursorPaginatorViewsTest.urls[0]
+        second = self.guest_client.get(url, {'page': 2}).context['page_obj']
+        for page in (3, 1000, '1e9'):
+            with self.subTest(page=page), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.guest_client.get(url, {'page': page})
+                page_obj = response.context['page_obj']
+                self.assertEqual(page_obj.number, 2)
+                self.assertEqual(list(page_obj), list(second))
+                # Курсор подписан с отметкой времени: сравниваются ключи.
+                decode = paginators.CursorPaginator.decode
+                self.assertEqual(decode(page_obj.next_cursor),
+                                 decode(second.next_cursor))
+            offsets = [query['sql'] for query in queries
+                       if 'OFFSET' in query['sql'].upper()]
+            self.assertEqual(len(offsets), 1)
+            self.assertIn('OFFSET 10', offsets[0].upper())
+
+    def test_shallow_page_number(self):
+        for value, number in ((None, 1), ('x', 1), ('-3', 1), ('2', 2),
+                              ('inf', 1), ('999', paginators.SHALLOW_PAGES)):
+            with self.subTest(value=value):
+                self.assertEqual(paginators._shallow_page_number(value),
+                                 number)
+
+    @mock.patch('posts.paginators.SHALLOW_PAGES', 2)
+    def test_numbered_pages_do_not_count_whole_feed(self):
+        url = CursorPaginatorViewsTest.urls[0]
+        for page in (1, 2):
+            with self.subTest(page=page), \
+                    CaptureQueriesContext(connection) as queries:
+                page_obj = self.guest_client.get(
+                    url, {'page': page}).context['page_obj']
+            counts = [query['sql'] for query in queries
+                      if 'COUNT(' in query['sql'].upper()]
+            self.assertEqual(len(counts), 1)
+            self.assertIn('LIMIT 21', counts[0].upper())
+            self.assertEqual(page_obj.paginator.num_pages, 3)
+            self.assertTrue(page_obj.has_next())
+            self.assertIsNotNone(page_obj.last_cursor)
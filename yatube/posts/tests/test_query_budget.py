@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, TestCase
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import (QUERY_BUDGETS, VIEW_CODE, QueryBudgetMixin,
+                               QueryLog)
+
+User = get_user_model()
+
+POSTS = 25
+COMMENTS_PER_POST = 4
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Число запросов страниц не растет с числом записей и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.group = Group.objects.create(title='Группа', slug='budget',
+                                         description='Описание')
+        authors = [User.objects.create_user(username='budget_author_{}'
+                                            .format(number))
+                   for number in range(5)]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for number in range(POSTS):
+            post = Post.objects.create(author=authors[number % 5],
+                                       group=cls.group,
+                                       text='Запись {}'.format(number))
+            for comment in range(COMMENTS_PER_POST):
+                Comment.objects.create(
+                    post=post, author=authors[comment],
+                    text='Комментарий {}'.format(comment))
+        cls.post = post
+        cls.author = authors[0]
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.user = Client()
+        self.user.force_login(QueryBudgetTest.reader)
+
+    def pages(self):
+        return (
+            ('posts:index', None),
+            ('posts:group_posts', [self.group.slug]),
+            ('posts:profile', [self.author.username]),
+            ('posts:post_detail', [self.post.pk]),
+        )
+
+    def test_every_feed_view_has_budget(self):
+        names = {name for name, _ in self.pages()} | {'posts:follow_index'}
+        self.assertEqual(names, set(QUERY_BUDGETS))
+
+    def test_anonymous_pages(self):
+        for name, args in self.pages():
+            for params in ({}, {'page': 2}, {'cursor': ''}):
+                with self.subTest(view=name, params=params):
+                    cache.clear()
+                    self.assertQueryBudget(self.guest, name, args, params)
+
+    def test_authenticated_pages(self):
+        for name, args in self.pages() + (('posts:follow_index', None),):
+            with self.subTest(view=name):
+                cache.clear()
+                self.assertQueryBudget(self.user, name, args,
+                                       authenticated=True)
+
+    def test_report_groups_queries_by_template(self):
+        template = Template(
+            '{% for comment in comments %}'
+            '{{ comment.author.username }}'
+            '{% endfor %}')
+        comments = Comment.objects.filter(post=self.post)
+        with QueryLog() as log:
+            template.render(Context({'comments': comments}))
+        grouped = log.by_origin()
+        self.assertEqual(len(log), COMMENTS_PER_POST + 1)
+        self.assertEqual(len(grouped), 1)
+        origin, = grouped
+        self.assertNotEqual(origin, VIEW_CODE)
+        self.assertIn('запросов: {}'.format(COMMENTS_PER_POST + 1),
+                      log.report())
@@ -0,0 +1,99 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse_lazy
+
+from posts.models import Post, Group, Comment, Follow
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class QueryPlanTest(TestCase):
+    """Основные запросы лент должны идти по индексам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='plan_author')
+        cls.reader = User.objects.create_user(username='plan_reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Тестовая пост',
+            group=cls.group,
+        )
+        Comment.objects.create(
+            post=cls.post,
+            author=cls.reader,
+            text='Текст комментария',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.urls = {
+            'index': reverse_lazy('posts:index'),
+            'group_posts': reverse_lazy('posts:group_posts',
+                                        kwargs={'slug': cls.group.slug}),
+            'profile': reverse_lazy(
+                'posts:profile', kwargs={'username': cls.author.username}),
+            'post_detail': reverse_lazy('posts:post_detail',
+                                        kwargs={'post_id': cls.post.pk}),
+            'follow_index': reverse_lazy('posts:follow_index'),
+        }
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(QueryPlanTest.reader)
+
+    def query_plans(self, url, params=None):
+        """Планы всех запросов к таблицам posts_* при открытии страницы."""
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params or {})
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if '"posts_' not in query['sql']:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append((query['sql'],
+                              [row[-1] for row in cursor.fetchall()]))
+        return plans
+
+    def assert_uses_indexes(self, sql, plan):
+        for step in plan:
+            # Подзапрос с LIMIT (счет строк ShallowPaginator) — не таблица:
+            # проход по нему ограничен, а таблица внутри проверяется отдельно.
+            if step.startswith('SCAN') and step != 'SCAN subquery':
+                self.assertIn('INDEX', step,
+                              'Полный проход таблицы:\n{}\n{}'.format(
+                                  sql, plan))
+        for step in plan:
+            self.assertNotIn('TEMP B-TREE FOR', step,
+                             'Сортировка без индекса:\n{}\n{}'.format(
+                                 sql, plan))
+
+    def test_feed_queries_use_indexes(self):
+        for name, url in QueryPlanTest.urls.items():
+            for params in ({}, {'cursor': ''}):
+                with self.subTest(view=name, params=params):
+                    plans = self.query_plans(url, params)
+                    self.assertTrue(plans)
+                    for sql, plan in plans:
+                        self.assert_uses_indexes(sql, plan)
+
+
+class FollowConstraintTest(TestCase):
+
+    def test_follow_pair_is_unique(self):
+        user = User.objects.create_user(username='follower')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
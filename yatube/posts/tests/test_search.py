@@ -0,0 +1,116 @@
+import io
+
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse_lazy
+
+from posts import search
+from posts.models import Comment, Post, SearchTerm
+
+User = get_user_model()
+
+
+class SearchTestMixin:
+    """Общие проверки для обоих бэкендов поиска."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='search_author')
+        cls.once = Post.objects.create(author=cls.user,
+                                       text='Рыжий кот спит на окне')
+        cls.twice = Post.objects.create(
+            author=cls.user, text='Кот и еще раз кот, рыжий кот')
+        cls.other = Post.objects.create(author=cls.user,
+                                        text='Про собаку')
+        cls.comment = Comment.objects.create(
+            post=cls.other, author=cls.user, text='А у меня есть кот')
+        cls.url = reverse_lazy('posts:search')
+
+    def found(self, query, **params):
+        response = Client().get(self.url, {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_posts_ranked_by_relevance(self):
+        self.assertEqual(self.found('кот')[:1], [self.twice])
+        self.assertEqual(set(self.found('кот')),
+                         {self.once, self.twice, self.other})
+
+    def test_all_words_required(self):
+        self.assertEqual(set(self.found('Рыжий, КОТ!')),
+                         {self.once, self.twice})
+        self.assertEqual(self.found('рыжий собаку'), [])
+
+    def test_comment_leads_to_its_post(self):
+        self.assertEqual(self.found('меня'), [self.other])
+
+    def test_index_follows_changes(self):
+        # Объекты setUpTestData общие для тестов, меняются их копии.
+        post = Post.objects.get(pk=self.once.pk)
+        post.text = 'Теперь про попугая'
+        post.save()
+        self.assertEqual(self.found('попугая'), [post])
+        self.assertNotIn(post, self.found('рыжий'))
+        Comment.objects.get(pk=self.comment.pk).delete()
+        self.assertEqual(self.found('меня'), [])
+        Post.objects.get(pk=self.twice.pk).delete()
+        self.assertEqual(self.found('кот'), [])
+
+    def test_empty_query(self):
+        response = Client().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_pagination_keeps_query(self):
+        for number in range(12):
+            Post.objects.create(author=self.user,
+                                text='Слон номер {}'.format(number))
+        first = self.found('слон')
+        second = self.found('слон', page=2)
+        self.assertEqual((len(first), len(second)), (10, 2))
+        self.assertFalse(set(first) & set(second))
+        response = Client().get(self.url, {'q': 'слон'})
+        self.assertContains(response,
+                            '?q=%D1%81%D0%BB%D0%BE%D0%BD&amp;page=2')
+
+    def test_admin_search_uses_index(self):
+        request = RequestFactory().get('/admin/')
+        for model, expected in ((Post, {self.once, self.twice}),
+                                (Comment, {self.comment})):
+            admin = site._registry[model]
+            with self.subTest(model=model.__name__), \
+                    CaptureQueriesContext(connection) as queries:
+                found, distinct = admin.get_search_results(
+                    request, model.objects.all(), 'рыжий кот' if model is Post
+                    else 'кот')
+                self.assertEqual(set(found), expected)
+            self.assertFalse(distinct)
+            # Найденные pk не выгружаются: индекс читается подзапросом.
+            self.assertEqual(len(queries), 1)
+            self.assertFalse([query for query in queries
+                              if 'LIKE' in query['sql']])
+
+    def test_rebuild_command(self):
+        search.backend().clear()
+        self.assertEqual(self.found('кот'), [])
+        call_command('rebuild_search_index', batch_size=2,
+                     stdout=io.StringIO())
+        self.assertEqual(len(self.found('кот')), 3)
+
+
+@override_settings(SEARCH_BACKEND='fts5')
+class FtsSearchTest(SearchTestMixin, TestCase):
+
+    def test_fts_table_created_by_migration(self):
+        self.assertTrue(search.fts_available())
+
+
+@override_settings(SEARCH_BACKEND='table')
+class TableSearchTest(SearchTestMixin, TestCase):
+
+    def test_terms_stored_with_frequency(self):
+        self.assertEqual(
+            SearchTerm.objects.get(post=self.twice, term='кот').frequency, 3)
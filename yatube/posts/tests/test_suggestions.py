@@ -0,0 +1,98 @@
+import io
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import follow_graph, suggestions
+from posts.models import Comment, Follow, FollowSuggestion, Group, Post
+from posts.tests.utils import reset_follow_graph, run_on_commit
+
+User = get_user_model()
+
+
+@mock.patch('posts.follow_graph.transaction.on_commit', run_on_commit)
+class FollowSuggestionsTest(TestCase):
+    """Рекомендации авторов считаются пакетно и читаются готовыми."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.friend, cls.friend_of_friend, cls.commenter, \
+            cls.post_author, cls.group_author = [
+                User.objects.create_user(username='suggest_{}'.format(n))
+                for n in range(6)]
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.friend_of_friend)
+        post = Post.objects.create(author=cls.post_author, text='Запись')
+        for user in (cls.reader, cls.commenter):
+            Comment.objects.create(post=post, author=user, text='Мнение')
+        cls.group = Group.objects.create(title='Группа', slug='suggest',
+                                         description='Описание')
+        for author in (cls.reader, cls.group_author, cls.group_author):
+            Post.objects.create(author=author, group=cls.group,
+                                text='Запись в группе')
+
+    def setUp(self):
+        reset_follow_graph()
+
+    def compute(self, **options):
+        call_command('compute_follow_suggestions', stdout=io.StringIO(),
+                     **options)
+
+    def stored(self, user):
+        return list(FollowSuggestion.objects.filter(user=user)
+                    .order_by('-score', '-author')
+                    .values_list('author', flat=True))
+
+    def test_signals_are_weighted_and_followed_excluded(self):
+        self.compute()
+        self.assertEqual(self.stored(self.reader), [
+            self.friend_of_friend.pk,
+            *sorted([self.commenter.pk, self.post_author.pk], reverse=True),
+            self.group_author.pk,
+        ])
+
+    def test_top_k_and_recompute_replace_rows(self):
+        self.compute(top_k=1)
+        self.assertEqual(self.stored(self.reader), [self.friend_of_friend.pk])
+        Follow.objects.create(user=self.reader, author=self.friend_of_friend)
+        self.compute(top_k=1)
+        self.assertEqual(len(self.stored(self.reader)), 1)
+        self.assertNotIn(self.friend_of_friend.pk, self.stored(self.reader))
+
+    @mock.patch('posts.suggestions.MAX_POST_MEMBERS', 2)
+    def test_crowded_posts_are_skipped(self):
+        self.compute()
+        self.assertNotIn(self.commenter.pk, self.stored(self.reader))
+
+    def test_pages_read_precomputed_lists(self):
+        self.compute()
+        follow_graph.warm()
+        with self.assertNumQueries(1):
+            shown = suggestions.for_user(self.reader.pk)
+        self.assertEqual(shown[0], self.friend_of_friend)
+        client = Client()
+        client.force_login(self.reader)
+        for url in (reverse('posts:follow_index'),
+                    reverse('posts:profile', args=[self.friend.username])):
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), 'Кого почитать')
+
+    def test_new_follow_hides_suggestion_before_recompute(self):
+        self.compute()
+        Follow.objects.create(user=self.reader, author=self.friend_of_friend)
+        self.assertNotIn(self.friend_of_friend,
+                         suggestions.for_user(self.reader.pk))
+
+    def test_recompute_changes_profile_etag(self):
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('posts:profile', args=[self.friend.username])
+        etag = client.get(url)['ETag']
+        self.compute()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.friend_of_friend.username)
@@ -0,0 +1,215 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import urlquote
+
+from posts import counters, threads
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class CommentThreadTest(TestCase):
+    """Ответы на комментарии хранятся деревом с материализованным путем."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='threads_author')
+        cls.post = Post.objects.create(author=cls.author, text='Запись')
+        cls.other_post = Post.objects.create(author=cls.author,
+                                             text='Другая запись')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(post=self.post, author=self.author,
+                                      text=text, parent=parent)
+
+    def refresh(self, *comments):
+        for comment in comments:
+            comment.refresh_from_db()
+
+    def test_reply_gets_path_depth_and_counts(self):
+        root = self.comment('Корень')
+        child = self.comment('Ответ', root)
+        grandchild = self.comment('Ответ на ответ', child)
+        self.refresh(root, child, grandchild)
+        self.assertEqual(root.path, threads.segment(root.pk))
+        self.assertEqual(grandchild.path, root.path
+                         + threads.segment(child.pk)
+                         + threads.segment(grandchild.pk))
+        self.assertEqual([root.depth, child.depth, grandchild.depth],
+                         [0, 1, 2])
+        self.assertEqual([root.replies_count, child.replies_count],
+                         [2, 1])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 3)
+
+    def test_deleting_branch_updates_counts(self):
+        root = self.comment('Корень')
+        child = self.comment('Ответ', root)
+        self.comment('Ответ на ответ', child)
+        self.comment('Второй ответ', root)
+        child.delete()
+        self.refresh(root)
+        self.assertEqual(root.replies_count, 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 2)
+
+    def test_add_comment_with_parent(self):
+        root = self.comment('Корень')
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Ответ из формы', 'parent': root.pk})
+        self.assertRedirects(response, reverse(
+            'posts:comment_thread', args=[self.post.pk, root.pk]))
+        reply = Comment.objects.get(text='Ответ из формы')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.depth, 1)
+
+    def test_parent_from_other_post_is_rejected(self):
+        foreign = Comment.objects.create(post=self.other_post,
+                                         author=self.author, text='Чужой')
+        self.client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                         {'text': 'Ответ не туда', 'parent': foreign.pk})
+        self.assertFalse(Comment.objects.filter(text='Ответ не туда')
+                         .exists())
+
+    def test_reply_beyond_max_depth_goes_to_parent(self):
+        comment = None
+        for number in range(threads.MAX_DEPTH + 1):
+            comment = self.comment(str(number), comment)
+        self.refresh(comment)
+        self.assertEqual(comment.depth, threads.MAX_DEPTH)
+        self.client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                         {'text': 'Слишком глубоко', 'parent': comment.pk})
+        reply = Comment.objects.get(text='Слишком глубоко')
+        self.assertEqual(reply.parent_id, comment.parent_id)
+        self.assertEqual(reply.depth, threads.MAX_DEPTH)
+
+    def test_subtree_in_one_query_limited_by_depth(self):
+        root = self.comment('Корень')
+        comment = root
+        for number in range(threads.THREAD_DEPTH + 1):
+            comment = self.comment('Уровень {}'.format(number + 1), comment)
+        self.refresh(root)
+        with self.assertNumQueries(1):
+            threads.attach_replies(self.post.pk, [root])
+        node = root
+        for _ in range(threads.THREAD_DEPTH):
+            self.assertIsNone(node.more_replies)
+            [node] = node.thread_replies
+        self.assertEqual(node.thread_replies, [])
+        self.assertEqual(node.more_replies, '')
+
+    @mock.patch('posts.threads.REPLIES_PER_PAGE', 3)
+    def test_replies_continue_after_last_shown(self):
+        root = self.comment('Корень')
+        replies = []
+        for number in range(4):
+            replies.append(self.comment('Ответ {}'.format(number), root))
+            self.comment('Вложенный', replies[-1])
+        self.refresh(root)
+        threads.attach_replies(self.post.pk, [root])
+        first, second = root.thread_replies
+        self.assertEqual(second.thread_replies, [])
+        self.assertEqual(second.more_replies, '')
+        self.assertEqual(root.more_replies, threads.subtree_end(second.path))
+        threads.attach_replies(self.post.pk, [root],
+                               after=root.more_replies)
+        self.assertEqual(root.thread_replies, replies[2:])
+
+    @mock.patch('posts.threads.REPLIES_PER_PAGE', 3)
+    def test_large_thread_does_not_hide_next_roots(self):
+        large, small, empty = [self.comment('Корень {}'.format(number))
+                               for number in range(3)]
+        for number in range(5):
+            self.comment('Ответ {}'.format(number), large)
+        reply = self.comment('Единственный ответ', small)
+        self.refresh(large, small, empty)
+        with self.assertNumQueries(2):
+            threads.attach_replies(self.post.pk, [large, small, empty])
+        self.assertEqual(len(large.thread_replies), 3)
+        self.assertEqual(large.more_replies,
+                         threads.subtree_end(large.thread_replies[-1].path))
+        self.assertEqual(small.thread_replies, [reply])
+        self.assertIsNone(small.more_replies)
+        self.assertEqual(empty.thread_replies, [])
+
+    @mock.patch('posts.threads.REPLIES_PER_PAGE', 3)
+    def test_fragments_walk_whole_thread(self):
+        root = self.comment('Корень')
+        for number in range(5):
+            self.comment('Ответ {}'.format(number), root)
+        url = reverse('posts:comment_replies', args=[self.post.pk, root.pk])
+        shown = []
+        after = ''
+        while after is not None:
+            response = Client().get(url, {'after': after})
+            self.assertTemplateNotUsed(response, 'base.html')
+            shown.extend(response.context['replies'])
+            after = response.context['parent'].more_replies
+        self.assertEqual([reply.text for reply in shown],
+                         ['Ответ {}'.format(number) for number in range(5)])
+
+    @mock.patch('posts.threads.REPLIES_PER_PAGE', 3)
+    def test_thread_page_walks_whole_thread_without_js(self):
+        root = self.comment('Корень')
+        for number in range(5):
+            self.comment('Ответ {}'.format(number), root)
+        url = reverse('posts:comment_thread', args=[self.post.pk, root.pk])
+        shown = []
+        after = ''
+        while after is not None:
+            self.assertLessEqual(len(shown), 5, 'Ссылка ведет на ту же порцию')
+            response = Client().get(url, {'after': after})
+            comment = response.context['comment']
+            shown.extend(comment.thread_replies)
+            after = comment.more_replies
+            if after:
+                self.assertContains(response, '{}?after={}'.format(
+                    url, urlquote(after)))
+        self.assertEqual([reply.text for reply in shown],
+                         ['Ответ {}'.format(number) for number in range(5)])
+
+    def test_post_page_shows_nested_replies_and_expand_link(self):
+        root = self.comment('Корень')
+        comment = root
+        for number in range(threads.THREAD_DEPTH + 1):
+            comment = self.comment('Уровень {}'.format(number + 1), comment)
+        response = Client().get(reverse('posts:post_detail',
+                                        args=[self.post.pk]))
+        self.assertEqual(list(response.context['comments']), [root])
+        self.assertContains(response, 'Уровень {}'.format(
+            threads.THREAD_DEPTH))
+        self.assertNotContains(response, 'Уровень {}'.format(
+            threads.THREAD_DEPTH + 1))
+        self.assertContains(response, 'Показать ответы: 1')
+        thread = Client().get(reverse('posts:comment_thread',
+                                      args=[self.post.pk, comment.parent_id]))
+        self.assertContains(thread, 'Уровень {}'.format(
+            threads.THREAD_DEPTH + 1))
+
+    def test_rebuild_after_bulk_load(self):
+        root = Comment.objects.create(post=self.post, author=self.author,
+                                      text='Корень')
+        loaded = Comment.objects.bulk_create([
+            Comment(pk=root.pk + 1, post=self.post, author=self.author,
+                    parent_id=root.pk, text='Ответ'),
+            Comment(pk=root.pk + 2, post=self.post, author=self.author,
+                    parent_id=root.pk + 1, text='Ответ на ответ'),
+        ])
+        threads.rebuild_paths(Comment.objects.filter(post=self.post))
+        counters.recount_replies(self.post.pk, self.post.pk)
+        self.refresh(root, *loaded)
+        self.assertEqual([comment.depth for comment in loaded], [1, 2])
+        self.assertEqual(loaded[1].path, root.path
+                         + threads.segment(loaded[0].pk)
+                         + threads.segment(loaded[1].pk))
+        self.assertEqual([root.replies_count, loaded[0].replies_count],
+                         [2, 1])
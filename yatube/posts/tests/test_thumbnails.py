@@ -0,0 +1,155 @@
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse_lazy
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='thumbnail_author')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=ThumbnailsTest.user,
+            text='Запись с картинкой',
+            image=SimpleUploadedFile('small.gif', ThumbnailsTest.small_gif,
+                                     content_type='image/gif'),
+        )
+
+    def test_generate_stores_every_geometry(self):
+        thumbnails.generate(self.post.image.name)
+        for geometry in thumbnails.GEOMETRIES:
+            with self.subTest(geometry=geometry):
+                found = caches['thumbnails'].get(
+                    thumbnails.cache_key(self.post.image.name, geometry))
+                self.assertTrue(found['url'].startswith(settings.MEDIA_URL))
+
+    def test_pages_read_pregenerated_thumbnails_only(self):
+        thumbnails.generate(self.post.image.name)
+        urls = [
+            reverse_lazy('posts:index'),
+            reverse_lazy('posts:post_detail',
+                         kwargs={'post_id': self.post.pk}),
+        ]
+        with mock.patch.object(thumbnails, 'get_thumbnail') as build:
+            for url in urls:
+                with self.subTest(url=url):
+                    response = Client().get(url)
+                    self.assertContains(response, '<img class="card-img')
+        build.assert_not_called()
+
+    def test_feed_page_reads_thumbnails_in_one_round_trip(self):
+        for number in range(9):
+            post = Post.objects.create(
+                author=ThumbnailsTest.user,
+                text='Запись {}'.format(number),
+                image=SimpleUploadedFile(
+                    'small.gif', ThumbnailsTest.small_gif,
+                    content_type='image/gif'),
+            )
+            thumbnails.generate(post.image.name)
+        thumbnails.generate(self.post.image.name)
+        store = caches['thumbnails']
+        with mock.patch.object(thumbnails, 'lookup') as lookup, \
+                mock.patch.object(store, 'get_many',
+                                  wraps=store.get_many) as get_many:
+            response = Client().get(reverse_lazy('posts:index'))
+        self.assertContains(response, '<img class="card-img', count=10)
+        self.assertEqual(get_many.call_count, 1)
+        lookup.assert_not_called()
+
+    def test_missing_source_is_remembered(self):
+        with mock.patch.object(thumbnails, 'get_thumbnail') as build:
+            self.assertIsNone(thumbnails.lookup('posts/missing.jpg', 'card'))
+            self.assertIsNone(thumbnails.lookup('posts/missing.jpg', 'card'))
+        build.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class ThumbnailWorkersTest(TransactionTestCase):
+    """Поток пула открывает свое соединение с БД, поэтому без TestCase."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._executor = None
+        self.user = User.objects.create_user(username='thumbnail_worker')
+
+    def tearDown(self):
+        thumbnails._executor = None
+
+    def test_post_save_queues_generation(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Запись с картинкой',
+            image=SimpleUploadedFile('worker.gif', ThumbnailsTest.small_gif,
+                                     content_type='image/gif'),
+        )
+        self.assertIsNotNone(thumbnails._executor)
+        thumbnails._executor.shutdown(wait=True)
+        for geometry in thumbnails.GEOMETRIES:
+            with self.subTest(geometry=geometry):
+                self.assertTrue(caches['thumbnails'].get(
+                    thumbnails.cache_key(post.image.name, geometry)))
+
+    def test_pages_rendered_before_thumbnails_are_refreshed(self):
+        ready = threading.Event()
+        build = thumbnails.get_thumbnail
+
+        def slow_build(*args, **kwargs):
+            ready.wait(timeout=10)
+            return build(*args, **kwargs)
+
+        client = Client()
+        url = reverse_lazy('posts:index')
+        with mock.patch.object(thumbnails, 'get_thumbnail', slow_build):
+            Post.objects.create(
+                author=self.user,
+                text='Запись с картинкой',
+                image=SimpleUploadedFile(
+                    'pending.gif', ThumbnailsTest.small_gif,
+                    content_type='image/gif'),
+            )
+            response = client.get(url)
+            self.assertNotContains(response, '<img class="card-img')
+            ready.set()
+            thumbnails._executor.shutdown(wait=True)
+        refreshed = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(refreshed, '<img class="card-img')
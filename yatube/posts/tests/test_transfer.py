@@ -0,0 +1,100 @@
+import io
+import os
+import tempfile
+
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts import search, transfer
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                          UserStats)
+
+
+class TransferTest(TestCase):
+    """Выгрузка и загрузка данных на маленьком наборе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='transfer_author',
+                                              email='a@example.com')
+        cls.reader = User.objects.create_user(username='transfer_reader')
+        cls.group = Group.objects.create(title='Группа', slug='transfer',
+                                         description='Описание, "кавычки"')
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text='Запись про кота, номер {}'.format(n))
+            for n in range(3)
+        ]
+        cls.posts.append(Post.objects.create(
+            author=cls.author, text='Без группы\nи перенос строки'))
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий про кота')
+        Comment.objects.create(post=cls.posts[0], author=cls.author,
+                               parent=cls.comment, text='Ответ')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def snapshot(self):
+        return {name: list(model.objects.order_by('pk').values_list(*fields))
+                for name, (model, fields) in transfer.MODELS.items()}
+
+    def paths(self, fmt):
+        return [os.path.join(self.directory, '{}.{}'.format(name, fmt))
+                for name in transfer.MODELS]
+
+    def round_trip(self, fmt):
+        before = self.snapshot()
+        call_command('export_posts', format=fmt, output_dir=self.directory,
+                     chunk_size=2, stdout=io.StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        search.backend().clear()
+        caches['timeline'].clear()
+        # Порядок файлов в командной строке не важен.
+        call_command('import_posts', *reversed(self.paths(fmt)),
+                     batch_size=2, stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_round_trip_preserves_rows(self):
+        for fmt in transfer.FORMATS:
+            with self.subTest(format=fmt):
+                self.round_trip(fmt)
+
+    def test_import_rebuilds_derived_data(self):
+        self.round_trip('jsonl')
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count),
+                         (4, 1))
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk)
+                         .comments_count, 2)
+        comment = Comment.objects.get(pk=self.comment.pk)
+        self.assertEqual((comment.path, comment.replies_count),
+                         (self.comment.path, 1))
+        self.assertEqual(comment.replies.get().depth, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 4)
+        found = set(search.matching_ids(search.POST, 'кота'))
+        self.assertEqual(found, {post.pk for post in self.posts[:3]})
+
+    def test_new_rows_get_fresh_keys_after_import(self):
+        self.round_trip('csv')
+        post = Post.objects.create(author=self.author, text='Новая')
+        self.assertGreater(post.pk, max(post.pk for post in self.posts))
+
+    def test_bad_file_is_reported(self):
+        path = os.path.join(self.directory, 'post.jsonl')
+        with open(path, 'w') as stream:
+            stream.write('{"id": 100, "author_id": "x", "text": "t", '
+                         '"created": "2020-01-01T00:00:00+00:00"}\n')
+        with self.assertRaisesMessage(CommandError,
+                                      'строка 1, поле author_id'):
+            call_command('import_posts', path, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_posts',
+                         os.path.join(self.directory, 'posts.txt'),
+                         stdout=io.StringIO())
@@ -95,6 +95,7 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(PostPagesTests.user)
@@ -200,7 +201,8 @@ class PostPagesTests(TestCase):
         )
         content_after = (self.authorized_client
                          .get(PostPagesTests.url_index).content)
-        another_post.delete()
+        # update() не шлет сигналов: страница должна прийти из кэша.
+        Post.objects.filter(pk=another_post.pk).update(text='Другой текст')
         content_before = (self.authorized_client
                           .get(PostPagesTests.url_index).content)
         self.assertEqual(content_after, content_before)
@@ -209,6 +211,57 @@ class PostPagesTests(TestCase):
                                 .get(PostPagesTests.url_index).content)
         self.assertNotEqual(content_after, content_before_clear)
 
+    def test_feed_cache_invalidated_on_changes(self):
+        urls = [PostPagesTests.url_index, PostPagesTests.url_group_posts,
+                PostPagesTests.url_profile]
+        for url in urls:
+            self.guest_client.get(url)
+        another_post = Post.objects.create(
+            author=PostPagesTests.user,
+            text='Запись, которая сразу видна',
+            group=PostPagesTests.group,
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.guest_client.get(url).content.decode()
+                self.assertIn(another_post.text, content)
+        another_post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.guest_client.get(url).content.decode()
+                self.assertNotIn(another_post.text, content)
+
+    def test_feed_cache_invalidated_on_group_change(self):
+        PostPagesTests.post.group = PostPagesTests.another_group
+        PostPagesTests.post.save()
+        response = self.guest_client.get(PostPagesTests.url_group_posts)
+        self.assertNotIn(PostPagesTests.post.text,
+                         response.content.decode())
+        PostPagesTests.post.group = PostPagesTests.group
+        PostPagesTests.post.save()
+
+    def test_feed_cache_separates_pages(self):
+        Post.objects.bulk_create([
+            Post(author=PostPagesTests.user, text='Страница {}'.format(n))
+            for n in range(10)
+        ])
+        first = self.guest_client.get(PostPagesTests.url_index)
+        second = self.guest_client.get(PostPagesTests.url_index,
+                                       {'page': 2})
+        self.assertNotEqual(first.content, second.content)
+
+    def test_feed_cache_keyed_by_shown_page(self):
+        url = PostPagesTests.url_index
+
+        def key(**params):
+            return self.guest_client.get(url, params).context['cache_key']
+
+        self.assertEqual(len({key(), key(page=1), key(page='abc'),
+                              key(page=99999)}), 1)
+        first = self.guest_client.get(url, {'cursor': ''})
+        self.assertEqual(first.context['cache_key'], key(cursor='broken'))
+        self.assertNotEqual(first.context['cache_key'], key())
+
     def test_auth_user_follow(self):
         follow_count = Follow.objects.count()
         self.authorized_client_follow.get(PostPagesTests.url_follow_add)
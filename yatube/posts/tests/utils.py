@@ -0,0 +1,125 @@
+"""Бюджеты SQL-запросов страниц для тестов.
+
+``QueryBudgetMixin.assertQueryBudget`` открывает страницу и проверяет,
+что число запросов не превышает бюджета из ``QUERY_BUDGETS``. При
+превышении в сообщение попадают все запросы, сгруппированные по месту
+в шаблоне, откуда они были сделаны: N+1 в цикле шаблона сразу видно по
+строке вида ``posts/includes/one_post.html:5`` с десятком запросов.
+"""
+import inspect
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import caches
+from django.db import connection
+from django.template.base import Node
+from django.urls import reverse
+
+from posts import follow_graph
+
+# Максимум запросов на страницу с полной лентой и холодным кэшем:
+# (гость, авторизованный пользователь). None — страница недоступна.
+# Авторизованному всегда нужны еще два запроса: сессия и пользователь.
+# Группе, профилю и записи нужен еще запрос валидатора ETag (conditional).
+QUERY_BUDGETS: Dict[str, Tuple[Optional[int], int]] = {
+    'posts:index': (2, 4),
+    'posts:group_posts': (4, 6),
+    # Плюс загрузка графа подписок (follow_graph) при холодном кэше.
+    # Авторизованному на профиле и в подписках — еще рекомендации
+    # (suggestions).
+    'posts:profile': (5, 9),
+    # Плюс ответы на комментарии страницы одним запросом (threads).
+    'posts:post_detail': (5, 7),
+    'posts:follow_index': (None, 7),
+}
+VIEW_CODE = 'код view'
+
+
+def run_on_commit(callback):
+    """Замена ``transaction.on_commit``: TestCase не фиксирует транзакций."""
+
+    callback()
+
+
+def reset_follow_graph():
+    """Очищает общий кэш графа подписок и забывает граф процесса.
+
+    Одной очистки кэша мало: начальная версия графа берется из времени
+    в миллисекундах и может совпасть с версией графа, оставшегося от
+    прошлого теста, — тогда устаревший граф сойдет за свежий.
+    """
+
+    caches[follow_graph.CACHE_ALIAS].clear()
+    follow_graph._graph = follow_graph.FollowGraph()
+
+
+def _template_origin() -> str:
+    """Место в шаблоне, из которого выполняется текущий запрос.
+
+    Идет по стеку от текущего кадра вверх и берет первый узел шаблона:
+    у каждого ``Node`` есть ``origin`` и токен с номером строки.
+    """
+
+    frame = inspect.currentframe()
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type(), а не isinstance: isinstance вычислил бы ленивый
+        # request.user и сделал запрос изнутри обработчика запросов.
+        if issubclass(type(node), Node) and getattr(node, 'origin', None):
+            token = getattr(node, 'token', None)
+            name = node.origin.template_name or node.origin.name
+            return '{}:{}'.format(name, getattr(token, 'lineno', '?'))
+        frame = frame.f_back
+    return VIEW_CODE
+
+
+class QueryLog:
+    """Запросы, сделанные внутри ``with``, с местом в шаблоне."""
+
+    def __init__(self):
+        self.queries: List[tuple] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((_template_origin(), sql))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def by_origin(self) -> 'OrderedDict[str, List[str]]':
+        grouped = OrderedDict()
+        for origin, sql in self.queries:
+            grouped.setdefault(origin, []).append(sql)
+        return grouped
+
+    def report(self) -> str:
+        lines = []
+        for origin, queries in self.by_origin().items():
+            lines.append('{} — запросов: {}'.format(origin, len(queries)))
+            lines.extend('    ' + sql for sql in queries)
+        return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов для страниц из posts.urls."""
+
+    def assertQueryBudget(self, client, url_name: str, args=None,
+                          params: Optional[dict] = None,
+                          authenticated: bool = False) -> QueryLog:
+        budget = QUERY_BUDGETS[url_name][authenticated]
+        with QueryLog() as log:
+            response = client.get(reverse(url_name, args=args), params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(log), budget,
+            '{}: {} запросов при бюджете {}\n{}'.format(
+                url_name, len(log), budget, log.report()))
+        return log
@@ -0,0 +1,144 @@
+"""Ветки ответов на комментарии.
+
+Комментарий хранит материализованный путь ``path``: первичные ключи
+предков и свой, каждый дополнен нулями до ``SEGMENT_LENGTH`` цифр.
+Потомки комментария — строки той же записи с путем в диапазоне
+``(path, path + SUBTREE_END)``: двоеточие в ASCII идет сразу за цифрами.
+Поэтому ветка любой глубины читается одним диапазоном индекса
+(post, path), а порядок по ``path`` — это обход дерева в глубину.
+
+Путь назначается сигналом после вставки, когда известен первичный ключ.
+Страница показывает не больше ``THREAD_DEPTH`` уровней ответов и не
+больше ``REPLIES_PER_PAGE`` ответов за раз, остальное подгружается по
+ссылкам «Показать ответы».
+"""
+from typing import Dict, List, Optional, Sequence
+
+from django.db.models import CharField, OuterRef, QuerySet, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+from .models import Comment
+
+SEGMENT_LENGTH = 10
+SUBTREE_END = ':'
+# Самая глубокая ветка, путь которой помещается в поле path. Ответ на
+# комментарий этой глубины становится ответом на его родителя.
+MAX_DEPTH = 24
+# Сколько уровней ответов показывается под комментарием сразу.
+THREAD_DEPTH = 3
+# Сколько ответов читается одним запросом.
+REPLIES_PER_PAGE = 100
+
+
+def segment(pk: int) -> str:
+    return str(pk).zfill(SEGMENT_LENGTH)
+
+
+def subtree_end(path: str) -> str:
+    """Верхняя граница путей потомков комментария с путем ``path``."""
+
+    return path + SUBTREE_END
+
+
+def ancestor_ids(path: str) -> List[int]:
+    """Первичные ключи предков комментария по его пути."""
+
+    return [int(path[start:start + SEGMENT_LENGTH])
+            for start in range(0, len(path) - SEGMENT_LENGTH,
+                               SEGMENT_LENGTH)]
+
+
+def reply_target(parent: Comment) -> Comment:
+    """Комментарий, к которому на самом деле прикрепится ответ."""
+
+    if parent.depth >= MAX_DEPTH:
+        return parent.parent
+    return parent
+
+
+def place(comment: Comment) -> None:
+    """Назначает путь и глубину только что созданному комментарию."""
+
+    parent_path: str = comment.parent.path if comment.parent_id else ''
+    comment.path = parent_path + segment(comment.pk)
+    comment.depth = len(comment.path) // SEGMENT_LENGTH - 1
+    Comment.objects.filter(pk=comment.pk).update(path=comment.path,
+                                                 depth=comment.depth)
+
+
+def rebuild_paths(comments: QuerySet) -> int:
+    """Назначает пути комментариям, загруженным без сигналов.
+
+    Идет по уровням дерева: сначала корни, затем ответы, у родителей
+    которых путь уже есть. Каждый уровень — один UPDATE.
+    """
+
+    own = LPad(Cast('pk', CharField()), SEGMENT_LENGTH, Value('0'))
+    updated = comments.filter(parent=None).update(path=own, depth=0)
+    parents = Comment.objects.filter(pk=OuterRef('parent_id'))
+    while True:
+        level = (comments.filter(path='').exclude(parent=None)
+                 .exclude(parent__path=''))
+        placed = level.update(
+            path=Concat(Subquery(parents.values('path')), own),
+            depth=Subquery(parents.values('depth')) + 1,
+        )
+        if not placed:
+            return updated
+        updated += placed
+
+
+def _start(comment: Comment) -> None:
+    comment.thread_replies = []
+    comment.more_replies = None
+
+
+def _attach(post_id: int, parent: Comment, max_depth: int,
+            after: Optional[str]) -> None:
+    rows = list(
+        Comment.objects.filter(post_id=post_id,
+                               path__gt=after or parent.path,
+                               path__lt=subtree_end(parent.path),
+                               depth__lte=max_depth)
+        .select_related('author').order_by('path')[:REPLIES_PER_PAGE + 1]
+    )
+    nodes: Dict[int, Comment] = {parent.pk: parent}
+    for row in rows[:REPLIES_PER_PAGE]:
+        node = nodes.get(row.parent_id)
+        if node is None:
+            continue
+        _start(row)
+        if row.depth == max_depth and row.replies_count:
+            row.more_replies = ''
+        node.thread_replies.append(row)
+        nodes[row.pk] = row
+    if len(rows) > REPLIES_PER_PAGE:
+        # Ответы кончились посреди обхода: у каждого показанного предка
+        # первого непоказанного ответа ветка продолжается после последнего
+        # показанного ответа вместе с его потомками.
+        for pk in ancestor_ids(rows[REPLIES_PER_PAGE].path):
+            node = nodes.get(pk)
+            if node is not None:
+                shown = node.thread_replies
+                node.more_replies = (subtree_end(shown[-1].path)
+                                     if shown else '')
+
+
+def attach_replies(post_id: int, parents: Sequence[Comment],
+                   after: Optional[str] = None) -> None:
+    """Загружает ответы на ``parents`` и раскладывает их по веткам.
+
+    ``parents`` — комментарии одной глубины, например корни страницы.
+    Ветка каждого читается своим запросом по диапазону путей со своим
+    пределом ``REPLIES_PER_PAGE``, поэтому большая ветка не вытесняет
+    ответы соседних; комментарии без ответов запросов не делают.
+    Каждый показанный комментарий получает список ``thread_replies`` и
+    ``more_replies``: ``None``, если все ответы показаны, иначе путь,
+    после которого продолжить ветку (пустая строка — с начала).
+    ``after`` продолжает ветку единственного комментария из ``parents``.
+    """
+
+    for parent in parents:
+        _start(parent)
+        if parent.replies_count:
+            _attach(post_id, parent, parent.depth + THREAD_DEPTH, after)
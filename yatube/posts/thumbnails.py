@@ -0,0 +1,192 @@
+"""Заблаговременная генерация миниатюр картинок записей.
+
+После сохранения записи все миниатюры из ``GEOMETRIES`` строятся в пуле
+потоков (или сразу, если ``THUMBNAIL_WORKERS = 0``). Адрес и размеры
+готовой миниатюры кладутся в кэш под ключом, зависящим только от имени
+файла, поэтому шаблон узнает о миниатюре одним обращением к кэшу, не
+открывая оригинал и не заглядывая в key-value хранилище sorl.
+
+Страницы, отрисованные, пока миниатюры строились в пуле, вышли без
+картинки. Построив миниатюры, поток сбрасывает версии фрагментов и
+общий HTTP-кэш лент и страниц записей с этой картинкой.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import connections
+from sorl.thumbnail import get_thumbnail
+
+from core import edge, metrics
+
+from . import fragments
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'thumbnails'
+# Сколько помнить, что картинки нет: не пытаться строить миниатюру
+# на каждом просмотре.
+MISSING_TIMEOUT = 60 * 5
+# Пока миниатюры строятся, повторные промахи не ставят задачу снова.
+PENDING_TIMEOUT = 60
+GEOMETRIES = {
+    'card': ('120x120', {'crop': 'center', 'upscale': True}),
+    'detail': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def cache_key(image_name: str, geometry: str) -> str:
+    digest = hashlib.md5(image_name.encode()).hexdigest()
+    return 'pregenerated:{}:{}'.format(geometry, digest)
+
+
+def _source_exists(image_name: str) -> bool:
+    try:
+        return default_storage.exists(image_name)
+    except SuspiciousFileOperation:
+        return False
+
+
+def generate(image_name: str) -> bool:
+    """Строит все миниатюры картинки и запоминает их адреса.
+
+    Возвращает True, если появилась хотя бы одна новая миниатюра.
+    """
+
+    with metrics.timer('thumbnails'):
+        return _generate(image_name)
+
+
+def _generate(image_name: str) -> bool:
+    cache = _cache()
+    if not _source_exists(image_name):
+        cache.set_many({cache_key(image_name, geometry): {}
+                        for geometry in GEOMETRIES}, MISSING_TIMEOUT)
+        return False
+    built = False
+    for geometry, (size, options) in GEOMETRIES.items():
+        key = cache_key(image_name, geometry)
+        if cache.get(key):
+            continue
+        try:
+            thumbnail = get_thumbnail(image_name, size, **options)
+        except Exception:
+            logger.exception('Не удалось построить миниатюру %s %s',
+                             image_name, size)
+            continue
+        cache.set(key, {
+            'url': thumbnail.url,
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+        }, None)
+        built = True
+    return built
+
+
+def _pending_key(image_name: str) -> str:
+    return cache_key(image_name, 'pending')
+
+
+def _refresh_pages(image_name: str) -> None:
+    """Сбрасывает ленты и страницы записей с картинкой."""
+
+    scopes = [fragments.index_scope()]
+    for post in Post.objects.filter(image=image_name).values(
+            'pk', 'author_id', 'group_id'):
+        scopes += [fragments.profile_scope(post['author_id']),
+                   fragments.group_scope(post['group_id']),
+                   fragments.post_scope(post['pk'])]
+    fragments.invalidate(*scopes)
+    edge.purge_keys(*scopes)
+
+
+def _generate_in_worker(image_name: str) -> None:
+    try:
+        if generate(image_name):
+            _refresh_pages(image_name)
+    finally:
+        _cache().delete(_pending_key(image_name))
+        # У потока пула свое соединение с БД (хранилище sorl).
+        connections.close_all()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def schedule(image_name: str) -> None:
+    """Ставит генерацию миниатюр в очередь пула потоков."""
+
+    if not image_name:
+        return
+    if settings.THUMBNAIL_WORKERS <= 0:
+        generate(image_name)
+    elif _cache().add(_pending_key(image_name), True, PENDING_TIMEOUT):
+        _get_executor().submit(_generate_in_worker, image_name)
+
+
+def lookup(image_name: str, geometry: str) -> Optional[Dict]:
+    """Готовая миниатюра или None.
+
+    Если миниатюры еще нет, генерация ставится в очередь; при
+    синхронном режиме миниатюра строится сразу.
+    """
+
+    if not image_name:
+        return None
+    key = cache_key(image_name, geometry)
+    found = _cache().get(key)
+    if found is None:
+        schedule(image_name)
+        found = _cache().get(key)
+    return found or None
+
+
+def prefetch(posts: Iterable, *geometries: str) -> None:
+    """Загружает миниатюры всех записей страницы одним get_many.
+
+    Результат кладется в ``post.prefetched_thumbnails``, и тег
+    ``post_thumbnail`` больше не обращается к кэшу для этих записей.
+    """
+
+    posts = list(posts)
+    keys = {}
+    for post in posts:
+        post.prefetched_thumbnails = {}
+        for geometry in geometries:
+            if post.image:
+                keys[post.pk, geometry] = cache_key(post.image.name,
+                                                    geometry)
+    if not keys:
+        return
+    found = _cache().get_many(list(set(keys.values())))
+    missing = {post.image.name for post in posts
+               for geometry in geometries
+               if post.image and keys[post.pk, geometry] not in found}
+    if missing:
+        for image_name in missing:
+            schedule(image_name)
+        found.update(_cache().get_many(
+            [key for key in keys.values() if key not in found]))
+    for post in posts:
+        for geometry in geometries:
+            key = keys.get((post.pk, geometry))
+            post.prefetched_thumbnails[geometry] = found.get(key) or None
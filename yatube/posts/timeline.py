@@ -0,0 +1,200 @@
+"""Материализованная лента подписок.
+
+Новая запись раскладывается по лентам подписчиков автора в момент
+публикации (fan-out on write). У авторов с очень большим числом
+подписчиков раскладка не делается: их записи подтягиваются в ленту
+читателя при ее открытии (fan-out on read), чтобы одна публикация не
+превращалась в миллионы вставок.
+"""
+from typing import Iterable, List
+
+from django.core.cache import caches
+from django.db.models import Max, OuterRef, Q, QuerySet, Subquery
+
+from . import follow_graph
+from .models import Follow, Post, TimelineEntry, User, UserStats
+
+# Сколько последних записей хранится в ленте одного пользователя.
+TIMELINE_LENGTH = 1000
+# Начиная с этого числа подписчиков записи автора не раскладываются.
+CELEBRITY_FOLLOWERS = 10000
+CELEBRITY_CACHE_TIMEOUT = 60 * 60
+# Сколько лент обрезается одним DELETE: по два параметра на ленту.
+TRIM_BATCH_SIZE = 400
+CACHE_ALIAS = 'timeline'
+TIMELINE_ORDERING = ('-created', '-post_id')
+
+
+def _celebrity_key(author_id: int) -> str:
+    return 'timeline:celebrity:{}'.format(author_id)
+
+
+def _count_celebrity(author_id: int) -> bool:
+    is_celebrity = UserStats.objects.filter(
+        user_id=author_id, followers_count__gt=CELEBRITY_FOLLOWERS,
+    ).exists()
+    caches[CACHE_ALIAS].set(_celebrity_key(author_id), is_celebrity,
+                            CELEBRITY_CACHE_TIMEOUT)
+    return is_celebrity
+
+
+def is_celebrity(author_id: int) -> bool:
+    """Слишком ли много подписчиков у автора для раскладки по лентам."""
+
+    cached = caches[CACHE_ALIAS].get(_celebrity_key(author_id))
+    if cached is None:
+        return _count_celebrity(author_id)
+    return cached
+
+
+def celebrity_ids(author_ids: Iterable[int]) -> List[int]:
+    """Выбирает из author_ids авторов, чьи записи читаются при чтении.
+
+    Флаги берутся из кэша одним get_many; для авторов, которых там нет,
+    они считаются одним запросом и кладутся в кэш одним set_many.
+    """
+
+    author_ids = list(author_ids)
+    cache = caches[CACHE_ALIAS]
+    cached = cache.get_many([_celebrity_key(pk) for pk in author_ids])
+    flags = {author_id: cached.get(_celebrity_key(author_id))
+             for author_id in author_ids}
+    missing = [author_id for author_id, flag in flags.items()
+               if flag is None]
+    if missing:
+        celebrities = set(UserStats.objects.filter(
+            user_id__in=missing, followers_count__gt=CELEBRITY_FOLLOWERS,
+        ).values_list('user_id', flat=True))
+        counted = {author_id: author_id in celebrities
+                   for author_id in missing}
+        cache.set_many({_celebrity_key(author_id): flag
+                        for author_id, flag in counted.items()},
+                       CELEBRITY_CACHE_TIMEOUT)
+        flags.update(counted)
+    return [author_id for author_id in author_ids if flags[author_id]]
+
+
+def _entries(user_id: int, posts) -> List[TimelineEntry]:
+    return [TimelineEntry(user_id=user_id, post_id=post['id'],
+                          author_id=post['author_id'],
+                          created=post['created'])
+            for post in posts]
+
+
+def _insert(entries: List[TimelineEntry]) -> None:
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def trim(user_ids: Iterable[int]) -> None:
+    """Обрезает ленты пользователей до TIMELINE_LENGTH записей.
+
+    Граница ленты — дата ее TIMELINE_LENGTH-й записи — считается одним
+    запросом, по одному шагу индекса (user, created) на пользователя.
+    Коррелированный подзапрос прямо в DELETE пересчитывал бы ее для
+    каждой строки каждой ленты. Затем ленты длиннее границы обрезаются
+    запросами по TRIM_BATCH_SIZE пользователей.
+    """
+
+    boundary = (
+        TimelineEntry.objects.filter(user_id=OuterRef('pk'))
+        .order_by('-created')
+        .values('created')[TIMELINE_LENGTH - 1:TIMELINE_LENGTH]
+    )
+    boundaries = list(
+        User.objects.filter(pk__in=list(user_ids))
+        .annotate(boundary=Subquery(boundary))
+        .filter(boundary__isnull=False)
+        .values_list('pk', 'boundary')
+    )
+    for start in range(0, len(boundaries), TRIM_BATCH_SIZE):
+        condition = Q()
+        for user_id, created in boundaries[start:start + TRIM_BATCH_SIZE]:
+            condition |= Q(user_id=user_id, created__lt=created)
+        TimelineEntry.objects.filter(condition).delete()
+
+
+def fan_out(post: Post) -> None:
+    """Раскладывает новую запись по лентам подписчиков автора."""
+
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = list(Follow.objects.filter(author_id=post.author_id)
+                        .values_list('user_id', flat=True))
+    if not follower_ids:
+        return
+    _insert([TimelineEntry(user_id=user_id, post_id=post.pk,
+                           author_id=post.author_id, created=post.created)
+             for user_id in follower_ids])
+    trim(follower_ids)
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    """Добавляет в ленту последние записи автора после подписки."""
+
+    backfill_authors(user_id, [author_id])
+
+
+def backfill_authors(user_id: int, author_ids: Iterable[int]) -> None:
+    """Добавляет в ленту последние записи нескольких авторов разом."""
+
+    posts = (Post.objects.filter(author_id__in=list(author_ids))
+             .order_by('-created')
+             .values('id', 'author_id', 'created')[:TIMELINE_LENGTH])
+    _insert(_entries(user_id, posts))
+    trim([user_id])
+
+
+def remove(user_id: int, author_id: int) -> None:
+    """Убирает записи автора из ленты после отписки."""
+
+    remove_authors(user_id, [author_id])
+
+
+def remove_authors(user_id: int, author_ids: Iterable[int]) -> None:
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id__in=list(author_ids)).delete()
+
+
+def rebuild(user_id: int) -> None:
+    """Строит ленту пользователя заново по его подпискам.
+
+    Нужна после загрузки подписок и записей в обход сигналов. Записи
+    знаменитостей не раскладываются: их подтянет ``pull_celebrity_posts``.
+    """
+
+    author_ids = list(Follow.objects.filter(user_id=user_id)
+                      .values_list('author_id', flat=True))
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    regular = set(author_ids) - set(celebrity_ids(author_ids))
+    if not regular:
+        return
+    posts = (Post.objects.filter(author_id__in=regular)
+             .order_by('-created')
+             .values('id', 'author_id', 'created')[:TIMELINE_LENGTH])
+    _insert(_entries(user_id, posts))
+
+
+def pull_celebrity_posts(user_id: int) -> None:
+    """Подтягивает в ленту новые записи авторов-знаменитостей."""
+
+    author_ids = celebrity_ids(follow_graph.following_ids(user_id))
+    if not author_ids:
+        return
+    latest = TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids,
+    ).aggregate(latest=Max('created'))['latest']
+    posts = Post.objects.filter(author_id__in=author_ids)
+    if latest is not None:
+        posts = posts.filter(created__gt=latest)
+    posts = posts.order_by('-created').values(
+        'id', 'author_id', 'created')[:TIMELINE_LENGTH]
+    _insert(_entries(user_id, posts))
+    trim([user_id])
+
+
+def entries_for(user) -> QuerySet:
+    """Лента подписок пользователя, готовая к пагинации."""
+
+    pull_celebrity_posts(user.pk)
+    return (TimelineEntry.objects.filter(user=user)
+            .select_related('post__author', 'post__group'))
@@ -0,0 +1,251 @@
+"""Выгрузка и загрузка данных posts в JSON Lines и CSV.
+
+Выгрузка читает таблицу через ``.iterator(chunk_size=...)`` и пишет
+строку за строкой, поэтому память не растет с размером таблицы.
+Загрузка вставляет строки ``bulk_create`` пачками, каждую в своей
+транзакции, с сохранением первичных ключей: ссылки между файлами
+остаются верными. Сигналы при этом не срабатывают, поэтому после
+загрузки ``rebuild`` пересчитывает пути веток комментариев, счетчики,
+граф и ленты подписок и поисковый индекс — только в диапазонах
+затронутых ключей.
+
+Команды ``export_posts`` и ``import_posts`` — обертки над этим модулем.
+"""
+import csv
+import functools
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+from operator import or_
+from typing import IO, Any, Dict, Iterator, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import counters, follow_graph, search, threads, timeline
+from .bulk import Log, batches, bulk_insert, explicit_created, rate
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+# Порядок загрузки: сначала таблицы, на которые ссылаются остальные.
+MODELS = OrderedDict([
+    ('user', (User, (
+        'id', 'username', 'password', 'first_name', 'last_name', 'email',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+    ))),
+    ('group', (Group, ('id', 'title', 'slug', 'description'))),
+    ('post', (Post, (
+        'id', 'author_id', 'group_id', 'text', 'image', 'created',
+    ))),
+    ('comment', (Comment, (
+        'id', 'post_id', 'author_id', 'parent_id', 'text', 'created',
+    ))),
+    ('follow', (Follow, ('id', 'user_id', 'author_id'))),
+])
+
+
+class RecordError(ValueError):
+    """Строка файла, которую нельзя превратить в объект модели."""
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def export(name: str, stream: IO[str], fmt: str, chunk_size: int,
+           log: Log) -> int:
+    """Пишет всю таблицу модели ``name`` в поток в формате ``fmt``."""
+
+    model, fields = MODELS[name]
+    rows = (model.objects.order_by('pk').values_list(*fields)
+            .iterator(chunk_size=chunk_size))
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+    exported = 0
+    started = time.perf_counter()
+    for row in rows:
+        row = [_plain(value) for value in row]
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(dict(zip(fields, row)),
+                                    ensure_ascii=False) + '\n')
+        exported += 1
+        if exported % chunk_size == 0:
+            log('{}: {} ({})'.format(model._meta.verbose_name_plural,
+                                     exported, rate(exported, started)))
+    log('{}: {} ({})'.format(model._meta.verbose_name_plural, exported,
+                             rate(exported, started)))
+    return exported
+
+
+def read(stream: IO[str], fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Changes:
+    """Диапазоны первичных ключей, затронутые загрузкой.
+
+    Хранятся только границы, а не сами ключи: для десятков миллионов
+    строк пересчет по диапазону (с запасом) дешевле множества в памяти.
+    """
+
+    def __init__(self):
+        self.ranges: Dict[str, Tuple[int, int]] = {}
+
+    def add(self, key: str, pk: Optional[int]) -> None:
+        if pk is None:
+            return
+        low, high = self.ranges.get(key, (pk, pk))
+        self.ranges[key] = (min(low, pk), max(high, pk))
+
+    def get(self, key: str) -> Optional[Tuple[int, int]]:
+        return self.ranges.get(key)
+
+    def track(self, obj) -> None:
+        if isinstance(obj, User):
+            self.add('users', obj.pk)
+        elif isinstance(obj, Post):
+            self.add('posts', obj.pk)
+            self.add('new_posts', obj.pk)
+            self.add('users', obj.author_id)
+            self.add('authors', obj.author_id)
+        elif isinstance(obj, Comment):
+            self.add('posts', obj.post_id)
+            self.add('comments', obj.pk)
+        elif isinstance(obj, Follow):
+            self.add('users', obj.user_id)
+            self.add('users', obj.author_id)
+            self.add('followers', obj.user_id)
+
+
+def _build(model, fields, record: Dict[str, Any], number: int):
+    values = {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        if name not in record:
+            if field.has_default() or field.blank:
+                continue
+            raise RecordError('строка {}: нет поля {}'.format(number, name))
+        raw = record[name]
+        if raw in ('', None) and field.null:
+            values[name] = None
+            continue
+        try:
+            values[name] = field.to_python(raw)
+        except ValidationError as error:
+            raise RecordError('строка {}, поле {}: {}'.format(
+                number, name, '; '.join(error.messages)))
+    return model(**values)
+
+
+def load(name: str, records: Iterator[Dict[str, Any]], batch_size: int,
+         changes: Changes, log: Log) -> int:
+    """Вставляет строки файла в таблицу модели ``name``."""
+
+    model, fields = MODELS[name]
+
+    def objects():
+        for number, record in enumerate(records, 1):
+            obj = _build(model, fields, record, number)
+            changes.track(obj)
+            yield obj
+
+    created = [model] if 'created' in fields else []
+    with explicit_created(*created):
+        inserted = bulk_insert(model, objects(), batch_size, log)
+    _reset_sequence(model)
+    return inserted
+
+
+def _reset_sequence(model) -> None:
+    """Сдвигает автоинкремент за загруженные ключи (нужно не всем СУБД)."""
+
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def _pk_ranges(bounds: Tuple[int, int], size: int) -> Iterator[Tuple]:
+    low, high = bounds
+    for first in range(low, high + 1, size):
+        yield first, min(first + size - 1, high)
+
+
+def _in_range(field: str, bounds: Tuple[int, int]) -> Q:
+    # Внешние ключи в Django 2.2 не поддерживают __range.
+    return Q(**{field + '__gte': bounds[0], field + '__lte': bounds[1]})
+
+
+def _recount(changes: Changes, batch_size: int, log: Log) -> None:
+    if changes.get('comments'):
+        log('Ветки комментариев')
+        threads.rebuild_paths(
+            Comment.objects.filter(pk__range=changes.get('comments')))
+    if changes.get('users'):
+        log('Счетчики пользователей')
+        for first, last in _pk_ranges(changes.get('users'), batch_size):
+            counters.recount_users(first, last)
+    if changes.get('posts'):
+        log('Счетчики комментариев')
+        for first, last in _pk_ranges(changes.get('posts'), batch_size):
+            counters.recount_posts(first, last)
+            counters.recount_replies(first, last)
+
+
+def _rebuild_timelines(changes: Changes, batch_size: int, log: Log) -> None:
+    """Ленты подписчиков загруженных авторов и загруженных подписчиков."""
+
+    readers = [_in_range(field, changes.get(key))
+               for field, key in (('author_id', 'authors'),
+                                  ('user_id', 'followers'))
+               if changes.get(key)]
+    if not readers:
+        return
+    user_ids = (Follow.objects.filter(functools.reduce(or_, readers))
+                .order_by('user_id').values_list('user_id', flat=True)
+                .distinct().iterator(chunk_size=batch_size))
+    rebuilt = 0
+    for rebuilt, user_id in enumerate(user_ids, 1):
+        timeline.rebuild(user_id)
+        if rebuilt % batch_size == 0:
+            log('Ленты подписок: {}'.format(rebuilt))
+    log('Ленты подписок: {}'.format(rebuilt))
+
+
+def _reindex(queryset, index, batch_size: int) -> None:
+    for batch in batches(queryset.iterator(chunk_size=batch_size),
+                         batch_size):
+        with transaction.atomic():
+            for obj in batch:
+                index(obj)
+
+
+def rebuild(changes: Changes, batch_size: int, log: Log) -> None:
+    """Пересчитывает то, что при загрузке обновили бы сигналы."""
+
+    _recount(changes, batch_size, log)
+    if changes.get('followers'):
+        follow_graph.invalidate()
+    _rebuild_timelines(changes, batch_size, log)
+    if changes.get('new_posts'):
+        log('Поисковый индекс записей')
+        _reindex(Post.objects.filter(pk__range=changes.get('new_posts'))
+                 .only('text'), search.index_post, batch_size)
+    if changes.get('comments'):
+        log('Поисковый индекс комментариев')
+        _reindex(Comment.objects.filter(pk__range=changes.get('comments'))
+                 .only('post_id', 'text'), search.index_comment, batch_size)
@@ -1,50 +1,65 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
+from urllib.parse import urlencode
 
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
+from django.core.paginator import Page
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest
+from django.views.decorators.http import condition, require_POST
 
-from .models import Post, Group, User, Comment, Follow
-from .forms import PostForm, CommentForm
+from core.edge import edge_cache, tag
 
-POSTS_PER_PAGE = 10
+from .models import Post, Group, User, Comment, UserStats
+from .forms import PostForm, CommentForm, ReplyForm
+from .paginators import (CursorPage, paginate, paginate_comments,
+                         paginate_numbered)
+from . import (conditional, counters, follow_graph, follows, fragments,
+               search, suggestions, threads, thumbnails, timeline)
 
 
+@edge_cache
+@condition(etag_func=conditional.index_etag)
 def index(request):
     """View-функция для главной страницы"""
 
     template: str = 'posts/index.html'
 
-    posts: Paginator = Paginator(Post.objects.select_related('author', 'group')
-                                 .all(), POSTS_PER_PAGE)
-    page_number: int = request.GET.get('page')
-    page_obj: Paginator = posts.get_page(page_number)
+    page_obj: Page = paginate(request,
+                              Post.objects.select_related('author', 'group'))
+    thumbnails.prefetch(page_obj, 'card')
+    tag(request, fragments.index_scope(), fragments.ALL_FEEDS)
 
     context: Dict[str, Any] = {
         'page_obj': page_obj,
         'index': True,
+        **fragments.feed_context(page_obj, fragments.index_scope()),
     }
     return render(request, template, context)
 
 
+@edge_cache
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug):
     """View-функция для страницы группы записей"""
 
     template: str = 'posts/group_list.html'
 
     group: Group = get_object_or_404(Group, slug=slug)
-    posts: Paginator = Paginator(group.group_posts.select_related('author').
-                                 all(), POSTS_PER_PAGE)
-    page_number: int = request.GET.get('page')
-    page_obj: Paginator = posts.get_page(page_number)
+    page_obj: Page = paginate(request,
+                              group.group_posts.select_related('author'))
+    thumbnails.prefetch(page_obj, 'card')
+    tag(request, fragments.group_scope(group.pk), fragments.ALL_FEEDS)
 
     context: Dict[str, Any] = {
         'group': group,
         'page_obj': page_obj,
+        **fragments.feed_context(page_obj, fragments.group_scope(group.pk)),
     }
     return render(request, template, context)
 
 
+@edge_cache
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
     """View-функция для страницы Профайл пользователя"""
 
@@ -52,34 +67,64 @@ def profile(request, username):
 
     author: User = get_object_or_404(User, username=username)
     user: User = request.user
-    following: bool = False
-    if request.user.is_authenticated and Follow.objects.filter(user=user,
-                                                               author=author):
-        following = True
-    posts: Paginator = Paginator(author.author_posts.select_related('group').
-                                 all(), POSTS_PER_PAGE)
-    posts_count: int = posts.count
-    page_number: int = request.GET.get('page')
-    page_obj: Paginator = posts.get_page(page_number)
+    following: bool = (user.is_authenticated
+                       and follow_graph.is_following(user.pk, author.pk))
+    suggested: List[User] = []
+    if user.is_authenticated:
+        suggested = suggestions.for_user(user.pk, exclude=[author.pk])
+    stats: UserStats = counters.for_user(author.pk)
+    page_obj: Page = paginate(request,
+                              author.author_posts.select_related('group'),
+                              count=stats.posts_count)
+    thumbnails.prefetch(page_obj, 'card')
+    tag(request, fragments.profile_scope(author.pk), fragments.ALL_FEEDS)
 
     context: Dict[str, Any] = {
         'author': author,
         'page_obj': page_obj,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'following': following,
+        'suggestions': suggested,
+        **fragments.feed_context(page_obj, fragments.profile_scope(author.pk)),
     }
     return render(request, template, context)
 
 
+def search_posts(request):
+    """View-функция для поиска по записям и комментариям"""
+
+    template: str = 'posts/search.html'
+
+    query: str = request.GET.get('q', '').strip()
+    page_obj: Page = paginate_numbered(request, search.SearchResults(query))
+    thumbnails.prefetch(page_obj, 'card')
+
+    context: Dict[str, Any] = {
+        'page_obj': page_obj,
+        'query': query,
+        'page_prefix': urlencode({'q': query}) + '&' if query else '',
+    }
+    return render(request, template, context)
+
+
+@edge_cache
+@condition(etag_func=conditional.post_detail_etag)
 def post_detail(request, post_id):
     """View-функция для страницы Подробности записи"""
 
     template: str = 'posts/post_detail.html'
 
-    post: Post = get_object_or_404(Post, pk=post_id)
-    posts_count: int = Post.objects.filter(author=post.author).count()
-    comments: Comment = post.comments.select_related('author').all()
+    post: Post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    posts_count: int = counters.for_user(post.author_id).posts_count
+    comments: CursorPage = paginate_comments(
+        request, post.comments.filter(depth=0).select_related('author'))
+    threads.attach_replies(post.pk, comments.object_list)
     form = CommentForm()
+    tag(request, fragments.post_scope(post.pk),
+        fragments.profile_scope(post.author_id),
+        fragments.group_scope(post.group_id))
 
     context: Dict[str, Any] = {
         'post': post,
@@ -90,6 +135,71 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+@edge_cache
+@condition(etag_func=conditional.post_detail_etag)
+def post_comments(request, post_id):
+    """View-функция очередной порции комментариев (HTML-фрагмент)"""
+
+    template: str = 'posts/includes/comment_list.html'
+
+    post: Post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments: CursorPage = paginate_comments(
+        request, Comment.objects.filter(post=post, depth=0)
+        .select_related('author'))
+    threads.attach_replies(post.pk, comments.object_list)
+    tag(request, fragments.post_scope(post.pk))
+
+    context: Dict[str, Any] = {
+        'post': post,
+        'comments': comments,
+        'fragment': True,
+    }
+    return render(request, template, context)
+
+
+@edge_cache
+@condition(etag_func=conditional.comment_thread_etag)
+def comment_thread(request, post_id, comment_id):
+    """View-функция страницы ветки ответов на комментарий"""
+
+    template: str = 'posts/comment_thread.html'
+
+    comment: Comment = get_object_or_404(
+        Comment.objects.select_related('post', 'author'),
+        pk=comment_id, post_id=post_id)
+    threads.attach_replies(post_id, [comment],
+                           after=request.GET.get('after'))
+    tag(request, fragments.post_scope(post_id))
+
+    context: Dict[str, Any] = {
+        'post': comment.post,
+        'comment': comment,
+    }
+    return render(request, template, context)
+
+
+@edge_cache
+@condition(etag_func=conditional.comment_thread_etag)
+def comment_replies(request, post_id, comment_id):
+    """View-функция очередной порции ответов ветки (HTML-фрагмент)"""
+
+    template: str = 'posts/includes/comment_replies.html'
+
+    parent: Comment = get_object_or_404(
+        Comment.objects.select_related('post'),
+        pk=comment_id, post_id=post_id)
+    threads.attach_replies(post_id, [parent],
+                           after=request.GET.get('after'))
+    tag(request, fragments.post_scope(post_id))
+
+    context: Dict[str, Any] = {
+        'post': parent.post,
+        'parent': parent,
+        'replies': parent.thread_replies,
+    }
+    return render(request, template, context)
+
+
 @login_required
 def post_create(request):
     """View-функция для формы добавления новой записи"""
@@ -138,12 +248,16 @@ def add_comment(request, post_id):
 
     post: Post = get_object_or_404(Post, pk=post_id)
 
-    form = CommentForm(request.POST or None)
-    if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+    form = ReplyForm(request.POST or None, post=post)
+    if not form.is_valid():
+        return redirect('posts:post_detail', post_id=post_id)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.save()
+    if comment.parent_id:
+        return redirect('posts:comment_thread', post_id=post_id,
+                        comment_id=comment.parent_id)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -153,18 +267,15 @@ def follow_index(request):
 
     template: str = 'posts/follow.html'
 
-    authors_ids = Follow.objects.filter(user=request.user).values_list(
-        'author_id',
-        flat=True)
-    posts: Paginator = Paginator(Post.objects.select_related('author', 'group')
-                                 .filter(author_id__in=authors_ids),
-                                 POSTS_PER_PAGE)
-    page_number: int = request.GET.get('page')
-    page_obj: Paginator = posts.get_page(page_number)
+    page_obj: Page = paginate(request, timeline.entries_for(request.user),
+                              ordering=timeline.TIMELINE_ORDERING)
+    page_obj.object_list = [entry.post for entry in page_obj]
+    thumbnails.prefetch(page_obj, 'card')
 
     context: Dict[str, Any] = {
         'page_obj': page_obj,
         'follow': True,
+        'suggestions': suggestions.for_user(request.user.pk),
     }
     return render(request, template, context)
 
@@ -174,10 +285,7 @@ def profile_follow(request, username):
     """View-функция Подписаться на автора"""
 
     author: User = get_object_or_404(User, username=username)
-    if request.user == author or Follow.objects.filter(
-            user=request.user, author=author):
-        return redirect('posts:profile', username=username)
-    Follow.objects.create(user=request.user, author=author)
+    follows.follow_authors(request.user, [author.pk])
 
     return redirect('posts:profile', username=username)
 
@@ -187,8 +295,38 @@ def profile_unfollow(request, username):
     """View-функция Отписаться от автора"""
 
     author: User = get_object_or_404(User, username=username)
-    follow: Follow = get_object_or_404(Follow, user=request.user,
-                                       author=author)
-    follow.delete()
+    follows.unfollow_authors(request.user, [author.pk])
 
     return redirect('posts:profile', username=username)
+
+
+def _bulk_usernames(request) -> List[str]:
+    """Имена из полей ``usernames``: по одному или списком в поле."""
+
+    return follows.parse_usernames(request.POST.getlist('usernames'))
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    """View-функция Подписаться на авторов из списка"""
+
+    usernames: List[str] = _bulk_usernames(request)
+    if len(usernames) > follows.MAX_USERNAMES:
+        return HttpResponseBadRequest()
+    follows.follow(request.user, usernames)
+
+    return redirect('posts:follow_index')
+
+
+@login_required
+@require_POST
+def unfollow_bulk(request):
+    """View-функция Отписаться от авторов из списка"""
+
+    usernames: List[str] = _bulk_usernames(request)
+    if len(usernames) > follows.MAX_USERNAMES:
+        return HttpResponseBadRequest()
+    follows.unfollow(request.user, usernames)
+
+    return redirect('posts:follow_index')
@@ -1,4 +1,11 @@
+import atexit
+import importlib.util
 import os
+import shutil
+import sys
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -33,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,7 +55,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -141,10 +149,195 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
-# Caches
+# Uploads
+#
+# Загрузки больше FILE_UPLOAD_MAX_MEMORY_SIZE пишутся во временный файл
+# на диске, а не в память процесса. Картинки записей проверяются до
+# декодирования: размер файла не больше POST_IMAGE_MAX_SIZE, число
+# пикселей (а значит, и память на декодирование) — не больше
+# POST_IMAGE_MAX_PIXELS. Сохраняется уменьшенная до
+# POST_IMAGE_MAX_DIMENSION копия в прогрессивном JPEG без EXIF.
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_DIMENSION = 1920
+POST_IMAGE_QUALITY = 85
+
+
+# Caches
+#
+# Бэкенд выбирается переменной окружения CACHE_BACKEND и общий для всех
+# процессов (кроме locmem, который годится для разработки):
+#   locmem — память процесса;
+#   file   — каталог CACHE_LOCATION на общем диске;
+#   db     — таблица CACHE_LOCATION в основной БД (manage.py
+#            createcachetable);
+#   redis  — сервер CACHE_LOCATION, нужен пакет django-redis.
+# Все подсистемы обращаются к кэшу через именованные алиасы ниже.
+#
+# Граф подписок (алиас follow_graph) раздает процессам номера версий
+# через cache.incr. У file и db incr — это чтение и запись без
+# блокировки: два процесса получили бы один номер, и подписка одного из
+# них пропала бы из графов остальных. Поэтому графу нужен бэкенд с
+# атомарным incr — redis (или locmem, если процесс один), его задают
+# FOLLOW_GRAPH_CACHE_BACKEND и FOLLOW_GRAPH_CACHE_LOCATION; с file и db
+# сайт не запускается.
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'yatube'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.path.join(BASE_DIR, 'cache')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'yatube_cache'),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+ATOMIC_INCR_CACHE_BACKENDS = ('locmem', 'redis')
+CACHE_ALIASES = ('default', 'fragments', 'timeline', 'thumbnails',
+                 'follow_graph')
+
+
+def check_cache_backend(variable, backend):
+    if backend not in CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            '{}: {} (ожидается одно из: {})'.format(
+                variable, backend, ', '.join(CACHE_BACKENDS)))
+    if backend == 'redis' and importlib.util.find_spec('django_redis') is None:
+        raise ImproperlyConfigured(
+            '{}=redis требует пакет django-redis: '
+            'pip install django-redis'.format(variable))
+
+
+# Тесты всегда идут на in-process кэше, чтобы не зависеть от внешних
+# сервисов и не задевать общий кэш работающего сайта.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_BACKEND = 'locmem' if TESTING else os.getenv('CACHE_BACKEND', 'locmem')
+check_cache_backend('CACHE_BACKEND', CACHE_BACKEND)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION') or CACHE_BACKENDS[CACHE_BACKEND][1]
+
+FOLLOW_GRAPH_CACHE_BACKEND = (
+    CACHE_BACKEND if TESTING
+    else os.getenv('FOLLOW_GRAPH_CACHE_BACKEND', CACHE_BACKEND))
+check_cache_backend('FOLLOW_GRAPH_CACHE_BACKEND', FOLLOW_GRAPH_CACHE_BACKEND)
+if FOLLOW_GRAPH_CACHE_BACKEND not in ATOMIC_INCR_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        'Графу подписок нужен кэш с атомарным incr ({}), а не {}: задайте '
+        'FOLLOW_GRAPH_CACHE_BACKEND'.format(
+            ', '.join(ATOMIC_INCR_CACHE_BACKENDS),
+            FOLLOW_GRAPH_CACHE_BACKEND))
+FOLLOW_GRAPH_CACHE_LOCATION = os.getenv('FOLLOW_GRAPH_CACHE_LOCATION') or (
+    CACHE_LOCATION if FOLLOW_GRAPH_CACHE_BACKEND == CACHE_BACKEND
+    else CACHE_BACKENDS[FOLLOW_GRAPH_CACHE_BACKEND][1])
+
+
+def cache_config(alias, backend=CACHE_BACKEND, location=CACHE_LOCATION):
+    """Настройки одного алиаса: общий бэкенд, свой префикс ключей."""
+
+    config = {
+        'BACKEND': CACHE_BACKENDS[backend][0],
+        'LOCATION': location,
+        'KEY_PREFIX': alias,
     }
+    if backend == 'file':
+        config['LOCATION'] = os.path.join(location, alias)
+    return config
+
+
+CACHES = {alias: cache_config(alias) for alias in CACHE_ALIASES}
+CACHES['follow_graph'] = cache_config(
+    'follow_graph', FOLLOW_GRAPH_CACHE_BACKEND, FOLLOW_GRAPH_CACHE_LOCATION)
+
+THUMBNAIL_CACHE = 'thumbnails'
+
+
+# Thumbnails
+#
+# Сколько потоков строят миниатюры новых картинок; 0 — строить сразу
+# в запросе. В тестах миниатюры строятся синхронно.
+
+THUMBNAIL_WORKERS = 0 if TESTING else int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Загрузки и миниатюры тестов, даже не подменивших MEDIA_ROOT сами,
+# уходят во временный каталог, а не в media/ проекта.
+if TESTING:
+    MEDIA_ROOT = tempfile.mkdtemp(prefix='yatube-test-media-')
+    atexit.register(shutil.rmtree, MEDIA_ROOT, True)
+
+
+# Search
+#
+# Индекс полнотекстового поиска: fts5 — виртуальная таблица SQLite,
+# table — запасной индекс в обычной таблице, auto — fts5, если миграция
+# смогла создать таблицу FTS5. После смены бэкенда индекс перестраивается
+# командой rebuild_search_index.
+
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+
+# Request metrics
+#
+# Доля запросов, для которых RequestMetricsMiddleware собирает замеры
+# (время, БД, шаблоны, кэш, миниатюры). Замеры пишутся строкой JSON в
+# лог core.metrics и копятся в гистограммах процесса, которые сотрудники
+# видят на /core/metrics/. В тестах замеры выключены.
+
+REQUEST_METRICS_SAMPLE_RATE = 0.0 if TESTING else float(
+    os.getenv('REQUEST_METRICS_SAMPLE_RATE', 0.01))
+
+
+# Edge cache
+#
+# Гостевые страницы лент и записей можно хранить в общем HTTP-кэше
+# (reverse proxy, CDN) EDGE_CACHE_TIMEOUT секунд. При изменениях данных
+# кэш очищается запросом PURGE с заголовком Surrogate-Key на
+# EDGE_PURGE_URL; без адреса очистка только шлет сигнал core.edge.purge.
+
+EDGE_CACHE_TIMEOUT = int(os.getenv('EDGE_CACHE_TIMEOUT', 300))
+EDGE_PURGE_URL = os.getenv('EDGE_PURGE_URL', '')
+EDGE_PURGE_TIMEOUT = 2
+
+# Follow graph
+#
+# Граф подписок (posts.follow_graph) загружается в память процесса при
+# первом обращении. С FOLLOW_GRAPH_WARM=1 WSGI-процесс загружает его при
+# старте, до первого запроса. Версию графа в общем кэше процесс сверяет
+# не чаще раза в FOLLOW_GRAPH_CHECK_INTERVAL секунд: на столько чужие
+# подписки могут запаздывать, свои видны сразу.
+
+FOLLOW_GRAPH_WARM = os.getenv('FOLLOW_GRAPH_WARM', '') == '1'
+FOLLOW_GRAPH_CHECK_INTERVAL = 0 if TESTING else float(
+    os.getenv('FOLLOW_GRAPH_CHECK_INTERVAL', 1))
+
+# Slow queries
+#
+# Запросы к БД дольше SLOW_QUERY_THRESHOLD_MS миллисекунд пишутся
+# строкой JSON в SLOW_QUERY_LOG вместе с параметрами, местом вызова и
+# планом запроса. Сводка по отпечаткам запросов — команда slow_queries.
+# Пустое значение переменной окружения выключает журнал; в тестах он
+# выключен.
+
+SLOW_QUERY_THRESHOLD_MS = None if TESTING else (
+    float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+    if os.getenv('SLOW_QUERY_THRESHOLD_MS', '100') else None)
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG',
+                           os.path.join(BASE_DIR, 'slow_queries.jsonl'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain',
+        },
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
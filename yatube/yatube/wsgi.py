@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+if settings.FOLLOW_GRAPH_WARM:
+    # Модели доступны только после get_wsgi_application(). Соединение с
+    # БД закрывается, чтобы его не унаследовали процессы после fork.
+    from django.db import connections
+    from posts import follow_graph
+    follow_graph.warm()
+    connections.close_all()